@@ -1,6 +1,7 @@
 import pymongo
 import json
-from sentence_transformers import SentenceTransformer, util
+from embedding_cache import load_cached_model
+from vector_storage import encode_vector
 
 
 # ---------- functions start here ---------- #
@@ -43,14 +44,14 @@ event_emails_db = mdb_client.event_emails
 og_emails_col = event_emails_db.og_emails
 embedded_emails_col = event_emails_db.embedded_emails
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+model = load_cached_model('sentence-transformers/all-MiniLM-L6-v2')
 
 for doc in og_emails_col.find({}):
 	# w = orders_demo_col.insert_one(readAndProcessDocument(doc))
 	# print(w.inserted_id)
 	new_doc = readAndProcessDocument(doc)
 	# print(new_doc)
-	message_vector = model.encode(new_doc["thread_message"]).tolist()
+	message_vector = encode_vector(model.encode(new_doc["thread_message"]))
 
 	# result_doc['sentence'] = doc
 	new_doc['message_embeddings'] = message_vector
@@ -1,19 +1,24 @@
 import os.path
-import base64
 import datetime
-import dateutil
 import pymongo
 import json
 import logging
-import re
-from typing import Dict, List, Optional
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from bs4 import BeautifulSoup
+
+import email_parsing
+from boilerplate import BoilerplateModel
+from bulk_writer import BulkUpsertWriter
+from gmail_fetcher import GmailBatchFetcher
+from ingestion_pipeline import IngestionPipeline
+from near_duplicates import NearDuplicateIndex
+from raw_archive import open_archive
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,20 +31,12 @@ class EmailCollector:
     def __init__(self):
         self.setup_database()
         self.setup_gmail_service()
+        # Raw Gmail messages are kept locally for offline re-parsing (None if disabled)
+        self.raw_archive = open_archive()
 
     def determine_sender(self, from_header: str) -> str:
         """Determine sender based on email domain"""
-        if not from_header:
-            return "Guest"
-
-        # Extract email address from header (handles formats like "Name <email@domain.com>")
-        email_match = re.search(r'<([^>]+)>|([^\s<>]+@[^\s<>]+)', from_header)
-        if email_match:
-            email_address = email_match.group(1) or email_match.group(2)
-            if email_address and "@bigsurriverinn.com" in email_address.lower():
-                return "BSRI Team"
-
-        return "Guest"
+        return email_parsing.determine_sender(from_header)
     
     def setup_database(self):
         """Initialize MongoDB connection with new database structure"""
@@ -53,6 +50,12 @@ class EmailCollector:
             # New database and collection structure
             self.email_chatbot_db = self.mdb_client.email_chatbot
             self.original_emails_col = self.email_chatbot_db.original_emails
+            # Sync checkpoints (Gmail historyId, backfill cursors)
+            self.sync_state_col = self.email_chatbot_db.sync_state
+            # Flags resent inquiries and template replies (duplicate_of)
+            self.near_duplicates = NearDuplicateIndex(self.original_emails_col)
+            # Mined signatures / footers, measured here and stripped at embedding time (see boilerplate.py)
+            self.boilerplate = BoilerplateModel.load(self.email_chatbot_db)
             
             # Create indexes for better performance
             self.create_indexes()
@@ -76,6 +79,8 @@ class EmailCollector:
             self.original_emails_col.create_index("sender")
             # Compound index for thread queries by date
             self.original_emails_col.create_index([("thread_id", 1), ("date", 1)])
+            # Band index for near-duplicate candidate lookups
+            self.near_duplicates.create_indexes()
             
             logger.info("Database indexes created successfully")
             
@@ -108,6 +113,7 @@ class EmailCollector:
                     token.write(creds.to_json())
             
             self.gmail_service = build("gmail", "v1", credentials=creds)
+            self.thread_fetcher = GmailBatchFetcher(self.gmail_service, credentials=creds)
             logger.info("Gmail service initialized successfully")
             
         except Exception as e:
@@ -116,173 +122,249 @@ class EmailCollector:
     
     def clean_email_content(self, content: str) -> str:
         """Clean and process email content"""
-        if not content:
-            return ""
-        
-        # Remove quoted text (email chains)
-        days = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
-        for day in days:
-            content = content.split(f"On {day},")[0]
-        
-        # Clean up formatting
-        content = content.replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
-        content = " ".join(content.split())  # Remove extra whitespace
-        
-        return content.strip()
+        return email_parsing.clean_email_content(content)
     
     def extract_message_data(self, message: Dict, thread_id: str) -> Optional[Dict]:
         """Extract relevant data from a Gmail message"""
-        try:
-            # Extract headers
-            headers = {}
-            if "headers" in message.get("payload", {}):
-                for header in message["payload"]["headers"]:
-                    headers[header["name"]] = header["value"]
-            
-            # Extract basic info
-            message_id = headers.get("Message-ID", "")
-            date_str = headers.get("Date", "")
-            from_header = headers.get("From", "")
-            subject = headers.get("Subject", "")
-            snippet = message.get("snippet", "")
-            
-            # Parse date
+        return email_parsing.extract_message_data(message, thread_id)
+    
+    def extract_message_content(self, payload: Dict) -> str:
+        """Recursively extract text content from email payload"""
+        return email_parsing.extract_message_content(payload)
+    
+    def get_backfill_cursor(self) -> Optional[Dict]:
+        """Get the saved backfill cursor, if a previous run did not finish"""
+        state = self.sync_state_col.find_one({"_id": "collect_all_emails"})
+        if state and not state.get("completed"):
+            return state
+        return None
+    
+    def save_backfill_cursor(self, page_token: Optional[str], last_thread_id: Optional[str],
+                             stats: Dict, completed: bool = False):
+        """Persist the backfill position (page token and last finished thread in that page)"""
+        self.sync_state_col.update_one(
+            {"_id": "collect_all_emails"},
+            {"$set": {
+                "page_token": page_token,
+                "last_thread_id": last_thread_id,
+                "threads_processed": stats["threads"],
+                "messages_processed": stats["messages"],
+                "new_messages": stats["new_messages"],
+                "completed": completed,
+                "updated_at": datetime.datetime.now()
+            }},
+            upsert=True
+        )
+    
+    def get_failed_thread_ids(self) -> List[str]:
+        """Threads that failed to fetch or parse in earlier runs (retried first)"""
+        state = self.sync_state_col.find_one({"_id": "collect_all_emails"}, {"failed_thread_ids": 1})
+        return (state or {}).get("failed_thread_ids", [])
+    
+    def record_failed_threads(self, thread_ids: List[str]):
+        """Remember failed threads before the cursor moves past them"""
+        if thread_ids:
+            self.sync_state_col.update_one(
+                {"_id": "collect_all_emails"},
+                {"$addToSet": {"failed_thread_ids": {"$each": thread_ids}}},
+                upsert=True
+            )
+    
+    def clear_failed_threads(self, thread_ids: List[str]):
+        if thread_ids:
+            self.sync_state_col.update_one(
+                {"_id": "collect_all_emails"},
+                {"$pull": {"failed_thread_ids": {"$in": thread_ids}}}
+            )
+    
+    def flush_writer(self, writer: BulkUpsertWriter, stats: Dict) -> List[str]:
+        """Flush buffered upserts and record the threads of messages that could not be written"""
+        writer.flush()
+        thread_ids = sorted({document["thread_id"] for document in writer.take_failed_documents()})
+        if thread_ids:
+            logger.error(f"Messages of {len(thread_ids)} threads could not be written, keeping them for retry")
+            stats["failed_threads"] += len(thread_ids)
+            self.record_failed_threads(thread_ids)
+        return thread_ids
+    
+    def store_threads(self, thread_ids: List[str], pipeline: IngestionPipeline, writer: BulkUpsertWriter,
+                      stats: Dict, started: float, checkpoint=None, checkpoint_every: int = 50) -> List[str]:
+        """
+        Fetch (Gmail batches) -> parse (process pool) -> write (here) a list of
+        threads, return the IDs of threads that failed.
+        
+        Threads come back in input order, so checkpoint(thread_id) is only
+        called at a point before which everything has been stored or recorded
+        as failed (threads with messages that failed to write included). A failed bulk write is raised, not blamed on one thread: its
+        buffer holds messages of other threads too, so the run stops before
+        another checkpoint is written.
+        """
+        failed = []
+        threads = self.thread_fetcher.fetch_threads(thread_ids)
+        if self.raw_archive is not None:
+            threads = self.raw_archive.archive_threads(threads)
+        parsed_threads = pipeline.process(threads, email_parsing.parse_thread)
+        for thread_id, messages in parsed_threads:
             try:
-                date_parsed = dateutil.parser.parse(date_str) if date_str else datetime.datetime.now()
-            except:
-                date_parsed = datetime.datetime.now()
-            
-            # Determine sender based on email domain
-            sender = self.determine_sender(from_header)
-            
-            # Extract message content
-            thread_message = self.extract_message_content(message["payload"])
+                if messages is None:
+                    raise RuntimeError("thread could not be fetched or parsed")
+                
+                stats["near_duplicates"] += self.near_duplicates.assign(messages)
+                for message_data in messages:
+                    stats["boilerplate_chars"] += self.boilerplate.measure_document(message_data)
             
-            if not thread_message:
-                return None
+            except Exception as e:
+                logger.error(f"Error processing thread {thread_id}: {e}")
+                failed.append(thread_id)
+                stats["failed_threads"] += 1
+                # Persisted right away, so no checkpoint can skip it
+                self.record_failed_threads([thread_id])
             
-            # Clean content
-            thread_message = self.clean_email_content(thread_message)
+            else:
+                # Upsert on message_id to avoid duplicates (outside the try, see above)
+                for message_data in messages:
+                    writer.upsert(message_data)
+                
+                stats["threads"] += 1
+                stats["run_threads"] += 1
+                stats["messages"] += len(messages)
+                stats["run_messages"] += len(messages)
             
-            if not thread_message:
-                return None
+            stats["run_attempted"] += 1
             
-            return {
-                "message_id": message_id,
-                "thread_id": thread_id,
-                "date": date_parsed,
-                "sender": sender,
-                "subject": subject,
-                "snippet": snippet,
-                "thread_message": thread_message,
-                "from_header": from_header,
-                "created_at": datetime.datetime.now(),
-                "updated_at": datetime.datetime.now()
-            }
+            if checkpoint and stats["run_attempted"] % checkpoint_every == 0:
+                failed.extend(self.flush_writer(writer, stats))
+                checkpoint(thread_id)
             
-        except Exception as e:
-            logger.error(f"Error extracting message data: {e}")
-            return None
+            # Progress update every 100 threads
+            if stats["run_attempted"] % 100 == 0:
+                self.log_throughput(stats, started)
+        
+        return failed
     
-    def extract_message_content(self, payload: Dict) -> str:
-        """Recursively extract text content from email payload"""
-        content_parts = []
+    def iter_mailbox_pages(self, stats: Dict, resume: bool = True,
+                           page_size: int = 500) -> Iterator[Tuple[Optional[str], List[str]]]:
+        """
+        Yield (page_token, thread_ids) for every page of the mailbox, following nextPageToken.
         
-        # Check direct body data
-        if "body" in payload and "data" in payload["body"]:
-            try:
-                decoded = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
-                if decoded.strip().startswith("<"):
-                    # HTML content - extract text
-                    soup = BeautifulSoup(decoded, "html.parser")
-                    text = soup.get_text()
-                    if text.strip():
-                        content_parts.append(text.strip())
-                else:
-                    # Plain text content
-                    if decoded.strip():
-                        content_parts.append(decoded.strip())
-            except Exception as e:
-                logger.warning(f"Error decoding message body: {e}")
+        When resuming, the first page only contains threads after the saved
+        last_thread_id. The caller checkpoints progress within a page with
+        save_backfill_cursor; page boundaries are checkpointed here once the
+        caller has finished with a page (i.e. when the generator is resumed).
+        """
+        page_token = None
+        skip_until = None
         
-        # Check parts recursively
-        if "parts" in payload:
-            for part in payload["parts"]:
-                part_content = self.extract_message_content(part)
-                if part_content:
-                    content_parts.append(part_content)
+        cursor = self.get_backfill_cursor() if resume else None
+        if cursor:
+            page_token = cursor.get("page_token")
+            skip_until = cursor.get("last_thread_id")
+            stats["threads"] = cursor.get("threads_processed", 0)
+            stats["messages"] = cursor.get("messages_processed", 0)
+            stats["new_messages"] = cursor.get("new_messages", 0)
+            logger.info(f"Resuming backfill after {stats['threads']} threads "
+                        f"(page token: {page_token}, last thread: {skip_until})")
         
-        return "\n".join(content_parts)
+        while True:
+            results = self.gmail_service.users().threads().list(
+                userId="me", pageToken=page_token, maxResults=page_size
+            ).execute()
+            thread_ids = [thread["id"] for thread in results.get("threads", [])]
+            
+            if skip_until:
+                if skip_until in thread_ids:
+                    thread_ids = thread_ids[thread_ids.index(skip_until) + 1:]
+                skip_until = None
+            
+            yield page_token, thread_ids
+            
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                self.save_backfill_cursor(None, None, stats, completed=True)
+                return
+            
+            # Start of the next page: nothing in it has been processed yet
+            self.save_backfill_cursor(page_token, None, stats)
+    
+    def log_throughput(self, stats: Dict, started: float, label: str = "Progress"):
+        """Log thread and message throughput for the current run"""
+        elapsed = max(time.monotonic() - started, 1e-6)
+        threads_per_sec = stats["run_threads"] / elapsed
+        messages_per_sec = stats["run_messages"] / elapsed
+        logger.info(f"{label}: {stats['threads']} threads, {stats['messages']} messages, "
+                    f"{stats['new_messages']} new | {threads_per_sec:.1f} threads/sec, "
+                    f"{messages_per_sec:.1f} messages/sec")
     
-    def collect_all_emails(self, max_threads: int = None):
-        """Collect all emails from Gmail and store in MongoDB"""
+    def collect_all_emails(self, max_threads: int = None, resume: bool = True, checkpoint_every: int = 50):
+        """
+        Collect all emails from Gmail and store in MongoDB.
+        
+        Pages through the whole mailbox and can be restarted at any point: the
+        position is kept in sync_state until the last page has been processed.
+        Threads that fail to fetch, parse or write are kept in sync_state
+        (failed_thread_ids) and retried at the start of the next run.
+        Set max_threads to stop early (the cursor is kept for the next run), or
+        resume=False to start again from the first page. Threads are fetched
+        in concurrent Gmail batch requests (see gmail_fetcher.py) and parsed
+        in a process pool (see ingestion_pipeline.py).
+        """
         try:
             logger.info("Starting email collection process...")
             
-            # Get all threads
-            results = self.gmail_service.users().threads().list(userId="me").execute()
-            threads = results.get("threads", [])
-            
-            if not threads:
-                logger.info("No threads found")
-                return
-            
-            total_threads = len(threads)
-            if max_threads:
-                threads = threads[:max_threads]
-                logger.info(f"Processing {len(threads)} of {total_threads} threads")
-            else:
-                logger.info(f"Processing all {total_threads} threads")
-            
-            processed_count = 0
-            new_messages_count = 0
-            
-            for i, thread in enumerate(threads):
-                try:
-                    thread_id = thread["id"]
-                    logger.info(f"Processing thread {i+1}/{len(threads)}: {thread_id}")
-                    
-                    # Get full thread details
-                    thread_details = self.gmail_service.users().threads().get(
-                        userId="me", id=thread_id, format="full"
-                    ).execute()
-                    
-                    if "messages" not in thread_details:
-                        continue
+            # Totals include previous runs of a resumed backfill; run_* counts
+            # only this run and is used for throughput
+            stats = {"threads": 0, "messages": 0, "new_messages": 0,
+                     "run_threads": 0, "run_messages": 0, "run_attempted": 0,
+                     "failed_threads": 0, "near_duplicates": 0, "boilerplate_chars": 0}
+            started = time.monotonic()
+            
+            def count_new_message(message_data: Dict):
+                stats["new_messages"] += 1
+                logger.debug(f"New message stored: {message_data['message_id']}")
+            
+            # Messages are written in unordered bulk upserts; the writer is
+            # flushed before every cursor checkpoint so the cursor never
+            # points past unwritten messages
+            writer = BulkUpsertWriter(self.original_emails_col, on_upsert=count_new_message)
+            
+            with IngestionPipeline() as pipeline:
+                # Threads that failed in earlier runs first
+                retry_ids = self.get_failed_thread_ids()
+                if retry_ids:
+                    logger.info(f"Retrying {len(retry_ids)} threads that failed in earlier runs...")
+                    still_failed = self.store_threads(retry_ids, pipeline, writer, stats, started)
+                    still_failed += self.flush_writer(writer, stats)
+                    self.clear_failed_threads([thread_id for thread_id in retry_ids if thread_id not in still_failed])
+                
+                for page_token, thread_ids in self.iter_mailbox_pages(stats, resume=resume):
+                    if max_threads:
+                        thread_ids = thread_ids[:max(max_threads - stats["run_attempted"], 0)]
                     
-                    # Process each message in the thread
-                    for message in thread_details["messages"]:
-                        message_data = self.extract_message_data(message, thread_id)
-                        
-                        if message_data:
-                            try:
-                                # Insert with upsert to avoid duplicates
-                                result = self.original_emails_col.replace_one(
-                                    {"message_id": message_data["message_id"]},
-                                    message_data,
-                                    upsert=True
-                                )
-                                
-                                if result.upserted_id:
-                                    new_messages_count += 1
-                                    logger.debug(f"New message stored: {message_data['message_id']}")
-                                
-                            except pymongo.errors.DuplicateKeyError:
-                                logger.debug(f"Message already exists: {message_data['message_id']}")
-                            except Exception as e:
-                                logger.error(f"Error storing message: {e}")
+                    self.store_threads(
+                        thread_ids, pipeline, writer, stats, started,
+                        checkpoint=lambda thread_id: self.save_backfill_cursor(page_token, thread_id, stats),
+                        checkpoint_every=checkpoint_every
+                    )
                     
-                    processed_count += 1
+                    # The generator checkpoints the page boundary when resumed
+                    self.flush_writer(writer, stats)
                     
-                    # Progress update every 10 threads
-                    if (i + 1) % 10 == 0:
-                        logger.info(f"Processed {i+1} threads, {new_messages_count} new messages")
+                    if max_threads and stats["run_attempted"] >= max_threads:
+                        logger.info(f"Reached max_threads={max_threads}, stopping (backfill can be resumed)")
+                        if thread_ids:
+                            self.save_backfill_cursor(page_token, thread_ids[-1], stats)
+                        break
                 
-                except Exception as e:
-                    logger.error(f"Error processing thread {thread_id}: {e}")
-                    continue
-            
-            logger.info(f"Collection complete! Processed {processed_count} threads, {new_messages_count} new messages")
+            self.flush_writer(writer, stats)
+            self.log_throughput(stats, started, label="Collection complete")
+            logger.info(f"Near-duplicates flagged this run: {stats['near_duplicates']}")
+            logger.info(f"Boilerplate found this run: {stats['boilerplate_chars']} chars "
+                        f"({stats['boilerplate_chars'] / max(stats['run_messages'], 1):.0f} per message)")
+            if writer.totals.failed:
+                logger.warning(f"{writer.totals.failed} messages could not be written")
+            if stats["failed_threads"]:
+                logger.warning(f"{stats['failed_threads']} threads failed this run; "
+                               f"{len(self.get_failed_thread_ids())} are kept for retry on the next run")
             
             # Print summary statistics
             self.print_collection_summary()
@@ -325,8 +407,9 @@ def main():
     try:
         collector = EmailCollector()
         
-        # Collect all emails (remove max_threads parameter to collect all)
-        collector.collect_all_emails(max_threads=100)  # Limit for testing
+        # Collect the whole mailbox; rerun after an interruption to resume
+        # (pass max_threads to process a limited number of threads per run)
+        collector.collect_all_emails()
         
     except Exception as e:
         logger.error(f"Application error: {e}")
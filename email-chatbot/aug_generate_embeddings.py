@@ -1,17 +1,63 @@
+import argparse
 import pymongo
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Set
-from sentence_transformers import SentenceTransformer, util
+from itertools import islice
+from typing import Dict, List, Optional
 import numpy as np
 
+from boilerplate import BoilerplateModel
+from bulk_writer import byte_batches, insert_many_unordered
+from config import AIConfig, DatabaseConfig, EmbeddingWorkerConfig
+from encoding_pool import EncodingPool
+from model_registry import get_model
+from vector_storage import decode_vector, encode_vector, vector_length
+from embedding_scheduler import BACKFILL, RECENT, UNANSWERED, EmbeddingPriorityScheduler
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# original_emails.embedding_status once a message's embedding has been written
+EMBEDDED = "embedded"
+EMBEDDING_STATUS_BACKFILL_ID = "embedding_status_backfill"
+
+# Fields of pending messages kept in memory for scheduling; full documents
+# are loaded one window at a time
+SCHEDULING_FIELDS = {"_id": 1, "message_id": 1, "thread_id": 1, "sender": 1, "date": 1}
+
+def text_lengths(model, texts: List[str]) -> List[int]:
+    """Token count of each text (character count if the model has no tokenizer)"""
+    try:
+        return [len(ids) for ids in model.tokenizer(texts, add_special_tokens=False)["input_ids"]]
+    except Exception:
+        return [len(text) for text in texts]
+
+def encode_length_sorted(model, texts: List[str], batch_size: int = AIConfig.EMBEDDING_BATCH_SIZE) -> List[np.ndarray]:
+    """
+    Encode texts in batches of similar length and return vectors in input order.
+    
+    A batch is padded to its longest text, so sorting by token length first
+    keeps padding (wasted compute) to a minimum.
+    """
+    lengths = text_lengths(model, texts)
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+    
+    vectors = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        encoded = model.encode([texts[i] for i in indices], batch_size=batch_size,
+                               convert_to_numpy=True, show_progress_bar=False)
+        for i, vector in zip(indices, encoded):
+            vectors[i] = vector
+    return vectors
+
 class IncrementalEmailEmbeddingGenerator:
     def __init__(self):
+        # Worker processes for backfills (start_encoding_pool); None encodes in-process
+        self.encoding_pool = None
         self.setup_database()
         self.setup_model()
     
@@ -28,9 +74,14 @@ class IncrementalEmailEmbeddingGenerator:
             self.email_chatbot_db = self.mdb_client.email_chatbot
             self.original_emails_col = self.email_chatbot_db.original_emails
             self.email_embeddings_col = self.email_chatbot_db.email_embeddings  # New collection name
+            self.sync_state_col = self.email_chatbot_db.sync_state
+            # Signatures / footers are not embedded (messages stored before the
+            # boilerplate model existed still contain them)
+            self.boilerplate = BoilerplateModel.load(self.email_chatbot_db)
             
             # Create indexes for the email embeddings collection
             self.create_embedding_indexes()
+            self.backfill_embedding_status()
             
             logger.info("Database connection established successfully")
             
@@ -53,6 +104,8 @@ class IncrementalEmailEmbeddingGenerator:
             self.email_embeddings_col.create_index([("thread_id", 1), ("date", 1)])
             # Index on embedded_at for tracking when embeddings were created
             self.email_embeddings_col.create_index("embedded_at")
+            # Pending (not yet embedded) messages are found through this index
+            self.original_emails_col.create_index([("embedding_status", 1), ("message_class", 1)])
             
             logger.info("Email embeddings collection indexes created successfully")
             
@@ -63,44 +116,102 @@ class IncrementalEmailEmbeddingGenerator:
         """Initialize the SentenceTransformer model"""
         try:
             logger.info("Loading SentenceTransformer model...")
-            self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+            # One shared instance per process (model_registry.py); encodes go
+            # through the shared on-disk cache (embedding_cache.py)
+            self.model = get_model('sentence-transformers/all-MiniLM-L6-v2')
             logger.info("SentenceTransformer model loaded successfully")
             
         except Exception as e:
             logger.error(f"Failed to load SentenceTransformer model: {e}")
             raise
     
-    def get_existing_embedded_message_ids(self) -> Set[str]:
-        """Get set of message IDs that already have embeddings"""
+    def start_encoding_pool(self, workers: int):
+        """Encode with a pool of worker processes (one model each) instead of self.model"""
+        if workers > 1:
+            self.encoding_pool = EncodingPool(workers)
+            self.encoding_pool.warm_up()
+    
+    def close_encoding_pool(self):
+        if self.encoding_pool:
+            self.encoding_pool.close()
+            self.encoding_pool = None
+    
+    def backfill_embedding_status(self, batch_size: int = 1000):
+        """Set embedding_status on messages embedded before the field existed (runs once)"""
         try:
-            logger.info("Fetching existing embedded message IDs...")
-            existing_ids = set(self.email_embeddings_col.distinct("message_id"))
-            logger.info(f"Found {len(existing_ids)} existing embedded messages")
-            return existing_ids
+            if self.sync_state_col.find_one({"_id": EMBEDDING_STATUS_BACKFILL_ID}):
+                return
+            
+            logger.info("Marking already embedded messages in original_emails...")
+            marked = 0
+            message_ids = []
+            cursor = self.email_embeddings_col.find({}, {"message_id": 1, "_id": 0}).batch_size(batch_size)
+            for doc in cursor:
+                message_ids.append(doc.get("message_id"))
+                if len(message_ids) >= batch_size:
+                    marked += self.mark_embedded(message_ids)
+                    message_ids = []
+            marked += self.mark_embedded(message_ids)
+            
+            self.sync_state_col.update_one(
+                {"_id": EMBEDDING_STATUS_BACKFILL_ID},
+                {"$set": {"marked": marked, "completed_at": datetime.now()}},
+                upsert=True
+            )
+            logger.info(f"Marked {marked} messages as embedded")
             
         except Exception as e:
-            logger.error(f"Error fetching existing embedded message IDs: {e}")
-            return set()
+            logger.error(f"Error backfilling embedding status: {e}")
+            raise
     
-    def get_emails_needing_embeddings(self, existing_embedded_ids: Set[str]) -> List[Dict]:
-        """Get emails from original collection that don't have embeddings yet"""
+    def mark_embedded(self, message_ids: List[str]) -> int:
+        """Record in original_emails that these messages have embeddings"""
+        if not message_ids:
+            return 0
+        result = self.original_emails_col.update_many(
+            {"message_id": {"$in": message_ids}},
+            {"$set": {"embedding_status": EMBEDDED}}
+        )
+        return result.modified_count
+    
+    def pending_embeddings_query(self) -> Dict:
+        """Messages without an embedding; auto-replies, newsletters and bounces
+        (message_class set) are never embedded"""
+        return {"embedding_status": {"$ne": EMBEDDED}, "message_class": None}
+    
+    def count_emails_needing_embeddings(self) -> int:
+        return self.original_emails_col.count_documents(self.pending_embeddings_query())
+    
+    def get_emails_needing_embeddings(self, batch_size: int = 1000, since: Optional[datetime] = None,
+                                      before: Optional[datetime] = None):
+        """
+        Streaming cursor over the scheduling fields of emails that don't have
+        embeddings yet: dated since a cutoff newest first, dated before it
+        (or undated) oldest first, or all oldest first.
+        """
         try:
             logger.info("Finding emails that need embeddings...")
             
-            # Query for emails not in the embedded collection
-            query = {"message_id": {"$nin": list(existing_embedded_ids)}} if existing_embedded_ids else {}
+            query = self.pending_embeddings_query()
+            direction = 1
+            if since is not None:
+                query["date"] = {"$gte": since}
+                direction = -1
+            elif before is not None:
+                query["$or"] = [{"date": {"$lt": before}}, {"date": None}]
             
-            emails_needing_embeddings = list(
-                self.original_emails_col.find(query).sort("date", 1)
-            )
-            
-            logger.info(f"Found {len(emails_needing_embeddings)} emails needing embeddings")
-            return emails_needing_embeddings
+            return self.original_emails_col.find(query, SCHEDULING_FIELDS).sort("date", direction).batch_size(batch_size)
             
         except Exception as e:
             logger.error(f"Error finding emails needing embeddings: {e}")
             return []
     
+    def load_documents(self, stubs: List[Dict]) -> List[Dict]:
+        """Full original_emails documents for scheduled stubs, in the same order"""
+        documents = {doc["_id"]: doc for doc in
+                     self.original_emails_col.find({"_id": {"$in": [stub["_id"] for stub in stubs]}})}
+        return [documents[stub["_id"]] for stub in stubs if stub["_id"] in documents]
+    
     def preprocess_text_for_embedding(self, text: str) -> str:
         """Preprocess text before generating embeddings"""
         if not text:
@@ -137,100 +248,175 @@ class IncrementalEmailEmbeddingGenerator:
             logger.error(f"Error generating embedding: {e}")
             return []
     
-    def create_embedded_document(self, original_doc: Dict) -> Optional[Dict]:
-        """Create embedded document from original email document"""
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for many texts in length-sorted batches ([] for empty texts)"""
+        embeddings = [[] for _ in texts]
         try:
-            # Generate embedding for the thread message
-            message_embedding = self.generate_embedding(original_doc.get("thread_message", ""))
-            
-            if not message_embedding:
-                logger.warning(f"Failed to generate embedding for message: {original_doc.get('message_id', 'unknown')}")
-                return None
-            
-            # Create embedded document with all original fields plus embedding
-            embedded_doc = {
-                "message_id": original_doc.get("message_id", ""),
-                "thread_id": original_doc.get("thread_id", ""),
-                "date": original_doc.get("date", datetime.now()),
-                "sender": original_doc.get("sender", ""),
-                "subject": original_doc.get("subject", ""),
-                "snippet": original_doc.get("snippet", ""),
-                "thread_message": original_doc.get("thread_message", ""),
-                "from_header": original_doc.get("from_header", ""),
-                "message_embeddings": message_embedding,
-                "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
-                "embedding_dimension": len(message_embedding),
-                "original_created_at": original_doc.get("created_at", datetime.now()),
-                "original_updated_at": original_doc.get("updated_at", datetime.now()),
-                "embedded_at": datetime.now()
-            }
-            
-            return embedded_doc
+            processed = [self.preprocess_text_for_embedding(text) for text in texts]
+            indices = [i for i, text in enumerate(processed) if text.strip()]
+            if not indices:
+                return embeddings
+            
+            texts_to_encode = [processed[i] for i in indices]
+            if self.encoding_pool:
+                vectors = self.encoding_pool.encode(texts_to_encode)
+            else:
+                vectors = encode_length_sorted(self.model, texts_to_encode)
+            for i, vector in zip(indices, vectors):
+                embeddings[i] = vector.tolist()
+            return embeddings
             
         except Exception as e:
-            logger.error(f"Error creating embedded document: {e}")
-            return None
+            logger.error(f"Error generating embeddings for {len(texts)} texts: {e}")
+            return embeddings
+    
+    def get_canonical_embedding(self, canonical_id: str, pending_docs: List[Dict]) -> List[float]:
+        """Embedding of a near-duplicate's canonical message (pending batch first, then stored)"""
+        for doc in pending_docs:
+            if doc["message_id"] == canonical_id:
+                return decode_vector(doc["message_embeddings"]).tolist()
+        
+        canonical = self.email_embeddings_col.find_one(
+            {"message_id": canonical_id}, {"message_embeddings": 1}
+        )
+        return decode_vector(canonical.get("message_embeddings")).tolist() if canonical else []
+    
+    def build_embedded_document(self, original_doc: Dict, thread_message: str, message_embedding: List[float]) -> Dict:
+        """Embedded document with all original fields plus the embedding"""
+        return {
+            "message_id": original_doc.get("message_id", ""),
+            "thread_id": original_doc.get("thread_id", ""),
+            "date": original_doc.get("date", datetime.now()),
+            "sender": original_doc.get("sender", ""),
+            "subject": original_doc.get("subject", ""),
+            "snippet": original_doc.get("snippet", ""),
+            "thread_message": thread_message,
+            "from_header": original_doc.get("from_header", ""),
+            "duplicate_of": original_doc.get("duplicate_of"),
+            # Array or packed binary vector, per DatabaseConfig.VECTOR_STORAGE
+            "message_embeddings": encode_vector(message_embedding),
+            "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
+            "embedding_dimension": len(message_embedding),
+            "original_created_at": original_doc.get("created_at", datetime.now()),
+            "original_updated_at": original_doc.get("updated_at", datetime.now()),
+            "embedded_at": datetime.now()
+        }
+    
+    def create_embedded_documents(self, original_docs: List[Dict], pending_docs: Optional[List[Dict]] = None) -> List[Optional[Dict]]:
+        """Create embedded documents for many emails with one batched encode (None where it failed)"""
+        try:
+            pending_docs = pending_docs or []
+            batch_ids = {doc.get("message_id") for doc in original_docs}
+            thread_messages = [self.boilerplate.strip(doc.get("thread_message", ""))[0] for doc in original_docs]
+            embeddings = [[] for _ in original_docs]
+            
+            # Near-duplicates reuse the canonical message's vector instead of encoding again
+            for i, doc in enumerate(original_docs):
+                duplicate_of = doc.get("duplicate_of")
+                if duplicate_of and duplicate_of not in batch_ids:
+                    embeddings[i] = self.get_canonical_embedding(duplicate_of, pending_docs)
+            
+            to_encode = [i for i, doc in enumerate(original_docs)
+                         if not embeddings[i] and doc.get("duplicate_of") not in batch_ids]
+            for i, embedding in zip(to_encode, self.generate_embeddings([thread_messages[i] for i in to_encode])):
+                embeddings[i] = embedding
+            
+            # Duplicates of a message in this batch take its fresh vector
+            batch_embeddings = {doc.get("message_id"): embeddings[i] for i, doc in enumerate(original_docs)}
+            for i, doc in enumerate(original_docs):
+                duplicate_of = doc.get("duplicate_of")
+                if not embeddings[i] and duplicate_of in batch_ids:
+                    embeddings[i] = batch_embeddings.get(duplicate_of) or self.generate_embedding(thread_messages[i])
+            
+            embedded_docs = []
+            for doc, thread_message, embedding in zip(original_docs, thread_messages, embeddings):
+                if not embedding:
+                    logger.warning(f"Failed to generate embedding for message: {doc.get('message_id', 'unknown')}")
+                    embedded_docs.append(None)
+                    continue
+                embedded_docs.append(self.build_embedded_document(doc, thread_message, embedding))
+            return embedded_docs
+            
+        except Exception as e:
+            logger.error(f"Error creating embedded documents: {e}")
+            return [None] * len(original_docs)
+    
+    def create_embedded_document(self, original_doc: Dict, pending_docs: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """Create embedded document from original email document"""
+        return self.create_embedded_documents([original_doc], pending_docs=pending_docs)[0]
     
     def process_new_embeddings(self, batch_size: int = 50) -> int:
         """Process only emails that don't have embeddings yet"""
         try:
             logger.info("Starting incremental embedding generation...")
             
-            # Get existing embedded message IDs
-            existing_embedded_ids = self.get_existing_embedded_message_ids()
-            
-            # Get emails that need embeddings
-            emails_needing_embeddings = self.get_emails_needing_embeddings(existing_embedded_ids)
+            # Unanswered guest threads first, then recent mail, then backfill;
+            # pending messages are pulled from the two cursors a window at a time
+            scheduler = EmbeddingPriorityScheduler(self.original_emails_col)
+            cutoff = scheduler.priority_cutoff()
+            scheduler.add_source(self.get_emails_needing_embeddings(since=cutoff), tiers=(UNANSWERED, RECENT))
+            scheduler.add_source(self.get_emails_needing_embeddings(before=cutoff), tiers=(BACKFILL,))
+            total_pending = self.count_emails_needing_embeddings()
+            scheduler.save_metrics(self.sync_state_col, pending=total_pending)
             
-            if not emails_needing_embeddings:
+            if not total_pending:
                 logger.info("No new emails found that need embeddings")
                 return 0
             
-            logger.info(f"Processing {len(emails_needing_embeddings)} new emails for embedding generation")
+            logger.info(f"Processing {total_pending} new emails for embedding generation")
             
             processed_count = 0
             successful_embeddings = 0
+            duplicate_embeddings = 0
             failed_embeddings = 0
-            batch_docs = []
             
-            for i, email_doc in enumerate(emails_needing_embeddings):
-                try:
-                    # Create embedded document
-                    embedded_doc = self.create_embedded_document(email_doc)
+            # Each window is encoded in length-sorted batches; its MongoDB write
+            # runs in the background while the next window is encoded
+            scheduled = scheduler.schedule()
+            # A pool gets one sort window per worker at a time
+            window_size = AIConfig.EMBEDDING_SORT_WINDOW * (self.encoding_pool.workers if self.encoding_pool else 1)
+            previous_docs = []
+            pending_write = None
+            with ThreadPoolExecutor(max_workers=1) as write_pool:
+                while True:
+                    window = self.load_documents(list(islice(scheduled, window_size)))
+                    if not window:
+                        break
                     
-                    if embedded_doc:
-                        batch_docs.append(embedded_doc)
-                        
-                        # Process batch when it reaches batch_size
-                        if len(batch_docs) >= batch_size:
-                            batch_success, batch_failed = self.insert_batch(batch_docs)
-                            successful_embeddings += batch_success
-                            failed_embeddings += batch_failed
-                            batch_docs = []
-                            
-                            logger.info(f"Progress: {i+1}/{len(emails_needing_embeddings)} processed, "
-                                      f"{successful_embeddings} successful, {failed_embeddings} failed")
-                    else:
-                        failed_embeddings += 1
+                    embedded_docs = self.create_embedded_documents(window, pending_docs=previous_docs)
+                    ready_docs = [doc for doc in embedded_docs if doc]
+                    failed_embeddings += len(window) - len(ready_docs)
+                    processed_count += len(window)
                     
-                    processed_count += 1
+                    # At most one write in flight
+                    if pending_write:
+                        batch_success, batch_duplicates, batch_failed = pending_write.result()
+                        successful_embeddings += batch_success
+                        duplicate_embeddings += batch_duplicates
+                        failed_embeddings += batch_failed
+                    pending_write = write_pool.submit(self.insert_batches, ready_docs, batch_size)
+                    # Canonical vectors of the window being written are looked up here first
+                    previous_docs = ready_docs
                     
-                except Exception as e:
-                    logger.error(f"Error processing email {email_doc.get('message_id', 'unknown')}: {e}")
-                    failed_embeddings += 1
-                    processed_count += 1
-                    continue
-            
-            # Process remaining batch
-            if batch_docs:
-                batch_success, batch_failed = self.insert_batch(batch_docs)
-                successful_embeddings += batch_success
-                failed_embeddings += batch_failed
+                    logger.info(f"Progress: {processed_count}/{total_pending} processed, "
+                              f"{successful_embeddings} successful, {duplicate_embeddings} already embedded, "
+                              f"{failed_embeddings} failed, "
+                              f"queued: {scheduler.depths()}")
+                    scheduler.save_metrics(self.sync_state_col, pending=total_pending - processed_count)
+                
+                if pending_write:
+                    batch_success, batch_duplicates, batch_failed = pending_write.result()
+                    successful_embeddings += batch_success
+                    duplicate_embeddings += batch_duplicates
+                    failed_embeddings += batch_failed
+            scheduler.save_metrics(self.sync_state_col, pending=total_pending - processed_count)
             
             logger.info("=== Incremental Embedding Generation Complete ===")
             logger.info(f"Emails processed: {processed_count}")
             logger.info(f"Successful embeddings: {successful_embeddings}")
+            logger.info(f"Already embedded: {duplicate_embeddings}")
             logger.info(f"Failed embeddings: {failed_embeddings}")
+            logger.info(f"Embedded by priority: {scheduler.dispatched}")
             
             if successful_embeddings > 0:
                 self.print_recent_embeddings(successful_embeddings)
@@ -241,28 +427,37 @@ class IncrementalEmailEmbeddingGenerator:
             logger.error(f"Error in process_new_embeddings: {e}")
             raise
     
-    def insert_batch(self, batch_docs: List[Dict]) -> tuple[int, int]:
-        """Insert a batch of embedded documents, return (successful, failed) counts"""
+    def insert_batches(self, embedded_docs: List[Dict], batch_size: int) -> tuple[int, int, int]:
+        """Insert embedded documents in batches of up to batch_size documents and
+        WRITE_BATCH_MAX_BYTES of BSON, return (successful, duplicate, failed) counts"""
         successful = 0
+        duplicates = 0
         failed = 0
-        
-        for doc in batch_docs:
-            try:
-                # Insert only if doesn't exist (using message_id uniqueness)
-                self.email_embeddings_col.insert_one(doc)
-                successful += 1
-                logger.debug(f"Successfully embedded: {doc.get('message_id', 'unknown')}")
-                
-            except pymongo.errors.DuplicateKeyError:
-                # Document already exists (shouldn't happen with our pre-filtering, but just in case)
-                logger.debug(f"Embedding already exists for: {doc.get('message_id', 'unknown')}")
-                failed += 1
-                
-            except Exception as e:
-                logger.error(f"Error inserting embedding for {doc.get('message_id', 'unknown')}: {e}")
-                failed += 1
-        
-        return successful, failed
+        for batch in byte_batches(embedded_docs, batch_size, DatabaseConfig.WRITE_BATCH_MAX_BYTES):
+            batch_success, batch_duplicates, batch_failed = self.insert_batch(batch)
+            successful += batch_success
+            duplicates += batch_duplicates
+            failed += batch_failed
+        return successful, duplicates, failed
+    
+    def insert_batch(self, batch_docs: List[Dict]) -> tuple[int, int, int]:
+        """
+        Insert a batch of embedded documents with one unordered insert_many,
+        return (successful, duplicate, failed) counts. Duplicates are messages
+        that already had an embedding; only real write errors count as failed.
+        """
+        try:
+            # Existing embeddings (unique message_id) are reported as duplicates, not errors
+            summary = insert_many_unordered(self.email_embeddings_col, batch_docs)
+            if summary.duplicates:
+                logger.debug(f"{summary.duplicates} embeddings already existed")
+            
+            self.mark_embedded(summary.stored_keys)
+            return summary.inserted, summary.duplicates, summary.failed
+            
+        except Exception as e:
+            logger.error(f"Error inserting batch of {len(batch_docs)} embeddings: {e}")
+            return 0, 0, len(batch_docs)
     
     def print_recent_embeddings(self, count: int):
         """Print information about recently created embeddings"""
@@ -288,6 +483,10 @@ class IncrementalEmailEmbeddingGenerator:
             original_bsri = self.original_emails_col.count_documents({"sender": "BSRI Team"})
             # Also check for legacy "Events Team" entries
             original_events_legacy = self.original_emails_col.count_documents({"sender": "Events Team"})
+            # Auto-replies, newsletters and bounces are not embedded
+            original_automated = self.original_emails_col.count_documents({"message_class": {"$ne": None}})
+            total_embeddable = total_original - original_automated
+            emails_needing_embeddings = self.count_emails_needing_embeddings()
 
             # Embedded emails stats
             total_embedded = self.email_embeddings_col.count_documents({})
@@ -296,8 +495,10 @@ class IncrementalEmailEmbeddingGenerator:
             # Also check for legacy "Events Team" entries
             embedded_events_legacy = self.email_embeddings_col.count_documents({"sender": "Events Team"})
             
-            # Calculate coverage
-            coverage_percentage = (total_embedded / total_original * 100) if total_original > 0 else 0
+            # Calculate coverage from embedding_status (email_embeddings may hold
+            # vectors of messages that are no longer embeddable)
+            coverage_percentage = ((total_embeddable - emails_needing_embeddings) / total_embeddable * 100
+                                   if total_embeddable > 0 else 0)
             
             logger.info("=== Collection Statistics ===")
             logger.info(f"Original Emails Collection:")
@@ -306,6 +507,8 @@ class IncrementalEmailEmbeddingGenerator:
             logger.info(f"  BSRI Team: {original_bsri}")
             if original_events_legacy > 0:
                 logger.info(f"  Events Team (legacy): {original_events_legacy}")
+            if original_automated > 0:
+                logger.info(f"  Automated (not embedded): {original_automated}")
             logger.info(f"")
             logger.info(f"Email Embeddings Collection:")
             logger.info(f"  Total: {total_embedded}")
@@ -314,10 +517,10 @@ class IncrementalEmailEmbeddingGenerator:
             if embedded_events_legacy > 0:
                 logger.info(f"  Events Team (legacy): {embedded_events_legacy}")
             logger.info(f"")
-            logger.info(f"Coverage: {coverage_percentage:.1f}% ({total_embedded}/{total_original})")
+            logger.info(f"Coverage: {coverage_percentage:.1f}% "
+                        f"({total_embeddable - emails_needing_embeddings}/{total_embeddable})")
             
             # Emails needing embeddings
-            emails_needing_embeddings = total_original - total_embedded
             if emails_needing_embeddings > 0:
                 logger.info(f"⚠️  Emails needing embeddings: {emails_needing_embeddings}")
             else:
@@ -349,7 +552,7 @@ class IncrementalEmailEmbeddingGenerator:
             sample_doc = self.email_embeddings_col.find_one({"message_embeddings": {"$exists": True}})
             if sample_doc and "message_embeddings" in sample_doc:
                 expected_dim = 384  # all-MiniLM-L6-v2 dimension
-                actual_dim = len(sample_doc["message_embeddings"])
+                actual_dim = vector_length(sample_doc["message_embeddings"])
                 
                 if actual_dim == expected_dim:
                     logger.info(f"✅ Embedding dimensions correct: {actual_dim}")
@@ -382,6 +585,11 @@ class IncrementalEmailEmbeddingGenerator:
 
 def main():
     """Main function - designed to be run after new emails are added"""
+    parser = argparse.ArgumentParser(description="Generate embeddings for new emails")
+    parser.add_argument("--workers", type=int, default=EmbeddingWorkerConfig.BACKFILL_WORKERS,
+                        help="encoding processes for large backfills (default: in-process)")
+    args = parser.parse_args()
+    
     try:
         generator = IncrementalEmailEmbeddingGenerator()
         
@@ -390,7 +598,11 @@ def main():
         generator.get_collection_stats()
         
         # Process only new emails that need embeddings
-        new_embeddings_count = generator.process_new_embeddings(batch_size=50)
+        generator.start_encoding_pool(args.workers)
+        try:
+            new_embeddings_count = generator.process_new_embeddings(batch_size=50)
+        finally:
+            generator.close_encoding_pool()
         
         if new_embeddings_count > 0:
             # Show updated statistics
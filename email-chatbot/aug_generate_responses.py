@@ -18,9 +18,12 @@ import logging
 import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from sentence_transformers import SentenceTransformer
 from openai import AzureOpenAI
 
+from boilerplate import BoilerplateModel
+from model_registry import get_model
+from vector_storage import search_score, vector_search_stage
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -44,6 +47,8 @@ class EmailResponseGenerator:
             self.email_chatbot_db = self.mdb_client.email_chatbot
             self.original_emails_col = self.email_chatbot_db.original_emails
             self.email_embeddings_col = self.email_chatbot_db.email_embeddings
+            # Signatures / footers are kept out of the prompt
+            self.boilerplate = BoilerplateModel.load(self.email_chatbot_db)
             
             logger.info("Database connection established successfully")
             
@@ -79,7 +84,9 @@ class EmailResponseGenerator:
         """Initialize the SentenceTransformer model"""
         try:
             logger.info("Loading SentenceTransformer model...")
-            self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+            # One shared instance per process (model_registry.py); encodes go
+            # through the shared on-disk cache (embedding_cache.py)
+            self.model = get_model('sentence-transformers/all-MiniLM-L6-v2')
             logger.info("SentenceTransformer model loaded successfully")
             
         except Exception as e:
@@ -94,10 +101,12 @@ class EmailResponseGenerator:
             # Get recent guest messages
             since_date = datetime.now() - timedelta(days=days_back)
             
-            # Find all recent guest messages
+            # Find all recent guest messages (auto-replies, newsletters and
+            # bounces have message_class set and never need an answer)
             recent_guest_messages = list(
                 self.original_emails_col.find({
                     "sender": "Guest",
+                    "message_class": None,
                     "date": {"$gte": since_date}
                 }).sort("date", -1)
             )
@@ -114,9 +123,11 @@ class EmailResponseGenerator:
                 
                 processed_threads.add(thread_id)
                 
-                # Get the latest message in this thread
+                # Get the latest message in this thread, ignoring automated
+                # mail (e.g. our own out-of-office reply does not answer a guest)
                 latest_message = self.original_emails_col.find({
-                    "thread_id": thread_id
+                    "thread_id": thread_id,
+                    "message_class": None
                 }).sort("date", -1).limit(1)
                 
                 for latest in latest_message:
@@ -146,15 +157,7 @@ class EmailResponseGenerator:
             
             # MongoDB vector search pipeline
             pipeline = [
-                {
-                    "$search": {
-                        "knnBeta": {
-                            "vector": message_vector,
-                            "path": "message_embeddings",
-                            "k": k * 3  # Get more results to filter
-                        }
-                    }
-                },
+                vector_search_stage(message_vector, "message_embeddings", k * 3),  # Get more results to filter
                 {
                     "$limit": k * 3
                 },
@@ -162,9 +165,7 @@ class EmailResponseGenerator:
                     "$project": {
                         "message_embeddings": 0,  # Exclude large embedding field
                         "_id": 0,
-                        "score": {
-                            "$meta": "searchScore"
-                        }
+                        "score": search_score()
                     }
                 }
             ]
@@ -172,14 +173,18 @@ class EmailResponseGenerator:
             # Execute search
             search_results = list(self.email_embeddings_col.aggregate(pipeline))
             
-            # Filter to get diverse thread examples (avoid multiple messages from same thread)
+            # Filter to get diverse thread examples (avoid multiple messages from same
+            # thread, and near-duplicate copies of the same message)
             seen_threads = set()
+            seen_canonical = set()
             filtered_results = []
             
             for result in search_results:
                 thread_id = result.get("thread_id")
-                if thread_id not in seen_threads:
+                canonical_id = result.get("duplicate_of") or result.get("message_id")
+                if thread_id not in seen_threads and canonical_id not in seen_canonical:
                     seen_threads.add(thread_id)
+                    seen_canonical.add(canonical_id)
                     filtered_results.append(result)
                     
                     if len(filtered_results) >= k:
@@ -231,7 +236,7 @@ Use these examples to understand our communication style and how we typically re
 
                     for msg in thread_conversation:
                         sender = msg.get("sender", "Unknown")
-                        message_text = msg.get("thread_message", "")
+                        message_text, _ = self.boilerplate.strip(msg.get("thread_message", ""))
                         date = msg.get("date", "")
 
                         # Clean and truncate message for context
@@ -1,20 +1,24 @@
 import os.path
-import base64
 import datetime
-import dateutil
 import pymongo
 import json
 import logging
 import time
-import re
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from bs4 import BeautifulSoup
+
+import email_parsing
+from boilerplate import BoilerplateModel
+from bulk_writer import BulkUpsertWriter
+from gmail_fetcher import GmailBatchFetcher
+from ingestion_pipeline import IngestionPipeline
+from near_duplicates import NearDuplicateIndex
+from raw_archive import open_archive
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,20 +31,12 @@ class EmailUpdater:
     def __init__(self):
         self.setup_database()
         self.setup_gmail_service()
+        # Raw Gmail messages are kept locally for offline re-parsing (None if disabled)
+        self.raw_archive = open_archive()
 
     def determine_sender(self, from_header: str) -> str:
         """Determine sender based on email domain"""
-        if not from_header:
-            return "Guest"
-
-        # Extract email address from header (handles formats like "Name <email@domain.com>")
-        email_match = re.search(r'<([^>]+)>|([^\s<>]+@[^\s<>]+)', from_header)
-        if email_match:
-            email_address = email_match.group(1) or email_match.group(2)
-            if email_address and "@bigsurriverinn.com" in email_address.lower():
-                return "BSRI Team"
-
-        return "Guest"
+        return email_parsing.determine_sender(from_header)
     
     def setup_database(self):
         """Initialize MongoDB connection"""
@@ -54,6 +50,12 @@ class EmailUpdater:
             # Use new database structure
             self.email_chatbot_db = self.mdb_client.email_chatbot
             self.original_emails_col = self.email_chatbot_db.original_emails
+            # Sync checkpoints (Gmail historyId, backfill cursors)
+            self.sync_state_col = self.email_chatbot_db.sync_state
+            # Flags resent inquiries and template replies (duplicate_of)
+            self.near_duplicates = NearDuplicateIndex(self.original_emails_col)
+            # Mined signatures / footers, measured here and stripped at embedding time (see boilerplate.py)
+            self.boilerplate = BoilerplateModel.load(self.email_chatbot_db)
             
             logger.info("Database connection established successfully")
             
@@ -84,6 +86,7 @@ class EmailUpdater:
                     token.write(creds.to_json())
             
             self.gmail_service = build("gmail", "v1", credentials=creds)
+            self.thread_fetcher = GmailBatchFetcher(self.gmail_service, credentials=creds)
             logger.info("Gmail service initialized successfully")
             
         except Exception as e:
@@ -111,180 +114,265 @@ class EmailUpdater:
     
     def clean_email_content(self, content: str) -> str:
         """Clean and process email content"""
-        if not content:
-            return ""
-        
-        # Remove quoted text (email chains)
-        days = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
-        for day in days:
-            content = content.split(f"On {day},")[0]
-        
-        # Clean up formatting
-        content = content.replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
-        content = " ".join(content.split())  # Remove extra whitespace
-        
-        return content.strip()
+        return email_parsing.clean_email_content(content)
     
     def extract_message_content(self, payload: Dict) -> str:
         """Recursively extract text content from email payload"""
-        content_parts = []
-        
-        # Check direct body data
-        if "body" in payload and "data" in payload["body"]:
-            try:
-                decoded = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
-                if decoded.strip().startswith("<"):
-                    # HTML content - extract text
-                    soup = BeautifulSoup(decoded, "html.parser")
-                    text = soup.get_text()
-                    if text.strip():
-                        content_parts.append(text.strip())
-                else:
-                    # Plain text content
-                    if decoded.strip():
-                        content_parts.append(decoded.strip())
-            except Exception as e:
-                logger.warning(f"Error decoding message body: {e}")
-        
-        # Check parts recursively
-        if "parts" in payload:
-            for part in payload["parts"]:
-                part_content = self.extract_message_content(part)
-                if part_content:
-                    content_parts.append(part_content)
-        
-        return "\n".join(content_parts)
+        return email_parsing.extract_message_content(payload)
     
     def extract_message_data(self, message: Dict, thread_id: str) -> Optional[Dict]:
         """Extract relevant data from a Gmail message"""
+        return email_parsing.extract_message_data(message, thread_id)
+    
+    def get_history_checkpoint(self) -> Optional[str]:
+        """Get the Gmail historyId recorded after the last successful sync"""
         try:
-            # Extract headers
-            headers = {}
-            if "headers" in message.get("payload", {}):
-                for header in message["payload"]["headers"]:
-                    headers[header["name"]] = header["value"]
-            
-            # Extract basic info
-            message_id = headers.get("Message-ID", "")
-            date_str = headers.get("Date", "")
-            from_header = headers.get("From", "")
-            subject = headers.get("Subject", "")
-            snippet = message.get("snippet", "")
-            
-            # Parse date
-            try:
-                date_parsed = dateutil.parser.parse(date_str) if date_str else datetime.datetime.now()
-            except:
-                date_parsed = datetime.datetime.now()
-            
-            # Determine sender based on email domain
-            sender = self.determine_sender(from_header)
-            
-            # Extract message content
-            thread_message = self.extract_message_content(message["payload"])
-            
-            if not thread_message:
-                return None
-            
-            # Clean content
-            thread_message = self.clean_email_content(thread_message)
-            
-            if not thread_message:
-                return None
-            
-            return {
-                "message_id": message_id,
-                "thread_id": thread_id,
-                "date": date_parsed,
-                "sender": sender,
-                "subject": subject,
-                "snippet": snippet,
-                "thread_message": thread_message,
-                "from_header": from_header,
-                "created_at": datetime.datetime.now(),
-                "updated_at": datetime.datetime.now()
-            }
+            state = self.sync_state_col.find_one({"_id": "gmail_history"})
+            if state and state.get("history_id"):
+                return state["history_id"]
+            return None
             
         except Exception as e:
-            logger.error(f"Error extracting message data: {e}")
+            logger.error(f"Error reading history checkpoint: {e}")
             return None
     
-    def check_for_new_emails(self, since_date: datetime.datetime = None):
-        """Check for new emails since the last update"""
+    def save_history_checkpoint(self, history_id: str):
+        """Persist the Gmail historyId so the next sync only sees later changes"""
+        self.sync_state_col.update_one(
+            {"_id": "gmail_history"},
+            {"$set": {"history_id": str(history_id), "updated_at": datetime.datetime.now()}},
+            upsert=True
+        )
+        logger.info(f"History checkpoint saved: {history_id}")
+    
+    def get_current_history_id(self) -> str:
+        """Get the mailbox's current historyId from the Gmail profile"""
+        profile = self.gmail_service.users().getProfile(userId="me").execute()
+        return profile["historyId"]
+    
+    def get_changed_thread_ids(self, start_history_id: str) -> Optional[Tuple[List[str], str]]:
+        """
+        Get IDs of threads that received messages since start_history_id.
+        
+        Returns (thread_ids, latest_history_id), or None if the checkpoint has
+        expired and a full scan is required.
+        """
+        thread_ids = []
+        seen_thread_ids = set()
+        latest_history_id = start_history_id
+        page_token = None
+        
+        try:
+            while True:
+                response = self.gmail_service.users().history().list(
+                    userId="me",
+                    startHistoryId=start_history_id,
+                    historyTypes=["messageAdded"],
+                    pageToken=page_token
+                ).execute()
+                
+                for record in response.get("history", []):
+                    added = [item["message"] for item in record.get("messagesAdded", [])]
+                    for message in added or record.get("messages", []):
+                        thread_id = message.get("threadId")
+                        if thread_id and thread_id not in seen_thread_ids:
+                            seen_thread_ids.add(thread_id)
+                            thread_ids.append(thread_id)
+                
+                latest_history_id = response.get("historyId", latest_history_id)
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    break
+            
+            return thread_ids, latest_history_id
+            
+        except HttpError as e:
+            # Gmail only keeps history for a limited time; an expired or
+            # invalid startHistoryId is reported as 404
+            if e.resp.status == 404:
+                logger.warning(f"History checkpoint {start_history_id} has expired")
+                return None
+            raise
+    
+    def list_all_thread_ids(self) -> List[str]:
+        """List thread IDs for a full mailbox scan, following nextPageToken"""
+        thread_ids = []
+        page_token = None
+        
+        while True:
+            results = self.gmail_service.users().threads().list(
+                userId="me", pageToken=page_token, maxResults=500
+            ).execute()
+            thread_ids.extend(thread["id"] for thread in results.get("threads", []))
+            
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return thread_ids
+    
+    def get_known_message_ids(self, message_ids: List[str], chunk_size: int = 10000) -> set:
+        """Return the subset of message_ids already stored, using one $in query per chunk"""
+        known_ids = set()
+        for i in range(0, len(message_ids), chunk_size):
+            cursor = self.original_emails_col.find(
+                {"message_id": {"$in": message_ids[i:i + chunk_size]}},
+                {"message_id": 1, "_id": 0}
+            )
+            known_ids.update(doc["message_id"] for doc in cursor)
+        return known_ids
+    
+    def find_unseen_messages(self, thread_ids: List[str]) -> Tuple[List[Tuple[str, str]], int]:
+        """
+        Phase 1 of the sync: fetch only message IDs and the Message-ID header
+        for each thread and diff them against the database.
+        
+        Returns ([(gmail_message_id, thread_id), ...] for unseen messages, failed thread count).
+        """
+        candidates = []
+        failed_count = 0
+        
+        threads = self.thread_fetcher.fetch_threads(
+            thread_ids,
+            format="metadata",
+            metadataHeaders=["Message-ID"],
+            fields="id,messages(id,payload/headers)"
+        )
+        
+        for i, (thread_id, thread_details) in enumerate(threads):
+            if thread_details is None:
+                logger.error(f"Error processing thread {thread_id}: thread could not be fetched")
+                failed_count += 1
+                continue
+            
+            for message in thread_details.get("messages", []):
+                headers = message.get("payload", {}).get("headers", [])
+                message_id = next(
+                    (h["value"] for h in headers if h["name"].lower() == "message-id"), ""
+                )
+                if message_id:
+                    candidates.append((message["id"], thread_id, message_id))
+                else:
+                    logger.debug(f"Skipping message without Message-ID header: {message['id']}")
+            
+            # Progress update every 50 threads
+            if (i + 1) % 50 == 0:
+                logger.info(f"Scanned {i+1} threads, {len(candidates)} messages")
+        
+        known_ids = self.get_known_message_ids([message_id for _, _, message_id in candidates])
+        unseen = [(gmail_id, thread_id) for gmail_id, thread_id, message_id in candidates
+                  if message_id not in known_ids]
+        
+        logger.info(f"Scanned {len(candidates)} messages, {len(unseen)} not yet stored")
+        return unseen, failed_count
+    
+    def on_new_message(self, message_data: Dict):
+        """Called by the bulk writer for every message that was inserted"""
+        logger.info(f"New message added: {message_data['sender']} - {message_data['subject'][:50]}...")
+        
+        # Special handling for guest messages
+        if message_data['sender'] == 'Guest':
+            logger.info("🔔 NEW GUEST MESSAGE DETECTED - May need response!")
+            self.log_guest_message(message_data)
+    
+    def check_for_new_emails(self, since_date: datetime.datetime = None, use_history: bool = True):
+        """
+        Check for new emails since the last update.
+        
+        With use_history, only threads changed since the stored Gmail historyId
+        are fetched. Without a checkpoint, or when it has expired, the whole
+        thread list is scanned and a fresh checkpoint is recorded.
+        
+        Threads are first fetched as metadata (message IDs and Message-ID
+        headers) and diffed against the database; full message payloads are
+        only downloaded for messages that are not stored yet.
+        """
         try:
             if since_date is None:
                 since_date = self.get_last_update_time()
             
             logger.info(f"Checking for new emails since: {since_date}")
             
-            # Get recent threads
-            results = self.gmail_service.users().threads().list(userId="me").execute()
-            threads = results.get("threads", [])
+            thread_ids = None
+            new_history_id = None
+            
+            if use_history:
+                checkpoint = self.get_history_checkpoint()
+                if checkpoint:
+                    changes = self.get_changed_thread_ids(checkpoint)
+                    if changes is not None:
+                        thread_ids, new_history_id = changes
+                        logger.info(f"History sync: {len(thread_ids)} changed threads since {checkpoint}")
+                else:
+                    logger.info("No history checkpoint found")
+            
+            if thread_ids is None:
+                logger.info("Running full thread scan...")
+                # Read the historyId before scanning so changes made during the
+                # scan are picked up again by the next incremental sync
+                if use_history:
+                    new_history_id = self.get_current_history_id()
+                thread_ids = self.list_all_thread_ids()
             
-            if not threads:
+            if not thread_ids:
                 logger.info("No threads found")
+                if new_history_id:
+                    self.save_history_checkpoint(new_history_id)
                 return
             
-            new_messages_count = 0
-            updated_threads_count = 0
-            
-            # Process threads to find new messages
-            for i, thread in enumerate(threads):
-                try:
-                    thread_id = thread["id"]
-                    
-                    # Get thread details
-                    thread_details = self.gmail_service.users().threads().get(
-                        userId="me", id=thread_id, format="full"
-                    ).execute()
-                    
-                    if "messages" not in thread_details:
-                        continue
-                    
-                    thread_has_new_messages = False
-                    
-                    # Check each message in the thread
-                    for message in thread_details["messages"]:
-                        message_data = self.extract_message_data(message, thread_id)
-                        
-                        if not message_data:
-                            continue
+            # Phase 1: message IDs and Message-ID headers only
+            unseen_messages, failed_count = self.find_unseen_messages(thread_ids)
+            
+            # Phase 2: full payloads for unseen messages only, written with
+            # unordered bulk upserts ($setOnInsert, so existing messages are
+            # never overwritten)
+            updated_threads = set()
+            thread_by_message = dict(unseen_messages)
+            
+            def record_new_message(message_data: Dict):
+                updated_threads.add(message_data["thread_id"])
+                self.on_new_message(message_data)
+            
+            writer = BulkUpsertWriter(self.original_emails_col, on_upsert=record_new_message)
+            
+            full_messages = self.thread_fetcher.fetch_messages(
+                list(thread_by_message),
+                format="full",
+                fields="id,threadId,labelIds,snippet,internalDate,payload"
+            )
+            if self.raw_archive is not None:
+                full_messages = self.raw_archive.archive_messages(full_messages)
+            
+            # Parse in a process pool unless there are only a few messages
+            with IngestionPipeline(inline=len(thread_by_message) < 50) as pipeline:
+                for gmail_id, messages in pipeline.process(full_messages, email_parsing.parse_message):
+                    thread_id = thread_by_message[gmail_id]
+                    try:
+                        if messages is None:
+                            raise RuntimeError("message could not be fetched or parsed")
                         
-                        # Check if this is a new message
-                        existing_message = self.original_emails_col.find_one({
-                            "message_id": message_data["message_id"]
-                        })
-                        
-                        if not existing_message:
-                            # This is a new message
-                            try:
-                                self.original_emails_col.insert_one(message_data)
-                                new_messages_count += 1
-                                thread_has_new_messages = True
-                                
-                                logger.info(f"New message added: {message_data['sender']} - {message_data['subject'][:50]}...")
-                                
-                                # Special handling for guest messages
-                                if message_data['sender'] == 'Guest':
-                                    logger.info("🔔 NEW GUEST MESSAGE DETECTED - May need response!")
-                                    self.log_guest_message(message_data)
-                                
-                            except Exception as e:
-                                logger.error(f"Error inserting new message: {e}")
-                    
-                    if thread_has_new_messages:
-                        updated_threads_count += 1
+                        self.near_duplicates.assign(messages)
+                        for message_data in messages:
+                            self.boilerplate.measure_document(message_data)
+                            writer.upsert(message_data, insert_only=True)
                     
-                    # Progress update every 50 threads
-                    if (i + 1) % 50 == 0:
-                        logger.info(f"Processed {i+1} threads, found {new_messages_count} new messages")
-                
-                except Exception as e:
-                    logger.error(f"Error processing thread {thread_id}: {e}")
-                    continue
+                    except Exception as e:
+                        logger.error(f"Error processing new message {gmail_id} in thread {thread_id}: {e}")
+                        failed_count += 1
+            
+            writer.flush()
+            failed_count += writer.totals.failed
+            new_messages_count = writer.totals.upserted
+            updated_threads_count = len(updated_threads)
             
             logger.info(f"Update complete! Found {new_messages_count} new messages in {updated_threads_count} threads")
             
+            # Only advance the checkpoint when every thread was stored, so
+            # failed threads and messages are retried on the next run
+            if new_history_id:
+                if failed_count == 0:
+                    self.save_history_checkpoint(new_history_id)
+                else:
+                    logger.warning(f"{failed_count} threads/messages failed, keeping previous history checkpoint")
+            
             if new_messages_count > 0:
                 self.print_recent_activity()
             
@@ -360,7 +448,7 @@ def main():
         updater = EmailUpdater()
         
         # Choose mode:
-        # 1. One-time check for new emails
+        # 1. One-time check for new emails (incremental via Gmail history)
         updater.check_for_new_emails()
         
         # 2. Continuous monitoring (uncomment to use)
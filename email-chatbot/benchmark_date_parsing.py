@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Date header parsing (email_dates.py)
+
+Corpus: the Date headers of the sample Gmail messages in output.json plus a
+few non-conforming headers seen in the wild (missing weekday, named zones,
+ISO 8601, trailing comments). The corpus is repeated the way a full
+collection re-parses the same threads.
+
+Reports agreement between the fast path and dateutil, and the speed of
+dateutil.parser.parse, parsedate_to_datetime and the memoized
+parse_email_date.
+
+Usage:
+    python benchmark_date_parsing.py          # 2000 rounds
+    python benchmark_date_parsing.py 10000
+"""
+
+import sys
+import time
+
+import dateutil.parser
+
+from email_dates import TZINFOS, parse_date_fast, parse_email_date, to_utc
+from fake_gmail import load_sample_messages
+
+NON_CONFORMING_HEADERS = [
+    "1 Nov 2024 17:52:32 -0700",
+    "Fri, 1 Nov 2024 17:52:32 PDT",
+    "Fri, 01 Nov 2024 17:52:32 -0700 (PDT)",
+    "Fri, 1 Nov 2024 17:52:32 +0000 (UTC)",
+    "2024-11-01T17:52:32-07:00",
+    "Friday, November 1, 2024 5:52 PM",
+]
+
+
+def load_date_headers():
+    headers = []
+    for message in load_sample_messages():
+        for header in message["payload"].get("headers", []):
+            if header["name"].lower() == "date":
+                headers.append(header["value"])
+    return headers + NON_CONFORMING_HEADERS
+
+
+def time_parser(parser, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for date_str in corpus:
+            parser(date_str)
+    return time.perf_counter() - start
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    corpus = load_date_headers()
+
+    print(f"Corpus: {len(corpus)} Date headers, {rounds} rounds")
+    print("=" * 70)
+
+    fast_hits = sum(1 for d in corpus if parse_date_fast(d))
+    print(f"Fast path parsed {fast_hits}/{len(corpus)}, rest via dateutil fallback")
+    disagree = [d for d in corpus
+                if parse_email_date(d) != to_utc(dateutil.parser.parse(d, fuzzy=True, tzinfos=TZINFOS))]
+    print(f"Agreement with dateutil: {len(corpus) - len(disagree)}/{len(corpus)}")
+    for date_str in disagree:
+        print(f"  differs: {date_str!r} -> {parse_email_date(date_str)}")
+    print("-" * 70)
+
+    legacy = time_parser(dateutil.parser.parse, corpus, rounds)
+    fast = time_parser(parse_date_fast, corpus, rounds)
+    parse_email_date.cache_clear()
+    cached = time_parser(parse_email_date, corpus, rounds)
+
+    parses = len(corpus) * rounds
+    for label, elapsed in [("dateutil.parser.parse", legacy),
+                           ("parsedate_to_datetime", fast),
+                           ("parse_email_date (memoized)", cached)]:
+        print(f"{label:<32} {elapsed:7.2f}s  {parses / elapsed:11.0f} dates/sec")
+
+    print("=" * 70)
+    print(f"Memoized speedup over dateutil: {legacy / cached:.1f}x "
+          f"(uncached fast path: {legacy / fast:.1f}x)")
+    print(f"Cache: {parse_email_date.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
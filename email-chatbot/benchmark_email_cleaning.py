@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: quoted-reply and signature stripping (clean_email_content)
+
+Corpus:
+- the extracted text of every sample Gmail message in output.json
+- the golden inputs in testdata/email_cleaning
+- the generated replies in threads.json, each with the previous reply
+  quoted below it the way Gmail plain-text mail does
+
+Compares the legacy split-per-weekday implementation with the single-pass
+stripper in email_parsing.py on speed and on how much text is kept (the
+text that gets embedded and sent to the model).
+
+Usage:
+    python benchmark_email_cleaning.py          # 200 rounds
+    python benchmark_email_cleaning.py 1000
+"""
+
+import glob
+import os
+import re
+import sys
+import time
+
+from benchmark_html_extraction import load_thread_replies
+from email_parsing import clean_email_content, extract_message_content
+from fake_gmail import load_sample_messages
+
+
+def legacy_clean_email_content(content):
+    """clean_email_content as it was before the single-pass stripper"""
+    if not content:
+        return ""
+
+    days = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+    for day in days:
+        content = content.split(f"On {day},")[0]
+
+    content = content.replace("\r\n", " ")
+    content = content.replace("\n", " ")
+    content = content.replace("\r", " ")
+    content = re.sub(r'\s+', ' ', content)
+
+    return content.strip()
+
+
+def build_corpus():
+    corpus = [extract_message_content(message["payload"]) for message in load_sample_messages()]
+
+    for path in sorted(glob.glob(os.path.join("testdata", "email_cleaning", "*.input.txt"))):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            corpus.append(f.read())
+
+    replies = load_thread_replies()
+    for previous, reply in zip(replies, replies[1:]):
+        quoted = "\r\n".join(f"> {line}" for line in previous.splitlines())
+        corpus.append(f"{reply}\r\n\r\nOn Nov 1, 2024 at 5:50 PM Events Team <events@bigsurriverinn.com>\r\n"
+                      f"wrote:\r\n\r\n{quoted}\r\n")
+
+    return corpus
+
+
+def time_cleaner(cleaner, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for document in corpus:
+            cleaner(document)
+    return time.perf_counter() - start
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    corpus = build_corpus()
+    corpus_chars = sum(len(d) for d in corpus)
+
+    print(f"Corpus: {len(corpus)} messages, {corpus_chars} chars, {rounds} rounds")
+    print("=" * 70)
+
+    legacy_chars = sum(len(legacy_clean_email_content(d)) for d in corpus)
+    new_chars = sum(len(clean_email_content(d)) for d in corpus)
+    print(f"Kept text: {legacy_chars} chars legacy, {new_chars} chars single-pass "
+          f"({100 * (1 - new_chars / max(legacy_chars, 1)):.1f}% less to embed)")
+    print("-" * 70)
+
+    legacy = time_cleaner(legacy_clean_email_content, corpus, rounds)
+    single_pass = time_cleaner(clean_email_content, corpus, rounds)
+
+    docs = len(corpus) * rounds
+    for label, elapsed in [("legacy split per weekday", legacy),
+                           ("single-pass stripper", single_pass)]:
+        print(f"{label:<32} {elapsed:7.2f}s  {docs / elapsed:9.0f} docs/sec")
+
+    print("=" * 70)
+    print(f"Single-pass speedup over legacy: {legacy / single_pass:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PyTorch vs ONNX Runtime fp32 vs ONNX int8 embedding backends
+
+Corpus: the same cleaned email documents as benchmark_embedding_batching.py.
+
+For each backend, reports:
+- model load time and peak process RSS after loading
+- single-query latency (p50 / p95 over one encode() per text, the webapp
+  search path)
+- batch throughput in documents/sec (encode_length_sorted, the embedding
+  generator path)
+- min / mean cosine similarity to the PyTorch vectors (first backend run)
+
+Backends without an ONNX export are skipped
+(run: python embedding_backends.py export).
+
+Usage:
+    python benchmark_embedding_backends.py              # 2000 docs, 200 queries
+    python benchmark_embedding_backends.py 5000 500
+    python benchmark_embedding_backends.py 2000 200 onnx-int8   # one backend (for memory)
+    EMBEDDING_THREADS=1 python benchmark_embedding_backends.py
+"""
+
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+from aug_generate_embeddings import encode_length_sorted
+from benchmark_embedding_batching import build_documents
+from config import AIConfig
+from embedding_backends import BACKENDS, ONNX_INT8, PYTORCH, load_embedding_model, model_backend, onnx_model_path
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    backends = [sys.argv[3]] if len(sys.argv) > 3 else BACKENDS
+    batch_size = AIConfig.EMBEDDING_BATCH_SIZE
+
+    texts = build_documents(count)
+    queries = texts[:query_count]
+    print(f"Corpus: {count} documents, {len(queries)} single queries, batch size {batch_size}, "
+          f"threads {AIConfig.EMBEDDING_THREADS or 'default'}")
+    print(f"{'backend':<10} {'load':>7} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'docs/sec':>10} "
+          f"{'min cos':>8} {'mean cos':>9}")
+    print("=" * 75)
+
+    reference = None
+    for backend in backends:
+        if backend != PYTORCH and not os.path.exists(onnx_model_path(AIConfig.EMBEDDING_MODEL, backend == ONNX_INT8)):
+            print(f"{backend:<10} skipped (no ONNX export)")
+            continue
+
+        start = time.perf_counter()
+        model = load_embedding_model(AIConfig.EMBEDDING_MODEL, backend)
+        load_seconds = time.perf_counter() - start
+        if model_backend(model) != backend:
+            print(f"{backend:<10} skipped (did not load)")
+            continue
+
+        # Warm up (first call loads kernels)
+        model.encode(texts[:batch_size], batch_size=batch_size)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            model.encode(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        vectors = np.asarray(encode_length_sorted(model, texts, batch_size), dtype=np.float32)
+        throughput = count / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = vectors
+        similarities = np.sum(reference * vectors, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1))
+
+        print(f"{backend:<10} {load_seconds:6.2f}s {peak_rss_mb():8.0f} {np.percentile(latencies, 50):8.2f} "
+              f"{np.percentile(latencies, 95):8.2f} {throughput:10.1f} {similarities.min():8.5f} "
+              f"{similarities.mean():9.5f}")
+
+    print("-" * 75)
+    print("RSS is the process peak, so it only grows across rows; pass a single backend to compare memory")
+
+
+if __name__ == "__main__":
+    main()
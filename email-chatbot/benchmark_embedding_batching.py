@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-message vs batched, length-sorted sentence embedding
+
+Corpus: the cleaned text of the email cleaning benchmark corpus (sample
+Gmail messages, golden inputs, quoted thread replies), repeated to the
+requested number of documents and truncated the way
+preprocess_text_for_embedding does.
+
+Compares, in documents/sec:
+- the per-item loop (model.encode(text) once per email, as generate_embedding)
+- batches in arrival order
+- length-sorted batches (encode_length_sorted)
+- length-sorted batches with a simulated MongoDB write per batch, written
+  sequentially and overlapped with encoding of the next batch
+
+Also checks that batched vectors match the per-item vectors.
+
+Usage:
+    python benchmark_embedding_batching.py                 # 2000 docs, batches of 64
+    python benchmark_embedding_batching.py 5000 128
+    python benchmark_embedding_batching.py 2000 64 20      # 20 ms simulated write per batch
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from aug_generate_embeddings import encode_length_sorted
+from benchmark_email_cleaning import build_corpus
+from config import AIConfig
+from email_parsing import clean_email_content
+
+MAX_LENGTH = 500
+
+
+def build_documents(count):
+    texts = [clean_email_content(text) for text in build_corpus()]
+    texts = [text[:MAX_LENGTH] for text in texts if text.strip()]
+    return [texts[i % len(texts)] for i in range(count)]
+
+
+def per_item(model, texts):
+    return [model.encode(text) for text in texts]
+
+
+def arrival_order(model, texts, batch_size):
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(model.encode(texts[start:start + batch_size], batch_size=batch_size,
+                                    convert_to_numpy=True, show_progress_bar=False))
+    return vectors
+
+
+def with_writes(model, texts, batch_size, write_seconds, overlap):
+    """Encode windows of 8 batches and 'write' each window, optionally in the background"""
+    window = batch_size * 8
+
+    def simulated_write(docs):
+        time.sleep(write_seconds * max(len(docs) // batch_size, 1))
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = None
+        for start in range(0, len(texts), window):
+            vectors = encode_length_sorted(model, texts[start:start + window], batch_size)
+            if overlap:
+                if pending:
+                    pending.result()
+                pending = pool.submit(simulated_write, vectors)
+            else:
+                simulated_write(vectors)
+        if pending:
+            pending.result()
+
+
+def timed(label, count, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:7.2f}s  {count / elapsed:9.1f} docs/sec")
+    return result, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else AIConfig.EMBEDDING_BATCH_SIZE
+    write_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+
+    model = SentenceTransformer(AIConfig.EMBEDDING_MODEL)
+    texts = build_documents(count)
+    lengths = [len(text) for text in texts]
+    print(f"Corpus: {count} documents, {min(lengths)}-{max(lengths)} chars (mean {np.mean(lengths):.0f}), "
+          f"batch size {batch_size}")
+    print("=" * 70)
+
+    # Warm up (first call loads kernels)
+    model.encode(texts[:batch_size])
+
+    baseline, baseline_time = timed("per-item loop", count, lambda: per_item(model, texts))
+    timed("batches, arrival order", count, lambda: arrival_order(model, texts, batch_size))
+    batched, batched_time = timed("batches, length-sorted", count,
+                                  lambda: encode_length_sorted(model, texts, batch_size))
+    print("-" * 70)
+    _, sequential_time = timed(f"sorted + {write_ms:.0f} ms write, sequential", count,
+                               lambda: with_writes(model, texts, batch_size, write_ms / 1000, False))
+    _, overlapped_time = timed(f"sorted + {write_ms:.0f} ms write, overlapped", count,
+                               lambda: with_writes(model, texts, batch_size, write_ms / 1000, True))
+    print("-" * 70)
+
+    difference = max(float(np.max(np.abs(a - b))) for a, b in zip(baseline, batched))
+    print(f"Max |per-item - batched| component difference: {difference:.2e}")
+    print(f"Length-sorted batching speedup: {baseline_time / batched_time:.1f}x")
+    print(f"Write overlap saves: {100 * (1 - overlapped_time / sequential_time):.0f}% of wall time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: encoding pool scaling from 1 to N worker processes
+
+Corpus: the same cleaned email documents as benchmark_embedding_batching.py.
+The embedding cache is bypassed so every run really encodes.
+
+For each worker count, reports the pool start-up time (spawn + model load
+in every worker), encoding throughput in documents/sec, speedup over one
+worker and parallel efficiency (speedup / workers). Vectors are checked
+against the single-worker run.
+
+Usage:
+    python benchmark_encoding_pool.py                 # 4000 docs, 1..cpu_count workers
+    python benchmark_encoding_pool.py 10000 8
+    EMBEDDING_BACKEND=onnx-int8 python benchmark_encoding_pool.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmark_embedding_batching import build_documents
+from config import AIConfig
+from encoding_pool import EncodingPool
+
+
+def worker_counts(max_workers):
+    """1, 2, 4, ... up to max_workers (always including max_workers)"""
+    counts = []
+    count = 1
+    while count < max_workers:
+        counts.append(count)
+        count *= 2
+    return counts + [max_workers]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    texts = build_documents(count)
+    print(f"Corpus: {count} documents, {os.cpu_count()} CPUs, backend {AIConfig.EMBEDDING_BACKEND}, "
+          f"batch size {AIConfig.EMBEDDING_BATCH_SIZE}")
+    print(f"{'workers':>7} {'threads':>7} {'startup':>8} {'encode':>8} {'docs/sec':>10} {'speedup':>8} {'efficiency':>10}")
+    print("=" * 66)
+
+    baseline_rate = None
+    reference = None
+    for workers in worker_counts(max_workers):
+        with EncodingPool(workers, cached=False) as pool:
+            startup = pool.warm_up()
+            start = time.perf_counter()
+            vectors = np.stack(pool.encode(texts))
+            elapsed = time.perf_counter() - start
+
+        rate = count / elapsed
+        if baseline_rate is None:
+            baseline_rate = rate
+            reference = vectors
+        speedup = rate / baseline_rate
+        print(f"{workers:7d} {pool.threads_per_worker:7d} {startup:7.1f}s {elapsed:7.2f}s {rate:10.1f} "
+              f"{speedup:7.2f}x {100 * speedup / workers:9.0f}%")
+
+        difference = float(np.max(np.abs(vectors - reference)))
+        if difference > 1e-4:
+            print(f"        vectors differ from 1 worker by up to {difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: HTML-to-text extraction (html_text.py)
+
+Corpus:
+- every text/html part of the sample Gmail messages in output.json
+- the generated replies in threads.json, rendered as marketing-style HTML
+  mail (inline CSS, hidden preheader, tracking script, footer table)
+
+Reports parity of the lxml fast path against the BeautifulSoup extractor
+(whitespace-normalized text must match) and the speedup of both over the
+legacy BeautifulSoup(html, "html.parser").get_text() call.
+
+Usage:
+    python benchmark_html_extraction.py          # 50 rounds
+    python benchmark_html_extraction.py 200
+"""
+
+import base64
+import html
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from fake_gmail import load_sample_messages
+from html_text import extract_text_bs4, extract_text_lxml_with_fallback
+
+MARKETING_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Big Sur River Inn</title>
+<style>body {{ font-family: Georgia, serif; }} .footer td {{ color: #777; }}</style>
+<script>window.dataLayer = window.dataLayer || []; dataLayer.push({{'event': 'open'}});</script>
+</head><body>
+<div style="display:none; max-height:0; overflow:hidden">Plan your Big Sur getaway today</div>
+<table width="100%" cellpadding="0" cellspacing="0"><tr><td>
+{paragraphs}
+</td></tr></table>
+<table class="footer"><tr><td>Big Sur River Inn &middot; 46800 Hwy 1, Big Sur, CA 93920</td></tr>
+<tr><td><a href="https://www.bigsurriverinn.com/unsubscribe">Unsubscribe</a></td></tr></table>
+<img src="https://example.com/open.gif" width="1" height="1" alt="" style="visibility:hidden">
+</body></html>"""
+
+
+def html_parts(payload):
+    """Yield decoded text/html bodies of a Gmail payload"""
+    if payload.get("mimeType") == "text/html" and "data" in payload.get("body", {}):
+        yield base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8", errors="replace")
+    for part in payload.get("parts", []):
+        yield from html_parts(part)
+
+
+def load_thread_replies(path="threads.json"):
+    """Split threads.json into individual replies (each starts with a greeting)"""
+    with open(path, "r") as f:
+        content = f.read()
+    replies = re.split(r"\n(?=(?:Hello|Hi|Dear)\b)", content)
+    return [reply.strip() for reply in replies if reply.strip()]
+
+
+def build_corpus():
+    corpus = []
+    for message in load_sample_messages():
+        corpus.extend(html_parts(message["payload"]))
+
+    for reply in load_thread_replies():
+        paragraphs = "\n".join(
+            f'<p style="margin:0 0 12px">{html.escape(p).replace(chr(10), "<br>")}</p>'
+            for p in reply.split("\n\n")
+        )
+        corpus.append(MARKETING_TEMPLATE.format(paragraphs=paragraphs))
+
+    return corpus
+
+
+def legacy_get_text(document):
+    return BeautifulSoup(document, "html.parser").get_text()
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def time_extractor(extractor, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for document in corpus:
+            extractor(document)
+    return time.perf_counter() - start
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    corpus = build_corpus()
+    corpus_bytes = sum(len(d.encode("utf-8")) for d in corpus)
+
+    print(f"Corpus: {len(corpus)} HTML documents, {corpus_bytes / 1024:.0f} KB, {rounds} rounds")
+    print("=" * 70)
+
+    # Parity: lxml fast path vs. BeautifulSoup fallback (same filtering rules)
+    mismatches = [i for i, d in enumerate(corpus)
+                  if normalize(extract_text_lxml_with_fallback(d)) != normalize(extract_text_bs4(d))]
+    print(f"Parity lxml vs bs4 extractor: {len(corpus) - len(mismatches)}/{len(corpus)} identical")
+    for i in mismatches[:3]:
+        print(f"  mismatch in document {i}")
+
+    # What the new extractors remove relative to the legacy call
+    legacy_chars = sum(len(normalize(legacy_get_text(d))) for d in corpus)
+    new_chars = sum(len(normalize(extract_text_lxml_with_fallback(d))) for d in corpus)
+    print(f"Extracted text: {legacy_chars} chars legacy, {new_chars} chars without style/script/hidden")
+    print("-" * 70)
+
+    legacy = time_extractor(legacy_get_text, corpus, rounds)
+    bs4_time = time_extractor(extract_text_bs4, corpus, rounds)
+    lxml_time = time_extractor(extract_text_lxml_with_fallback, corpus, rounds)
+
+    docs = len(corpus) * rounds
+    for label, elapsed in [("legacy html.parser get_text()", legacy),
+                           ("bs4 extractor", bs4_time),
+                           ("lxml extractor", lxml_time)]:
+        print(f"{label:<32} {elapsed:7.2f}s  {docs / elapsed:9.0f} docs/sec")
+
+    print("=" * 70)
+    print(f"lxml speedup over legacy: {legacy / lxml_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
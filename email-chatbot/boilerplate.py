@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Corpus-learned boilerplate removal for email text
+
+Signatures, address blocks and footers ("Be sure to check out our live
+cam...") repeat across hundreds of messages. A periodic job mines word
+n-grams that occur in many distinct messages of original_emails and stores
+their 64-bit fingerprints in the boilerplate_model collection. strip() then
+removes every run of words covered by a known n-gram in a single pass over
+the message.
+
+Stored thread_message is never stripped: a wrongly mined n-gram would
+otherwise destroy message text for good, and the stored text is what the
+next mining run learns from. Boilerplate is stripped where the text is used
+(the embedding input and the response prompt); ingestion only records how
+many characters would be removed (boilerplate_chars_removed).
+
+Stored text is whitespace-normalized (see clean_email_content), so
+boilerplate is matched on words rather than lines.
+
+Near-duplicates (duplicate_of) are left out of mining so that a template
+reply sent many times does not itself become boilerplate.
+
+Usage:
+    python boilerplate.py mine      # rebuild the model from original_emails
+    python boilerplate.py report    # characters / tokens removed per message
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import re
+import string
+import sys
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+import pymongo
+from bson.binary import Binary
+
+from config import IngestionConfig
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\S+")
+PUNCTUATION = string.punctuation + "“”‘’"
+MODEL_ID = "current"
+
+# Rough BPE token count for English text (about 4 characters per token)
+CHARS_PER_TOKEN = 4
+
+
+def normalize_word(word: str) -> str:
+    return word.strip(PUNCTUATION).lower()
+
+
+def shingle_hash(words) -> int:
+    digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def message_shingles(text: str, shingle_words: int) -> Set[int]:
+    """Distinct n-gram fingerprints of a message"""
+    words = [normalize_word(w) for w in WORD_PATTERN.findall(text)]
+    return {shingle_hash(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+
+
+def estimate_tokens_removed(chars_removed: int) -> int:
+    return round(chars_removed / CHARS_PER_TOKEN)
+
+
+class BoilerplateModel:
+    """A set of boilerplate n-gram fingerprints"""
+
+    def __init__(self, fingerprints: Optional[Set[int]] = None,
+                 shingle_words: int = IngestionConfig.BOILERPLATE_SHINGLE_WORDS, documents: int = 0):
+        self.fingerprints = fingerprints or set()
+        self.shingle_words = shingle_words
+        self.documents = documents
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def strip(self, text: str) -> Tuple[str, int]:
+        """Remove boilerplate word runs; returns (text, characters removed)"""
+        if not self.fingerprints or not text:
+            return text, 0
+
+        words = WORD_PATTERN.findall(text)
+        size = self.shingle_words
+        if len(words) < size:
+            return text, 0
+
+        normalized = [normalize_word(w) for w in words]
+        covered = [False] * len(words)
+        for i in range(len(words) - size + 1):
+            if shingle_hash(normalized[i:i + size]) in self.fingerprints:
+                covered[i:i + size] = [True] * size
+
+        if not any(covered):
+            return text, 0
+
+        stripped = " ".join(word for word, is_boilerplate in zip(words, covered) if not is_boilerplate)
+        # A message that is nothing but boilerplate is kept as is
+        if not stripped:
+            return text, 0
+        return stripped, len(text) - len(stripped)
+
+    def measure_document(self, document: Dict) -> int:
+        """Record the characters strip() would remove from thread_message (which is left unchanged)"""
+        _, removed = self.strip(document.get("thread_message", ""))
+        document["boilerplate_chars_removed"] = removed
+        return removed
+
+    def to_document(self) -> Dict:
+        packed = np.array(sorted(self.fingerprints), dtype=np.uint64).tobytes()
+        return {
+            "_id": MODEL_ID,
+            "fingerprints": Binary(packed),
+            "fingerprint_count": len(self.fingerprints),
+            "shingle_words": self.shingle_words,
+            "documents": self.documents,
+            "mined_at": datetime.datetime.now()
+        }
+
+    @classmethod
+    def from_document(cls, document: Optional[Dict]) -> "BoilerplateModel":
+        if not document:
+            return cls()
+        fingerprints = set(np.frombuffer(document["fingerprints"], dtype=np.uint64).tolist())
+        return cls(fingerprints, document["shingle_words"], document.get("documents", 0))
+
+    @classmethod
+    def load(cls, database) -> "BoilerplateModel":
+        """Load the mined model; an empty model (strips nothing) if none has been mined"""
+        try:
+            model = cls.from_document(database.boilerplate_model.find_one({"_id": MODEL_ID}))
+            logger.info(f"Boilerplate model loaded: {len(model)} fingerprints")
+            return model
+        except Exception as e:
+            logger.warning(f"Boilerplate model unavailable, text will not be stripped: {e}")
+            return cls()
+
+    def save(self, database):
+        database.boilerplate_model.replace_one({"_id": MODEL_ID}, self.to_document(), upsert=True)
+
+
+def mine_boilerplate(texts: Iterable[str],
+                     shingle_words: int = IngestionConfig.BOILERPLATE_SHINGLE_WORDS,
+                     min_documents: int = IngestionConfig.BOILERPLATE_MIN_DOCUMENTS,
+                     min_fraction: float = IngestionConfig.BOILERPLATE_MIN_FRACTION) -> BoilerplateModel:
+    """Fingerprint the n-grams that appear in enough distinct messages"""
+    document_frequency = Counter()
+    documents = 0
+    for text in texts:
+        document_frequency.update(message_shingles(text or "", shingle_words))
+        documents += 1
+
+    threshold = max(min_documents, int(min_fraction * documents))
+    fingerprints = {fingerprint for fingerprint, count in document_frequency.items() if count >= threshold}
+    logger.info(f"Mined {len(fingerprints)} boilerplate n-grams from {documents} messages "
+                f"(threshold: {threshold} messages)")
+    return BoilerplateModel(fingerprints, shingle_words, documents)
+
+
+def mine_collection(database) -> BoilerplateModel:
+    """Mine canonical (non-duplicate) original_emails and save the model (replacing the previous one)"""
+    cursor = database.original_emails.find(
+        {"duplicate_of": None}, {"thread_message": 1, "_id": 0}
+    ).batch_size(1000)
+    model = mine_boilerplate(doc.get("thread_message", "") for doc in cursor)
+    model.save(database)
+    return model
+
+
+def boilerplate_report(database, model: BoilerplateModel, sample_size: int = 5000) -> Dict:
+    """
+    Characters and estimated tokens the given model removes per message, by sender
+    """
+    report = {}
+    cursor = database.original_emails.find(
+        {}, {"thread_message": 1, "sender": 1, "_id": 0}
+    ).limit(sample_size)
+
+    for document in cursor:
+        text = document.get("thread_message", "")
+        _, removed = model.strip(text)
+        totals = report.setdefault(document.get("sender", "Unknown"),
+                                   {"messages": 0, "chars": 0, "chars_removed": 0})
+        totals["messages"] += 1
+        totals["chars"] += len(text)
+        totals["chars_removed"] += removed
+
+    for sender, totals in report.items():
+        messages = max(totals["messages"], 1)
+        totals["tokens_removed"] = estimate_tokens_removed(totals["chars_removed"])
+        logger.info(f"{sender}: {totals['messages']} messages, "
+                    f"{totals['chars_removed'] / messages:.0f} chars / "
+                    f"{totals['tokens_removed'] / messages:.0f} tokens removed per message "
+                    f"({100 * totals['chars_removed'] / max(totals['chars'], 1):.1f}% of text)")
+    return report
+
+
+def main():
+    """Mine the boilerplate model or report its effect"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else "mine"
+
+    try:
+        with open('../../../atlas-creds/atlas-creds.json', 'r') as f:
+            creds_data = json.load(f)
+
+        database = pymongo.MongoClient(creds_data["mdb-connection-string"]).email_chatbot
+
+        if command == "mine":
+            model = mine_collection(database)
+            logger.info(f"✅ Boilerplate model saved: {len(model)} fingerprints")
+            boilerplate_report(database, model)
+        elif command == "report":
+            boilerplate_report(database, BoilerplateModel.load(database))
+        else:
+            print("Usage: python boilerplate.py [mine|report]")
+            sys.exit(1)
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Buffered bulk upsert writer for MongoDB
+
+Accumulates UpdateOne(..., upsert=True) operations keyed on a unique field and
+flushes them as unordered bulk_write calls once a count or byte-size limit is
+reached. Replaces per-message find_one / insert_one / replace_one round trips
+during email ingestion.
+
+insert_many_unordered / byte_batches do the same for insert-only writes
+(embedding backfills), where an existing document is a duplicate, not an
+error.
+"""
+
+import logging
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import bson
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class BulkWriteSummary:
+    """Counts for one or more bulk flushes"""
+
+    def __init__(self):
+        self.upserted = 0
+        self.matched = 0
+        self.modified = 0
+        self.failed = 0
+
+    def add(self, other: "BulkWriteSummary"):
+        self.upserted += other.upserted
+        self.matched += other.matched
+        self.modified += other.modified
+        self.failed += other.failed
+
+    def __repr__(self):
+        return (f"BulkWriteSummary(upserted={self.upserted}, matched={self.matched}, "
+                f"modified={self.modified}, failed={self.failed})")
+
+
+class BulkUpsertWriter:
+    """
+    Buffer upserts and write them with unordered bulk_write.
+
+    on_upsert(document) is called for every document that was inserted (not
+    matched) by a flush, so callers can still react to new messages.
+    Documents whose write failed are collected in failed_documents until the
+    caller takes them with take_failed_documents().
+
+    If bulk_write raises anything other than BulkWriteError (network errors,
+    AutoReconnect), the operations go back into the buffer and the error is
+    raised, so nothing is dropped and a later flush can write them.
+    """
+
+    def __init__(self, collection, key_field: str = "message_id",
+                 max_operations: int = 1000, max_bytes: int = 8 * 1024 * 1024,
+                 on_upsert: Optional[Callable[[Dict], None]] = None):
+        self.collection = collection
+        self.key_field = key_field
+        self.max_operations = max_operations
+        self.max_bytes = max_bytes
+        self.on_upsert = on_upsert
+
+        self.operations: List[UpdateOne] = []
+        self.documents: List[Dict] = []
+        self.insert_only: List[bool] = []
+        self.buffered_bytes = 0
+        self.totals = BulkWriteSummary()
+        self.failed_documents: List[Dict] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def upsert(self, document: Dict, insert_only: bool = False):
+        """
+        Queue an upsert for document, keyed on key_field.
+
+        insert_only=True leaves existing documents untouched ($setOnInsert);
+        otherwise all fields are updated except created_at, which keeps the
+        value from the first insert.
+        """
+        key = {self.key_field: document[self.key_field]}
+
+        if insert_only:
+            update = {"$setOnInsert": document}
+        else:
+            fields = {k: v for k, v in document.items() if k != "created_at"}
+            update = {"$set": fields}
+            if "created_at" in document:
+                update["$setOnInsert"] = {"created_at": document["created_at"]}
+
+        self.operations.append(UpdateOne(key, update, upsert=True))
+        self.documents.append(document)
+        self.insert_only.append(insert_only)
+        self.buffered_bytes += len(bson.encode(document))
+
+        if len(self.operations) >= self.max_operations or self.buffered_bytes >= self.max_bytes:
+            self.flush()
+
+    def take_failed_documents(self) -> List[Dict]:
+        """Documents whose write failed since the last call"""
+        failed, self.failed_documents = self.failed_documents, []
+        return failed
+
+    def flush(self) -> BulkWriteSummary:
+        """Write buffered operations, return the counts for this flush"""
+        summary = BulkWriteSummary()
+
+        if not self.operations:
+            return summary
+
+        operations, documents, insert_only = self.operations, self.documents, self.insert_only
+        buffered_bytes = self.buffered_bytes
+        self.operations, self.documents, self.insert_only, self.buffered_bytes = [], [], [], 0
+
+        try:
+            upserted_indexes = self.write(operations, documents, insert_only, summary)
+        except Exception:
+            # Not written: keep the operations (ahead of anything queued since) for the next flush
+            self.operations = operations + self.operations
+            self.documents = documents + self.documents
+            self.insert_only = insert_only + self.insert_only
+            self.buffered_bytes += buffered_bytes
+            raise
+
+        self.totals.add(summary)
+
+        if self.on_upsert:
+            for index in upserted_indexes:
+                self.on_upsert(documents[index])
+
+        logger.debug(f"Bulk flush of {len(operations)} operations: {summary}")
+        return summary
+
+    def write(self, operations: List[UpdateOne], documents: List[Dict], insert_only: List[bool],
+              summary: BulkWriteSummary, retry: bool = True) -> List[int]:
+        """bulk_write operations, add the counts to summary, return the indexes of upserted documents"""
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            summary.upserted += result.upserted_count
+            summary.matched += result.matched_count
+            summary.modified += result.modified_count
+            return list(result.upserted_ids.keys())
+
+        except BulkWriteError as e:
+            details = e.details
+            summary.upserted += details.get("nUpserted", 0)
+            summary.matched += details.get("nMatched", 0)
+            summary.modified += details.get("nModified", 0)
+            upserted_indexes = [item["index"] for item in details.get("upserted", [])]
+
+            retry_indexes = []
+            for error in details.get("writeErrors", []):
+                index = error["index"]
+                if error.get("code") == DUPLICATE_KEY_ERROR and insert_only[index]:
+                    # Two upserts raced on the same key; the document exists and is left as is
+                    summary.matched += 1
+                elif error.get("code") == DUPLICATE_KEY_ERROR and retry:
+                    # The racing insert won, so this $set was never applied: run it again as an update
+                    retry_indexes.append(index)
+                else:
+                    summary.failed += 1
+                    self.failed_documents.append(documents[index])
+                    key = documents[index].get(self.key_field)
+                    logger.error(f"Error writing {self.key_field}={key}: {error.get('errmsg')}")
+
+            if retry_indexes:
+                retried = self.write([operations[i] for i in retry_indexes], [documents[i] for i in retry_indexes],
+                                     [insert_only[i] for i in retry_indexes], summary, retry=False)
+                upserted_indexes.extend(retry_indexes[i] for i in retried)
+            return upserted_indexes
+
+
+class InsertManySummary:
+    """Counts for one or more unordered insert_many calls"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+        # key_field values of documents that are now stored (inserted or already there)
+        self.stored_keys: List = []
+
+    def add(self, other: "InsertManySummary"):
+        self.inserted += other.inserted
+        self.duplicates += other.duplicates
+        self.failed += other.failed
+        self.stored_keys.extend(other.stored_keys)
+
+    def __repr__(self):
+        return (f"InsertManySummary(inserted={self.inserted}, duplicates={self.duplicates}, "
+                f"failed={self.failed})")
+
+
+def byte_batches(documents: Iterable[Dict], max_count: int = 1000,
+                 max_bytes: int = 8 * 1024 * 1024) -> Iterator[List[Dict]]:
+    """Split documents into batches of at most max_count documents and max_bytes of BSON"""
+    batch, batch_bytes = [], 0
+    for document in documents:
+        size = len(bson.encode(document))
+        if batch and (len(batch) >= max_count or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(document)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def insert_many_unordered(collection, documents: List[Dict], key_field: str = "message_id") -> InsertManySummary:
+    """
+    Insert documents in one unordered insert_many.
+
+    Duplicate-key errors (documents already stored) are counted, not raised;
+    inserted and duplicate counts come from BulkWriteError.details.
+    """
+    summary = InsertManySummary()
+    if not documents:
+        return summary
+
+    try:
+        collection.insert_many(documents, ordered=False)
+        summary.inserted = len(documents)
+        failed_indexes = set()
+
+    except BulkWriteError as e:
+        details = e.details
+        summary.inserted = details.get("nInserted", 0)
+        failed_indexes = set()
+
+        for error in details.get("writeErrors", []):
+            if error.get("code") == DUPLICATE_KEY_ERROR:
+                summary.duplicates += 1
+            else:
+                summary.failed += 1
+                failed_indexes.add(error["index"])
+                key = documents[error["index"]].get(key_field)
+                logger.error(f"Error inserting {key_field}={key}: {error.get('errmsg')}")
+
+    summary.stored_keys = [document.get(key_field) for index, document in enumerate(documents)
+                           if index not in failed_indexes]
+    logger.debug(f"insert_many of {len(documents)} documents: {summary}")
+    return summary
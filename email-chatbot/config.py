@@ -37,6 +37,65 @@ class DatabaseConfig:
     DATABASE_NAME = os.environ.get('DATABASE_NAME', 'email_chatbot')
     ORIGINAL_EMAILS_COLLECTION = os.environ.get('ORIGINAL_EMAILS_COLLECTION', 'original_emails')
     EMAIL_EMBEDDINGS_COLLECTION = os.environ.get('EMAIL_EMBEDDINGS_COLLECTION', 'email_embeddings')
+    
+    # Upper bound on the BSON size of one insert batch (each embedding
+    # document carries a float array, so fewer documents fit than it seems)
+    WRITE_BATCH_MAX_BYTES = int(os.environ.get('WRITE_BATCH_MAX_BYTES', 8 * 1024 * 1024))
+    
+    # How embedding vectors are stored: array (BSON doubles), float32 or int8
+    # (packed BSON binary vectors, see vector_storage.py)
+    VECTOR_STORAGE = os.environ.get('VECTOR_STORAGE', 'array')
+    # Atlas Vector Search index used when vectors are stored as binary
+    VECTOR_INDEX_NAME = os.environ.get('VECTOR_INDEX_NAME', 'vector_index')
+
+# Gmail API Configuration
+class GmailConfig:
+    """Gmail API fetch settings"""
+    
+    # Requests per HTTP batch (Gmail recommends at most 50)
+    BATCH_SIZE = int(os.environ.get('GMAIL_BATCH_SIZE', 50))
+    MAX_CONCURRENT_BATCHES = int(os.environ.get('GMAIL_MAX_CONCURRENT_BATCHES', 4))
+    
+    # Per-user quota (units per second) and retry policy for 429/5xx responses
+    QUOTA_UNITS_PER_SECOND = float(os.environ.get('GMAIL_QUOTA_UNITS_PER_SECOND', 250))
+    MAX_RETRIES = int(os.environ.get('GMAIL_MAX_RETRIES', 5))
+
+# Ingestion Configuration
+class IngestionConfig:
+    """Email ingestion pipeline settings"""
+    
+    # Processes used for MIME / HTML parsing (0 = one per CPU core)
+    PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', 0))
+    # Capacity of the queues between fetch, parse and write stages
+    QUEUE_SIZE = int(os.environ.get('INGESTION_QUEUE_SIZE', 64))
+    
+    # HTML-to-text extractor: 'lxml' (fast, falls back to bs4) or 'bs4'
+    HTML_EXTRACTOR = os.environ.get('HTML_EXTRACTOR', 'lxml')
+    
+    # Text parts larger than this are truncated before decoding (bytes)
+    MAX_PART_BYTES = int(os.environ.get('MAX_PART_BYTES', 256 * 1024))
+    
+    # Distinct Date header strings memoized per process
+    DATE_CACHE_SIZE = int(os.environ.get('DATE_CACHE_SIZE', 4096))
+    
+    # Local archive of raw Gmail messages for offline re-parsing (see raw_archive.py)
+    ARCHIVE_RAW_MESSAGES = os.environ.get('ARCHIVE_RAW_MESSAGES', 'True').lower() == 'true'
+    RAW_ARCHIVE_DIR = os.environ.get('RAW_ARCHIVE_DIR', '../../../email-chatbot-archive')
+    ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get('ARCHIVE_COMPRESSION_LEVEL', 3))
+    
+    # Near-duplicate detection (see near_duplicates.py): SimHash bit distance
+    # at or below which two messages are duplicates, and the minimum word
+    # count for a message to be fingerprinted at all. The distance must stay
+    # below the 4 SimHash bands (at most 3) for candidate lookup to find every match
+    SIMHASH_MAX_DISTANCE = int(os.environ.get('SIMHASH_MAX_DISTANCE', 3))
+    SIMHASH_MIN_WORDS = int(os.environ.get('SIMHASH_MIN_WORDS', 8))
+    
+    # Boilerplate mining (see boilerplate.py): word n-gram length, and how many
+    # messages (count and share of the corpus) must contain an n-gram for it
+    # to count as boilerplate
+    BOILERPLATE_SHINGLE_WORDS = int(os.environ.get('BOILERPLATE_SHINGLE_WORDS', 8))
+    BOILERPLATE_MIN_DOCUMENTS = int(os.environ.get('BOILERPLATE_MIN_DOCUMENTS', 10))
+    BOILERPLATE_MIN_FRACTION = float(os.environ.get('BOILERPLATE_MIN_FRACTION', 0.05))
 
 # AI/ML Configuration
 class AIConfig:
@@ -45,12 +104,62 @@ class AIConfig:
     # Embedding model settings
     EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
     EMBEDDING_DIMENSION = int(os.environ.get('EMBEDDING_DIMENSION', 384))
+    # Inference backend: pytorch, onnx or onnx-int8 (see embedding_backends.py)
+    EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'pytorch')
+    ONNX_MODEL_DIR = os.environ.get(
+        'ONNX_MODEL_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'embedding-models')
+    )
+    # CPU threads per encoder (0 = library default)
+    EMBEDDING_THREADS = int(os.environ.get('EMBEDDING_THREADS', 0))
+    # Texts per model.encode batch, and how many pending messages are sorted
+    # by length together (larger windows pad less but delay the first writes)
+    EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+    EMBEDDING_SORT_WINDOW = int(os.environ.get('EMBEDDING_SORT_WINDOW', 512))
+    
+    # Persistent embedding cache (see embedding_cache.py), shared by the
+    # email and retail scripts; about 1.6 KB per 384-dimension vector
+    EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_PATH = os.environ.get(
+        'EMBEDDING_CACHE_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'embedding-cache', 'embeddings.sqlite3')
+    )
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', 200000))
     
     # OpenAI settings
     OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-35-turbo')
     OPENAI_TEMPERATURE = float(os.environ.get('OPENAI_TEMPERATURE', 0.7))
     OPENAI_MAX_TOKENS = int(os.environ.get('OPENAI_MAX_TOKENS', 500))
 
+# Embedding Worker Configuration
+class EmbeddingWorkerConfig:
+    """Long-running embedding worker settings (see embedding_worker.py)"""
+    
+    # Changed messages are embedded in micro-batches of up to this many...
+    STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 64))
+    # ...or whatever arrived within this many seconds of the first one
+    STREAM_MAX_WAIT_SECONDS = float(os.environ.get('STREAM_MAX_WAIT_SECONDS', 2.0))
+    
+    # Leased embedding jobs (see embedding_jobs.py): original_emails per job,
+    # lease length, heartbeat interval and attempts before a job is failed
+    JOB_SIZE = int(os.environ.get('EMBEDDING_JOB_SIZE', 1000))
+    LEASE_SECONDS = int(os.environ.get('EMBEDDING_LEASE_SECONDS', 300))
+    HEARTBEAT_SECONDS = int(os.environ.get('EMBEDDING_HEARTBEAT_SECONDS', 30))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('EMBEDDING_JOB_MAX_ATTEMPTS', 3))
+    
+    # Priority tiers for pending embeddings (see embedding_scheduler.py):
+    # unanswered guest threads / recent mail / backfill, dispatched by weight
+    PRIORITY_TIER_WEIGHTS = [int(w) for w in os.environ.get('EMBEDDING_PRIORITY_WEIGHTS', '6,3,1').split(',')]
+    PRIORITY_RECENT_DAYS = int(os.environ.get('EMBEDDING_PRIORITY_RECENT_DAYS', 7))
+    PRIORITY_UNANSWERED_DAYS = int(os.environ.get('EMBEDDING_PRIORITY_UNANSWERED_DAYS', 30))
+    # Pending messages held in memory per tier group; queues are refilled
+    # from the database as they drain
+    PRIORITY_QUEUE_WINDOW = int(os.environ.get('EMBEDDING_PRIORITY_QUEUE_WINDOW', 2000))
+    
+    # Encoding processes for backfills (see encoding_pool.py); CPU threads are
+    # split evenly between them
+    BACKFILL_WORKERS = int(os.environ.get('EMBEDDING_BACKFILL_WORKERS', 1))
+
 # Logging Configuration
 class LoggingConfig:
     """Logging configuration settings"""
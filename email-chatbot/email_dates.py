@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Date header parsing for email ingestion
+
+RFC 2822 Date headers are parsed with email.utils.parsedate_to_datetime (the
+fast path) and fall back to dateutil for the malformed dates some mail
+clients send. Results are UTC-aware datetimes and are memoized, since the
+same header string is seen again for every re-fetch of a thread.
+
+The dateutil fallback only accepts headers that look like a date: a year
+plus a month name, a numeric month/day or a time. dateutil alone fills
+missing parts from today, so a junk header like "5" would become the 5th of
+the current month.
+
+A header that neither parser understands is reported as None so the caller
+can fall back to Gmail's internalDate and flag the message, instead of
+silently stamping it with the ingestion time.
+"""
+
+import datetime
+import logging
+import re
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import dateutil.parser
+
+from config import IngestionConfig
+
+logger = logging.getLogger(__name__)
+
+# parsedate_to_datetime only handles RFC 2822 and silently misreads other
+# forms (e.g. drops "PM"), so the fast path requires "hh:mm[:ss] <zone>"
+RFC2822_TIME_PATTERN = re.compile(r"\d{1,2}:\d{2}(?::\d{2})?\s+(?:[+-]\d{4}\b|(?!AM\b|PM\b)[A-Za-z]{1,5}\b)")
+
+# US zone abbreviations dateutil does not resolve on its own
+ZONE_OFFSETS = {
+    "UT": 0, "UTC": 0, "GMT": 0, "Z": 0,
+    "EST": -5, "EDT": -4, "CST": -6, "CDT": -5,
+    "MST": -7, "MDT": -6, "PST": -8, "PDT": -7,
+}
+TZINFOS = {name: hours * 3600 for name, hours in ZONE_OFFSETS.items()}
+
+# A header must contain these before the dateutil fallback may read it
+YEAR_PATTERN = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+MONTH_OR_TIME_PATTERN = re.compile(
+    r"\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\b"
+    r"|\d{1,2}:\d{2}"
+    r"|(?<!\d)\d{1,2}[/.-]\d{1,2}(?!\d)",
+    re.IGNORECASE
+)
+
+
+def to_utc(value: datetime.datetime) -> datetime.datetime:
+    """Convert to UTC; naive datetimes (e.g. "-0000" zones) are taken as UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def parse_date_fast(date_str: str) -> Optional[datetime.datetime]:
+    """RFC 2822 parsing only; None if the header is not RFC 2822"""
+    if not RFC2822_TIME_PATTERN.search(date_str):
+        return None
+    try:
+        parsed = parsedate_to_datetime(date_str)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return to_utc(parsed) if parsed else None
+
+
+def parse_date_fallback(date_str: str) -> Optional[datetime.datetime]:
+    """Lenient dateutil parsing for non-conforming headers that carry a full date"""
+    if not (YEAR_PATTERN.search(date_str) and MONTH_OR_TIME_PATTERN.search(date_str)):
+        logger.debug(f"Date header {date_str!r} has no year and month or time")
+        return None
+    try:
+        return to_utc(dateutil.parser.parse(date_str, fuzzy=True, tzinfos=TZINFOS))
+    except (ValueError, OverflowError, TypeError) as e:
+        logger.debug(f"dateutil could not parse Date header {date_str!r}: {e}")
+        return None
+
+
+@lru_cache(maxsize=IngestionConfig.DATE_CACHE_SIZE)
+def parse_email_date(date_str: str) -> Optional[datetime.datetime]:
+    """Parse a Date header to a UTC-aware datetime, or None if it cannot be parsed"""
+    if not date_str or not date_str.strip():
+        return None
+    return parse_date_fast(date_str) or parse_date_fallback(date_str)
+
+
+def internal_date_to_datetime(internal_date) -> Optional[datetime.datetime]:
+    """Convert Gmail's internalDate (epoch milliseconds, as a string) to UTC"""
+    try:
+        return datetime.datetime.fromtimestamp(int(internal_date) / 1000, tz=datetime.timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def resolve_message_date(date_str: str, internal_date=None) -> Tuple[Optional[datetime.datetime], bool]:
+    """
+    Date to store for a message, and whether the Date header failed to parse.
+
+    Falls back to internalDate (when Gmail received the message) if the
+    header is missing or unparseable.
+    """
+    parsed = parse_email_date(date_str)
+    if parsed:
+        return parsed, False
+
+    fallback = internal_date_to_datetime(internal_date)
+    logger.warning(f"Unparseable Date header {date_str!r}, using internalDate {fallback}")
+    return fallback, True
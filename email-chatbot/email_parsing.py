@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Gmail message parsing shared by EmailCollector and EmailUpdater
+
+Turns raw Gmail API message dicts into the documents stored in the
+original_emails collection. These are plain module-level functions so they
+can run in worker processes (see ingestion_pipeline.py).
+"""
+
+import base64
+import datetime
+import logging
+import re
+from typing import Dict, List, Optional
+
+from config import IngestionConfig
+from email_dates import resolve_message_date
+from html_text import html_to_text
+from message_classifier import classify_message
+from near_duplicates import fingerprint_fields
+
+logger = logging.getLogger(__name__)
+
+# Text representations we extract, in order of preference
+TEXT_MIME_PREFERENCE = ("text/plain", "text/html")
+
+CHARSET_PATTERN = re.compile(r'charset="?([\w.:-]+)"?', re.IGNORECASE)
+
+
+def determine_sender(from_header: str) -> str:
+    """Determine sender based on email domain"""
+    if not from_header:
+        return "Guest"
+
+    # Extract email address from header (handles formats like "Name <email@domain.com>")
+    email_match = re.search(r'<([^>]+)>|([^\s<>]+@[^\s<>]+)', from_header)
+    if email_match:
+        email_address = email_match.group(1) or email_match.group(2)
+        if email_address and "@bigsurriverinn.com" in email_address.lower():
+            return "BSRI Team"
+
+    return "Guest"
+
+
+# Everything from the first match of a boundary onwards is quoted history or
+# a signature. Boundaries match the whole attribution shape, not a keyword,
+# so a body line like "From: June 3 to June 6" or "On Monday, ..." is kept:
+# attribution lines carry a date or time and start a line, or follow the
+# previous text without a plain space (flattened HTML glues them on or puts
+# a non-breaking space in between); "On ... wrote:" may wrap onto a second
+# line (Gmail plain text) but never spans a blank line.
+ATTRIBUTION_START = r"(?:^[ \t]*|(?<![ \t]))"
+DATE_SHAPE = r"(?:\d{4}|\d{1,2}:\d{2}|\d{1,2}/\d{1,2}/\d{2,4})"
+
+QUOTE_BOUNDARY_PATTERNS = [
+    # Legacy rule: "On Mon, Mar 3, 2025 Name said:" and other weekday-dated attributions
+    ATTRIBUTION_START + r"On (?:Sun|Mon|Tue|Wed|Thu|Fri|Sat)[a-z]*,[^\n]{1,60}?" + DATE_SHAPE
+    + r"[^\n]{0,200}?(?:wrote|said|writes):",
+    # "On Nov 1, 2024, at 5:50 PM, Name <addr> wrote:" and friends
+    ATTRIBUTION_START + r"On\s(?:(?!\n[ \t]*\n)[^>]){0,120}?" + DATE_SHAPE
+    + r"(?:(?!\n[ \t]*\n)[^>]){0,200}?(?:<[^>\n]*>\s*)?wrote:",
+    # Localized attribution lines (fr, de, es, it, nl, pt), dated like the English one
+    ATTRIBUTION_START + r"Le\s[^\n]{0,120}?" + DATE_SHAPE + r"[^\n]{0,250}?a\s[ée]crit\s?:",
+    ATTRIBUTION_START + r"Am\s[^\n]{0,120}?" + DATE_SHAPE + r"[^\n]{0,250}?schrieb[^\n]{0,100}?:",
+    ATTRIBUTION_START + r"El\s[^\n]{0,120}?" + DATE_SHAPE + r"[^\n]{0,250}?escribi[óo]\s?:",
+    ATTRIBUTION_START + r"Il giorno\s[^\n]{0,120}?" + DATE_SHAPE + r"[^\n]{0,250}?ha scritto\s?:",
+    ATTRIBUTION_START + r"Op\s[^\n]{0,120}?" + DATE_SHAPE + r"[^\n]{0,250}?schreef[^\n]{0,100}?:",
+    ATTRIBUTION_START + r"Em\s[^\n]{0,120}?" + DATE_SHAPE + r"[^\n]{0,250}?escreveu\s?:",
+    # Outlook / forwarded header blocks: From: and Sent:/Date: on consecutive
+    # lines followed by To:/Subject:, or all four fields on one flattened line
+    r"-{2,}\s*(?:Original Message|Forwarded message)\s*-{2,}",
+    r"_{10,}\s*From:",
+    r"^[ \t]*From:[^\n]*\n[ \t]*(?:Sent|Date):[^\n]*\n[ \t]*(?:To|Subject):",
+    r"From:\s[^\n]{1,200}?\s(?:Sent|Date):\s[^\n]{1,100}?\sTo:\s[^\n]{1,300}?\sSubject:",
+    # Signatures: RFC 3676 delimiter and mobile footers
+    r"^-- ?$",
+    r"Sent from my (?:iPhone|iPad|Android|Samsung|Galaxy|Pixel|mobile device|BlackBerry)",
+    r"Get Outlook for (?:iOS|Android)",
+]
+
+# One combined pattern, scanned once per message: a ">" quoted line is
+# dropped, the first boundary ends the message
+QUOTE_PATTERN = re.compile(
+    r"(?P<quoted>^[ \t]*>[^\n]*(?:\n|$))|(?P<boundary>" + "|".join(QUOTE_BOUNDARY_PATTERNS) + ")",
+    re.MULTILINE
+)
+
+# Zero-width characters that str.split() does not treat as whitespace
+INVISIBLE_CHARS = {ord("\ufeff"): None, ord("\u200b"): None, ord("\u200c"): None, ord("\u200d"): None}
+
+
+def clean_email_content(content: str) -> str:
+    """Strip quoted replies, ">" blocks and signatures, then normalize whitespace"""
+    if not content:
+        return ""
+
+    kept = []
+    position = 0
+
+    for match in QUOTE_PATTERN.finditer(content):
+        kept.append(content[position:match.start()])
+        position = match.end()
+        if match.lastgroup == "boundary":
+            position = len(content)
+            break
+
+    kept.append(content[position:])
+
+    # Collapse newlines, non-breaking spaces and runs of whitespace
+    return " ".join(" ".join(kept).translate(INVISIBLE_CHARS).split())
+
+
+def get_part_header(part: Dict, name: str) -> str:
+    """Get a MIME part header value (case-insensitive), or "" if absent"""
+    for header in part.get("headers", []):
+        if header["name"].lower() == name:
+            return header["value"]
+    return ""
+
+
+def is_attachment(part: Dict) -> bool:
+    """Parts with a filename or Content-Disposition: attachment are not message text"""
+    if part.get("filename"):
+        return True
+    return get_part_header(part, "content-disposition").lower().startswith("attachment")
+
+
+def select_text_parts(payload: Dict) -> List[Dict]:
+    """
+    Walk the MIME tree and pick the parts that hold the message text.
+
+    One representation is chosen per multipart/alternative group (text/plain
+    preferred over text/html). Images, calendar invites, PDFs and other
+    non-text parts are skipped without being decoded.
+    """
+    mime_type = payload.get("mimeType", "").lower()
+    children = payload.get("parts", [])
+
+    if mime_type == "multipart/alternative":
+        for preferred in TEXT_MIME_PREFERENCE:
+            for child in children:
+                if (child.get("mimeType", "").lower() == preferred
+                        and "data" in child.get("body", {}) and not is_attachment(child)):
+                    return [child]
+        # No direct text alternative, e.g. text/plain next to multipart/related
+        for child in children:
+            selected = select_text_parts(child)
+            if selected:
+                return selected
+        return []
+
+    if mime_type.startswith("multipart/") or (not mime_type and children):
+        selected = []
+        for child in children:
+            selected.extend(select_text_parts(child))
+        return selected
+
+    if "data" not in payload.get("body", {}) or is_attachment(payload):
+        return []
+
+    # A missing mimeType is treated as text and sniffed when decoded
+    if mime_type in TEXT_MIME_PREFERENCE or not mime_type:
+        return [payload]
+
+    logger.debug(f"Skipping {mime_type} part")
+    return []
+
+
+def decode_part_text(part: Dict) -> str:
+    """Decode a text part's body (capped at MAX_PART_BYTES) and convert HTML to text"""
+    data = part["body"]["data"]
+
+    # Only decode the first MAX_PART_BYTES: 4 base64 characters per 3 bytes
+    max_chars = -(-IngestionConfig.MAX_PART_BYTES // 3) * 4
+    if len(data) > max_chars:
+        logger.debug(f"Truncating {part.get('mimeType', 'text')} part of {part['body'].get('size', '?')} bytes")
+        data = data[:max_chars]
+
+    charset_match = CHARSET_PATTERN.search(get_part_header(part, "content-type"))
+    charset = charset_match.group(1) if charset_match else "utf-8"
+    raw = base64.urlsafe_b64decode(data)
+    try:
+        decoded = raw.decode(charset, errors="replace")
+    except LookupError:
+        decoded = raw.decode("utf-8", errors="replace")
+
+    mime_type = part.get("mimeType", "").lower()
+    if mime_type == "text/html" or (not mime_type and decoded.lstrip().startswith("<")):
+        # HTML content - extract text
+        return html_to_text(decoded)
+
+    return decoded
+
+
+def extract_message_content(payload: Dict) -> str:
+    """Extract text content from the text parts of an email payload"""
+    content_parts = []
+
+    for part in select_text_parts(payload):
+        try:
+            text = decode_part_text(part).strip()
+            if text:
+                content_parts.append(text)
+        except Exception as e:
+            logger.warning(f"Error decoding message body: {e}")
+
+    return "\n".join(content_parts)
+
+
+def extract_message_data(message: Dict, thread_id: str) -> Optional[Dict]:
+    """Extract relevant data from a Gmail message"""
+    try:
+        # Extract headers (names are case-insensitive, e.g. "Message-Id")
+        headers = {}
+        if "headers" in message.get("payload", {}):
+            for header in message["payload"]["headers"]:
+                headers[header["name"].lower()] = header["value"]
+
+        # Extract basic info
+        message_id = headers.get("message-id", "")
+        date_str = headers.get("date", "")
+        from_header = headers.get("from", "")
+        subject = headers.get("subject", "")
+        snippet = message.get("snippet", "")
+
+        # Parse date (UTC); unparseable headers fall back to internalDate and are flagged
+        date_parsed, date_parse_failed = resolve_message_date(date_str, message.get("internalDate"))
+
+        # Determine sender based on email domain
+        sender = determine_sender(from_header)
+
+        # Extract message content
+        thread_message = extract_message_content(message["payload"])
+
+        if not thread_message:
+            return None
+
+        # Clean content
+        thread_message = clean_email_content(thread_message)
+
+        if not thread_message:
+            return None
+
+        # Auto-replies, newsletters and bounces are stored but not embedded or answered
+        message_class, message_class_reason = classify_message(headers, subject, thread_message)
+
+        return {
+            "message_id": message_id,
+            "thread_id": thread_id,
+            "date": date_parsed,
+            "date_parse_failed": date_parse_failed,
+            "sender": sender,
+            "subject": subject,
+            "snippet": snippet,
+            "thread_message": thread_message,
+            "from_header": from_header,
+            "message_class": message_class,
+            "message_class_reason": message_class_reason,
+            # Near-duplicate fingerprint; duplicate_of is assigned at write time
+            **fingerprint_fields(thread_message),
+            "created_at": datetime.datetime.now(),
+            "updated_at": datetime.datetime.now()
+        }
+
+    except Exception as e:
+        logger.error(f"Error extracting message data: {e}")
+        return None
+
+
+def parse_thread(thread_id: str, thread_details: Dict) -> List[Dict]:
+    """Extract the storable messages of a fetched thread"""
+    messages = []
+    for message in thread_details.get("messages", []):
+        message_data = extract_message_data(message, thread_id)
+        if message_data:
+            messages.append(message_data)
+    return messages
+
+
+def parse_message(gmail_id: str, message: Dict) -> List[Dict]:
+    """Extract a single fetched message (as a list, like parse_thread)"""
+    message_data = extract_message_data(message, message.get("threadId", ""))
+    return [message_data] if message_data else []
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Selectable inference backends for the sentence embedding model
+
+    pytorch    SentenceTransformer (default)
+    onnx       ONNX Runtime, fp32 export of the same transformer
+    onnx-int8  ONNX Runtime, int8 dynamic-quantized weights (smallest, fastest on CPU)
+
+The backend is chosen with AIConfig.EMBEDDING_BACKEND (EMBEDDING_BACKEND
+environment variable). ONNX encoders reproduce the SentenceTransformer
+pipeline for all-MiniLM-L6-v2: tokenize (max 256 tokens), transformer,
+mean pooling over the attention mask, L2 normalization. They expose the
+same encode() so the rest of the code does not care which one it gets.
+
+ONNX models are exported once per model into ONNX_MODEL_DIR:
+    python embedding_backends.py export
+    python embedding_backends.py export --model sentence-transformers/all-MiniLM-L6-v2
+
+test_embedding_backends.py checks that ONNX vectors match the PyTorch
+ones; benchmark_embedding_backends.py compares latency and throughput.
+"""
+
+import argparse
+import logging
+import os
+from typing import Sequence, Union
+
+import numpy as np
+
+from config import AIConfig
+
+logger = logging.getLogger(__name__)
+
+PYTORCH = "pytorch"
+ONNX = "onnx"
+ONNX_INT8 = "onnx-int8"
+BACKENDS = (PYTORCH, ONNX, ONNX_INT8)
+
+# SentenceTransformer's max_seq_length for all-MiniLM-L6-v2
+MAX_SEQ_LENGTH = 256
+ONNX_OPSET = 14
+
+
+def model_dir(model_name: str) -> str:
+    return os.path.join(AIConfig.ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+def onnx_model_path(model_name: str, quantized: bool = False) -> str:
+    return os.path.join(model_dir(model_name), "model-int8.onnx" if quantized else "model.onnx")
+
+
+def export_onnx(model_name: str = AIConfig.EMBEDDING_MODEL) -> str:
+    """Export the transformer to ONNX (fp32) and an int8 dynamic-quantized copy; returns the directory"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = model_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["Is the river inn available for a wedding in June?"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+    fp32_path = onnx_model_path(model_name)
+    logger.info(f"Exporting {model_name} to {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True
+        )
+
+    int8_path = onnx_model_path(model_name, quantized=True)
+    logger.info(f"Quantizing weights to int8: {int8_path}...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    for path in (fp32_path, int8_path):
+        logger.info(f"  {os.path.basename(path)}: {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+    return output_dir
+
+
+class OnnxSentenceEncoder:
+    """SentenceTransformer-compatible encode() on ONNX Runtime (CPU)"""
+
+    def __init__(self, model_name: str, quantized: bool = False, threads: int = AIConfig.EMBEDDING_THREADS):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.backend = ONNX_INT8 if quantized else ONNX
+        self.max_seq_length = MAX_SEQ_LENGTH
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir(model_name))
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(onnx_model_path(model_name, quantized), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32,
+               normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors="np")
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+            # Mean pooling over real (non-padding) tokens
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled.astype(np.float32))
+
+        result = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        return result[0] if single else result
+
+
+def model_backend(model) -> str:
+    return getattr(model, "backend", PYTORCH) if isinstance(model, OnnxSentenceEncoder) else PYTORCH
+
+
+def load_embedding_model(model_name: str = AIConfig.EMBEDDING_MODEL, backend: str = AIConfig.EMBEDDING_BACKEND,
+                         threads: int = AIConfig.EMBEDDING_THREADS):
+    """Embedding model on the requested backend (PyTorch if the ONNX export is missing)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}, expected one of {BACKENDS}")
+
+    if backend != PYTORCH:
+        quantized = backend == ONNX_INT8
+        if os.path.exists(onnx_model_path(model_name, quantized)):
+            logger.info(f"Using {backend} backend for {model_name}")
+            return OnnxSentenceEncoder(model_name, quantized, threads=threads)
+        logger.warning(f"No {backend} export of {model_name} in {model_dir(model_name)} "
+                       f"(run: python embedding_backends.py export), using PyTorch")
+
+    from sentence_transformers import SentenceTransformer
+    if threads:
+        # Process-wide: torch has one intra-op thread pool
+        import torch
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name)
+
+
+def main():
+    """Export ONNX models"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Embedding model backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="export fp32 and int8 ONNX models")
+    export_parser.add_argument("--model", default=AIConfig.EMBEDDING_MODEL)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            output_dir = export_onnx(args.model)
+            logger.info(f"✅ ONNX models written to {output_dir}; select one with "
+                        f"EMBEDDING_BACKEND={ONNX} or {ONNX_INT8}")
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Persistent embedding cache shared by all embedding scripts
+
+Vectors are stored in a SQLite file as float32 blobs, keyed by
+sha256(model name, text). CachedEncoder wraps a SentenceTransformer and
+only runs the model for texts it has not seen, so re-runs, re-indexes and
+repeated queries cost a lookup instead of a forward pass.
+
+encode() options that change the vectors (normalize_embeddings, prompt,
+precision, ...) are part of the key, so a normalized and an unnormalized
+vector of the same text are cached separately.
+
+The cache is bounded to EMBEDDING_CACHE_MAX_ENTRIES vectors; the least
+recently used ones are evicted. Writes keep a running entry count and the
+table is only counted again when that count passes the limit. The database
+uses WAL mode, so several processes (embedding workers, the webapp, the
+retail scripts) can share it.
+
+Scripts outside email-chatbot use it with:
+    sys.path.append('../email-chatbot')
+    from embedding_cache import load_cached_model
+
+Usage (show or clear the cache):
+    python embedding_cache.py
+    python embedding_cache.py clear
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from config import AIConfig
+from embedding_backends import PYTORCH, load_embedding_model, model_backend
+
+logger = logging.getLogger(__name__)
+
+# Entries evicted below the limit at once, so eviction does not run on every write
+EVICTION_HEADROOM = 0.1
+
+# encode() options that do not change the vectors; every other option is part of the cache key
+NEUTRAL_ENCODE_OPTIONS = ("show_progress_bar", "convert_to_numpy", "device")
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """float32 vectors in SQLite, keyed by sha256(model name, text), with LRU eviction"""
+
+    def __init__(self, path: str = AIConfig.EMBEDDING_CACHE_PATH,
+                 max_entries: int = AIConfig.EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+        # Upper bound on the entries (replaced keys and other processes' evictions are not subtracted)
+        self.count = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for texts (None where missing); hits are marked as recently used"""
+        keys = [cache_key(model_name, text) for text in texts]
+        found = {}
+        with self.lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self.connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                            [(now, key) for key in found])
+                self.connection.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return [np.frombuffer(found[key], dtype=np.float32) if key in found else None for key in keys]
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: Sequence[np.ndarray]):
+        now = time.time()
+        rows = [(cache_key(model_name, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self.connection.commit()
+            self.count += len(rows)
+        if self.count > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used vectors once the cache is over max_entries"""
+        with self.lock:
+            # The running count may be high, and other processes write too
+            self.count = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if self.count <= self.max_entries:
+                return
+            excess = self.count - int(self.max_entries * (1 - EVICTION_HEADROOM))
+            self.connection.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self.connection.commit()
+            self.count -= excess
+        logger.info(f"Embedding cache: evicted {excess} least recently used vectors")
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM embeddings")
+            self.connection.commit()
+            self.connection.execute("VACUUM")
+            self.count = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CachedEncoder:
+    """
+    SentenceTransformer stand-in whose encode() goes through an EmbeddingCache.
+
+    Accepts a single text (returns one vector) or a list (returns a 2-D
+    array), like SentenceTransformer.encode; other attributes are passed
+    through to the wrapped model. Options that would not return one numpy
+    vector per text (convert_to_tensor, token embeddings) are rejected.
+    """
+
+    def __init__(self, model, model_name: str, cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def key_name(self, options: Dict) -> str:
+        """Cache namespace for these encode() options: the model name plus every option that changes the vectors"""
+        if options.get("convert_to_tensor") or options.get("output_value", "sentence_embedding") != "sentence_embedding":
+            raise ValueError("CachedEncoder only returns sentence embeddings as numpy arrays")
+
+        keyed = sorted((name, value) for name, value in options.items()
+                       if name not in NEUTRAL_ENCODE_OPTIONS and name not in ("convert_to_tensor", "output_value")
+                       and value is not None and value is not False)
+        if not keyed:
+            return self.model_name
+        return self.model_name + "|" + ",".join(f"{name}={value!r}" for name, value in keyed)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        key_name = self.key_name(kwargs)
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        vectors = self.cache.get_many(key_name, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            kwargs.setdefault("show_progress_bar", False)
+            kwargs["convert_to_numpy"] = True
+            encoded = self.model.encode([texts[i] for i in missing], batch_size=batch_size, **kwargs)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            self.cache.put_many(key_name, [texts[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+
+        result = np.stack(vectors)
+        return result[0] if single else result
+
+
+def load_cached_model(model_name: str = AIConfig.EMBEDDING_MODEL, backend: str = AIConfig.EMBEDDING_BACKEND,
+                      threads: int = AIConfig.EMBEDDING_THREADS):
+    """Embedding model for model_name on the configured backend, behind the shared cache unless it is disabled"""
+    model = load_embedding_model(model_name, backend, threads)
+    if not AIConfig.EMBEDDING_CACHE_ENABLED:
+        return model
+
+    # Quantized / ONNX vectors differ slightly from PyTorch ones, so each backend has its own keys
+    actual_backend = model_backend(model)
+    cache_name = model_name if actual_backend == PYTORCH else f"{model_name}:{actual_backend}"
+    try:
+        return CachedEncoder(model, cache_name)
+    except Exception as e:
+        logger.warning(f"Embedding cache unavailable, encoding without it: {e}")
+        return model
+
+
+def main():
+    """Show cache size, or clear it"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = EmbeddingCache()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+        logger.info(f"Embedding cache cleared: {cache.path}")
+        return
+
+    size_mb = os.path.getsize(cache.path) / (1024 * 1024)
+    logger.info(f"Embedding cache {cache.path}: {len(cache)} vectors, {size_mb:.1f} MB "
+                f"(limit {cache.max_entries} vectors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Leased job queue for distributed embedding runs
+
+Large (re-)embedding runs are split into jobs covering ranges of
+original_emails _id values, stored in the embedding_jobs collection. Any
+number of workers, on any host, claim jobs with an atomic
+find_one_and_update lease, renew the lease with heartbeats while working,
+and mark the job done. A job whose lease expires (crashed or stuck worker)
+is claimed again by another worker; a job that fails is retried up to
+JOB_MAX_ATTEMPTS times, and one whose lease expires on its last attempt is
+marked failed. Embeddings are upserted on message_id, so a job
+that runs twice does no harm.
+
+Usage:
+    python embedding_jobs.py create            # jobs for messages without an embedding
+    python embedding_jobs.py create --all      # re-embed everything (e.g. new model)
+    python embedding_jobs.py work              # run a worker (start as many as you like)
+    python embedding_jobs.py status            # progress, throughput per worker, stuck leases
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import socket
+import time
+from typing import Dict, Optional
+
+import pymongo
+from pymongo import ReturnDocument
+
+from aug_generate_embeddings import IncrementalEmailEmbeddingGenerator
+from bulk_writer import BulkUpsertWriter
+from config import AIConfig, EmbeddingWorkerConfig
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# Job modes: embed only messages without an embedding, or all of them
+MODE_MISSING = "missing"
+MODE_ALL = "all"
+
+class LeaseLostError(Exception):
+    """The job's lease expired and may now belong to another worker"""
+
+class EmbeddingJobQueue:
+    def __init__(self, database):
+        self.jobs_col = database.embedding_jobs
+        self.original_emails_col = database.original_emails
+        self.create_indexes()
+
+    def create_indexes(self):
+        try:
+            self.jobs_col.create_index([("status", 1), ("lease_expires_at", 1)])
+            self.jobs_col.create_index([("run_id", 1), ("range_start", 1)])
+        except Exception as e:
+            logger.warning(f"Index creation warning (may already exist): {e}")
+
+    def create_jobs(self, mode: str = MODE_MISSING, job_size: int = EmbeddingWorkerConfig.JOB_SIZE,
+                    max_attempts: int = EmbeddingWorkerConfig.JOB_MAX_ATTEMPTS) -> str:
+        """Split original_emails into _id ranges of job_size messages, return the run id"""
+        run_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        now = datetime.datetime.now()
+
+        # Every job_size-th _id starts a new range; only _id is read (covered by the _id index)
+        boundaries = []
+        cursor = self.original_emails_col.find({}, {"_id": 1}).sort("_id", 1).batch_size(10000)
+        for position, document in enumerate(cursor):
+            if position % job_size == 0:
+                boundaries.append(document["_id"])
+
+        jobs = []
+        for index, range_start in enumerate(boundaries):
+            range_end = boundaries[index + 1] if index + 1 < len(boundaries) else None
+            jobs.append({
+                "run_id": run_id,
+                "mode": mode,
+                "range_start": range_start,
+                "range_end": range_end,
+                "status": PENDING,
+                "attempts": 0,
+                "max_attempts": max_attempts,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "processed": 0,
+                "embedded": 0,
+                "created_at": now
+            })
+
+        if jobs:
+            self.jobs_col.insert_many(jobs, ordered=False)
+        logger.info(f"Created {len(jobs)} {mode} embedding jobs for run {run_id}")
+        return run_id
+
+    def fail_expired(self, now: datetime.datetime) -> int:
+        """Mark jobs whose lease expired on their last attempt as failed (no one can claim them again)"""
+        result = self.jobs_col.update_many(
+            {
+                "status": LEASED,
+                "lease_expires_at": {"$lt": now},
+                "$expr": {"$gte": ["$attempts", "$max_attempts"]}
+            },
+            {"$set": {"status": FAILED, "lease_expires_at": None,
+                      "last_error": "lease expired on the last attempt"}}
+        )
+        if result.modified_count:
+            logger.warning(f"{result.modified_count} jobs failed: lease expired on the last attempt")
+        return result.modified_count
+
+    def claim(self, worker_id: str, lease_seconds: int = EmbeddingWorkerConfig.LEASE_SECONDS) -> Optional[Dict]:
+        """Lease the next pending job, or one whose lease has expired"""
+        now = datetime.datetime.now()
+        self.fail_expired(now)
+        return self.jobs_col.find_one_and_update(
+            {
+                "$or": [
+                    {"status": PENDING},
+                    {"status": LEASED, "lease_expires_at": {"$lt": now}}
+                ],
+                "$expr": {"$lt": ["$attempts", "$max_attempts"]}
+            },
+            {
+                "$set": {
+                    "status": LEASED,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + datetime.timedelta(seconds=lease_seconds),
+                    "heartbeat_at": now,
+                    "started_at": now,
+                    "processed": 0,
+                    "embedded": 0
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_id", 1), ("range_start", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def heartbeat(self, job: Dict, worker_id: str, progress: Dict,
+                  lease_seconds: int = EmbeddingWorkerConfig.LEASE_SECONDS):
+        """Extend the lease and record progress; raises LeaseLostError if the job was taken over"""
+        now = datetime.datetime.now()
+        result = self.jobs_col.update_one(
+            {"_id": job["_id"], "status": LEASED, "lease_owner": worker_id},
+            {"$set": {
+                "lease_expires_at": now + datetime.timedelta(seconds=lease_seconds),
+                "heartbeat_at": now,
+                "processed": progress["processed"],
+                "embedded": progress["embedded"]
+            }}
+        )
+        if result.matched_count == 0:
+            raise LeaseLostError(f"Lost lease on job {job['_id']}")
+
+    def complete(self, job: Dict, worker_id: str, progress: Dict):
+        now = datetime.datetime.now()
+        self.jobs_col.update_one(
+            {"_id": job["_id"], "lease_owner": worker_id},
+            {"$set": {
+                "status": DONE,
+                "lease_expires_at": None,
+                "completed_at": now,
+                "processed": progress["processed"],
+                "embedded": progress["embedded"]
+            }}
+        )
+
+    def fail(self, job: Dict, worker_id: str, error: str):
+        """Release the job for a retry, or mark it failed after max_attempts"""
+        status = FAILED if job["attempts"] >= job["max_attempts"] else PENDING
+        self.jobs_col.update_one(
+            {"_id": job["_id"], "lease_owner": worker_id},
+            {"$set": {"status": status, "lease_expires_at": None, "last_error": error}}
+        )
+        return status
+
+    def latest_run_id(self) -> Optional[str]:
+        latest = self.jobs_col.find_one({}, {"run_id": 1}, sort=[("run_id", -1)])
+        return latest["run_id"] if latest else None
+
+    def status(self, run_id: Optional[str] = None) -> Dict:
+        """Progress by status, throughput per worker and stuck leases for a run"""
+        run_id = run_id or self.latest_run_id()
+        now = datetime.datetime.now()
+        self.fail_expired(now)
+        jobs = list(self.jobs_col.find({"run_id": run_id}))
+
+        by_status = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        workers = {}
+        stuck = []
+        for job in jobs:
+            by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+
+            owner = job.get("lease_owner")
+            if owner and job.get("started_at"):
+                finished = job.get("completed_at") if job["status"] == DONE else job.get("heartbeat_at")
+                elapsed = max(((finished or now) - job["started_at"]).total_seconds(), 1e-6)
+                worker = workers.setdefault(owner, {"jobs": 0, "processed": 0, "seconds": 0.0})
+                worker["jobs"] += 1
+                worker["processed"] += job.get("processed", 0)
+                worker["seconds"] += elapsed
+
+            if job["status"] == LEASED and job.get("lease_expires_at") and job["lease_expires_at"] < now:
+                stuck.append(job)
+
+        for worker in workers.values():
+            worker["messages_per_sec"] = round(worker["processed"] / max(worker["seconds"], 1e-6), 1)
+
+        return {
+            "run_id": run_id,
+            "jobs": len(jobs),
+            "by_status": by_status,
+            "processed": sum(job.get("processed", 0) for job in jobs),
+            "embedded": sum(job.get("embedded", 0) for job in jobs),
+            "workers": workers,
+            "stuck": stuck
+        }
+
+class EmbeddingJobWorker:
+    def __init__(self, worker_id: Optional[str] = None):
+        # The generator owns the database connection, model and embedding logic
+        self.generator = IncrementalEmailEmbeddingGenerator()
+        self.queue = EmbeddingJobQueue(self.generator.email_chatbot_db)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    def range_query(self, job: Dict) -> Dict:
+        id_range = {"$gte": job["range_start"]}
+        if job["range_end"] is not None:
+            id_range["$lt"] = job["range_end"]
+        # Auto-replies, newsletters and bounces are never embedded
+        query = {"_id": id_range, "message_class": None}
+        if job["mode"] == MODE_MISSING:
+            query.update(self.generator.pending_embeddings_query())
+        return query
+
+    def run_job(self, job: Dict) -> Dict:
+        """Embed every message in the job's range, heartbeating as it goes"""
+        progress = {"processed": 0, "embedded": 0}
+        last_heartbeat = time.monotonic()
+
+        documents = list(self.generator.original_emails_col.find(self.range_query(job)).sort("_id", 1))
+
+        previous_docs = []
+        with BulkUpsertWriter(self.generator.email_embeddings_col, max_operations=100) as writer:
+            # Encoded in length-sorted batches, one window at a time
+            for start in range(0, len(documents), AIConfig.EMBEDDING_SORT_WINDOW):
+                window = documents[start:start + AIConfig.EMBEDDING_SORT_WINDOW]
+                embedded_docs = [doc for doc in self.generator.create_embedded_documents(
+                    window, pending_docs=previous_docs) if doc]
+                for embedded_doc in embedded_docs:
+                    writer.upsert(embedded_doc)
+                writer.flush()
+                self.generator.mark_embedded([doc["message_id"] for doc in embedded_docs])
+                progress["embedded"] += len(embedded_docs)
+                progress["processed"] += len(window)
+                # Canonical vectors for near-duplicates in the next window
+                previous_docs = embedded_docs
+
+                if time.monotonic() - last_heartbeat >= EmbeddingWorkerConfig.HEARTBEAT_SECONDS:
+                    self.queue.heartbeat(job, self.worker_id, progress)
+                    last_heartbeat = time.monotonic()
+
+        return progress
+
+    def work(self, idle_exit: bool = True, poll_seconds: int = 10):
+        """Claim and run jobs until none are left (or forever with idle_exit=False)"""
+        logger.info(f"👷 Embedding worker {self.worker_id} started")
+        completed = 0
+
+        while True:
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                if idle_exit:
+                    logger.info(f"No jobs left, worker {self.worker_id} finished {completed} jobs")
+                    return completed
+                time.sleep(poll_seconds)
+                continue
+
+            logger.info(f"Claimed job {job['_id']} (attempt {job['attempts']}/{job['max_attempts']})")
+            started = time.monotonic()
+            try:
+                progress = self.run_job(job)
+                self.queue.complete(job, self.worker_id, progress)
+                completed += 1
+                elapsed = max(time.monotonic() - started, 1e-6)
+                logger.info(f"✅ Job {job['_id']} done: {progress['embedded']}/{progress['processed']} embedded, "
+                            f"{progress['processed'] / elapsed:.1f} messages/sec")
+
+            except LeaseLostError as e:
+                logger.warning(f"{e}; abandoning it")
+
+            except Exception as e:
+                status = self.queue.fail(job, self.worker_id, str(e))
+                logger.error(f"Job {job['_id']} failed ({e}), now {status}")
+
+def print_status(queue: EmbeddingJobQueue, run_id: Optional[str] = None):
+    status = queue.status(run_id)
+    if not status["run_id"]:
+        logger.info("No embedding jobs found")
+        return
+
+    counts = status["by_status"]
+    percent = 100 * counts[DONE] / max(status["jobs"], 1)
+    logger.info(f"=== Embedding run {status['run_id']} ===")
+    logger.info(f"Jobs: {status['jobs']} total, {counts[DONE]} done ({percent:.1f}%), "
+                f"{counts[LEASED]} leased, {counts[PENDING]} pending, {counts[FAILED]} failed")
+    logger.info(f"Messages: {status['processed']} processed, {status['embedded']} embedded")
+
+    for worker_id, worker in sorted(status["workers"].items()):
+        logger.info(f"  {worker_id}: {worker['jobs']} jobs, {worker['processed']} messages, "
+                    f"{worker['messages_per_sec']} messages/sec")
+
+    for job in status["stuck"]:
+        logger.warning(f"⚠️  Stuck lease: job {job['_id']} held by {job['lease_owner']}, "
+                       f"last heartbeat {job.get('heartbeat_at')}, expired {job['lease_expires_at']}")
+
+def main():
+    """Create, work on or inspect embedding jobs"""
+    parser = argparse.ArgumentParser(description="Distributed embedding job queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="split original_emails into jobs")
+    create_parser.add_argument("--all", action="store_true", help="re-embed messages that already have embeddings")
+    create_parser.add_argument("--job-size", type=int, default=EmbeddingWorkerConfig.JOB_SIZE)
+
+    work_parser = subparsers.add_parser("work", help="claim and run jobs")
+    work_parser.add_argument("--worker-id", default=None)
+    work_parser.add_argument("--wait", action="store_true", help="keep polling when the queue is empty")
+
+    status_parser = subparsers.add_parser("status", help="show progress of a run")
+    status_parser.add_argument("--run-id", default=None, help="default: latest run")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "work":
+            worker = EmbeddingJobWorker(worker_id=args.worker_id)
+            worker.work(idle_exit=not args.wait)
+            return
+
+        # create / status only need the database, not the model
+        with open('../../../atlas-creds/atlas-creds.json', 'r') as f:
+            creds_data = json.load(f)
+        database = pymongo.MongoClient(creds_data["mdb-connection-string"]).email_chatbot
+        queue = EmbeddingJobQueue(database)
+
+        if args.command == "create":
+            queue.create_jobs(mode=MODE_ALL if args.all else MODE_MISSING, job_size=args.job_size)
+        print_status(queue)
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Priority scheduling of pending embeddings
+
+During a backlog the messages staff are waiting on should become searchable
+first. Pending messages are split into three tiers:
+
+    unanswered - latest guest message of a thread that has no reply yet
+    recent     - other mail from the last PRIORITY_RECENT_DAYS days
+    backfill   - everything older
+
+and dispatched by weighted round robin (PRIORITY_TIER_WEIGHTS, 6:3:1 by
+default). A lower tier gets its share of every round whenever it has
+work, so a steady stream of new guest mail cannot starve the backfill;
+slots of an empty tier go to the highest-priority tier that has work.
+
+Pending messages are pulled from their cursors in bounded windows
+(PRIORITY_QUEUE_WINDOW) and the queues are refilled as they drain, so a
+full-corpus backfill never holds every pending message in memory. The
+caller supplies two sources: pending mail newer than priority_cutoff(),
+newest first (feeds the unanswered and recent tiers), and older mail,
+oldest first (feeds the backfill tier).
+
+Queue depth per tier is saved in sync_state (_id "embedding_queue") for the
+dashboard.
+"""
+
+import datetime
+import logging
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import EmbeddingWorkerConfig
+
+logger = logging.getLogger(__name__)
+
+UNANSWERED = "unanswered"
+RECENT = "recent"
+BACKFILL = "backfill"
+TIERS = (UNANSWERED, RECENT, BACKFILL)
+
+METRICS_STATE_ID = "embedding_queue"
+
+
+def message_date(document: Dict) -> datetime.datetime:
+    date = document.get("date")
+    return date.replace(tzinfo=None) if isinstance(date, datetime.datetime) else datetime.datetime.min
+
+
+class EmbeddingPriorityScheduler:
+    def __init__(self, original_emails_col,
+                 weights: Optional[List[int]] = None,
+                 recent_days: int = EmbeddingWorkerConfig.PRIORITY_RECENT_DAYS,
+                 unanswered_days: int = EmbeddingWorkerConfig.PRIORITY_UNANSWERED_DAYS,
+                 window: int = EmbeddingWorkerConfig.PRIORITY_QUEUE_WINDOW):
+        self.original_emails_col = original_emails_col
+        self.weights = weights or EmbeddingWorkerConfig.PRIORITY_TIER_WEIGHTS
+        self.recent_days = recent_days
+        self.unanswered_days = unanswered_days
+        self.window = window
+
+        self.queues = {tier: deque() for tier in TIERS}
+        self.dispatched = {tier: 0 for tier in TIERS}
+        # (documents, tiers whose depth decides when the source is pulled from)
+        self.sources: List[Tuple[Iterator[Dict], Tuple[str, ...]]] = []
+
+    def priority_cutoff(self) -> datetime.datetime:
+        """Mail older than this can only be in the backfill tier"""
+        return datetime.datetime.now() - datetime.timedelta(days=max(self.recent_days, self.unanswered_days))
+
+    def add_source(self, documents: Iterable[Dict], tiers: Tuple[str, ...] = TIERS):
+        """Pending documents to pull from, a window at a time, whenever the given tiers run low"""
+        self.sources.append((iter(documents), tiers))
+
+    def refill(self):
+        """Pull the next window from every source whose tiers hold less than a window"""
+        pulled = []
+        for source in list(self.sources):
+            documents, tiers = source
+            if sum(len(self.queues[tier]) for tier in tiers) >= self.window:
+                continue
+            window = list(islice(documents, self.window))
+            if len(window) < self.window:
+                self.sources.remove(source)
+            pulled.extend(window)
+        if pulled:
+            self.enqueue(pulled)
+
+    def latest_messages(self, thread_ids: List[str], chunk_size: int = 1000) -> Dict[str, Dict]:
+        """Latest non-automated message (message_id, sender) of each thread"""
+        latest = {}
+        for start in range(0, len(thread_ids), chunk_size):
+            pipeline = [
+                {"$match": {"thread_id": {"$in": thread_ids[start:start + chunk_size]}, "message_class": None}},
+                {"$sort": {"date": -1}},
+                {"$group": {"_id": "$thread_id",
+                            "message_id": {"$first": "$message_id"},
+                            "sender": {"$first": "$sender"}}}
+            ]
+            for thread in self.original_emails_col.aggregate(pipeline):
+                latest[thread["_id"]] = thread
+        return latest
+
+    def tier_of(self, document: Dict, latest_by_thread: Dict[str, Dict], now: datetime.datetime) -> str:
+        date = document.get("date")
+        if not isinstance(date, datetime.datetime):
+            return BACKFILL
+        age = now - date.replace(tzinfo=None)
+
+        latest = latest_by_thread.get(document.get("thread_id"))
+        if (latest and latest.get("message_id") == document.get("message_id")
+                and document.get("sender") == "Guest" and age <= datetime.timedelta(days=self.unanswered_days)):
+            return UNANSWERED
+        if age <= datetime.timedelta(days=self.recent_days):
+            return RECENT
+        return BACKFILL
+
+    def enqueue(self, documents: Iterable[Dict]):
+        """Sort pending documents into the tier queues"""
+        documents = list(documents)
+        now = datetime.datetime.now()
+        latest_by_thread = self.latest_messages(list({d.get("thread_id") for d in documents if d.get("thread_id")}))
+
+        tiers = {tier: [] for tier in TIERS}
+        for document in documents:
+            tiers[self.tier_of(document, latest_by_thread, now)].append(document)
+
+        # Newest first where staff are waiting, oldest first for the backfill
+        self.queues[UNANSWERED].extend(sorted(tiers[UNANSWERED], key=message_date, reverse=True))
+        self.queues[RECENT].extend(sorted(tiers[RECENT], key=message_date, reverse=True))
+        self.queues[BACKFILL].extend(tiers[BACKFILL])
+
+        logger.info(f"Embedding queue: {self.depths()}")
+
+    def next_tier(self, slot_tier: str) -> Optional[str]:
+        """The slot's own tier if it has work, else the highest-priority tier that does"""
+        if self.queues[slot_tier]:
+            return slot_tier
+        for tier in TIERS:
+            if self.queues[tier]:
+                return tier
+        return None
+
+    def schedule(self, documents: Optional[Iterable[Dict]] = None) -> Iterator[Dict]:
+        """Yield documents by weighted round robin over the tiers, refilling from the sources as they drain"""
+        if documents is not None:
+            self.add_source(documents)
+
+        rotation = [tier for tier, weight in zip(TIERS, self.weights) for _ in range(max(weight, 1))]
+        while True:
+            for slot_tier in rotation:
+                if self.sources:
+                    self.refill()
+                tier = self.next_tier(slot_tier)
+                if tier is None:
+                    return
+                self.dispatched[tier] += 1
+                yield self.queues[tier].popleft()
+
+    def depths(self) -> Dict[str, int]:
+        return {tier: len(self.queues[tier]) for tier in TIERS}
+
+    def save_metrics(self, sync_state_col, pending: Optional[int] = None):
+        """Queue depth and dispatched count per tier, and total pending, for the dashboard"""
+        try:
+            sync_state_col.update_one(
+                {"_id": METRICS_STATE_ID},
+                {"$set": {
+                    "depths": self.depths(),
+                    "pending": pending,
+                    "dispatched": dict(self.dispatched),
+                    "updated_at": datetime.datetime.now()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not save embedding queue metrics: {e}")
+
+
+def load_metrics(sync_state_col) -> Dict:
+    """Last saved queue metrics (zero depths if no run has saved any)"""
+    state = sync_state_col.find_one({"_id": METRICS_STATE_ID}) or {}
+    return {
+        "depths": state.get("depths", {tier: 0 for tier in TIERS}),
+        "dispatched": state.get("dispatched", {tier: 0 for tier in TIERS}),
+        "pending": state.get("pending"),
+        "updated_at": state.get("updated_at")
+    }
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Change-stream embedding worker
+
+Tails a MongoDB change stream on original_emails and embeds new or changed
+messages into email_embeddings within seconds, instead of waiting for the
+next aug_generate_embeddings.py run (which diffs the whole collection).
+
+Events are collected into micro-batches (STREAM_BATCH_SIZE messages or
+STREAM_MAX_WAIT_SECONDS, whichever comes first). After a batch has been
+written, the change stream resume token is saved in sync_state, so a
+restarted worker continues exactly where it stopped. Writes are upserts on
+message_id, so replaying the last batch after a crash is harmless.
+
+On first start (no resume token), or when the token has fallen off the
+oplog, the worker opens the stream and then runs one incremental catch-up
+pass so that nothing inserted before the stream existed is missed.
+
+Usage:
+    python embedding_worker.py
+"""
+import datetime
+import logging
+import time
+from typing import Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from aug_generate_embeddings import IncrementalEmailEmbeddingGenerator
+from bulk_writer import BulkUpsertWriter
+from config import EmbeddingWorkerConfig
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RESUME_STATE_ID = "embedding_worker"
+
+# Server error codes meaning the resume token can no longer be used
+CHANGE_STREAM_HISTORY_LOST = 286
+CHANGE_STREAM_FATAL_ERROR = 280
+
+# Fields whose change requires a new embedding
+EMBEDDED_FIELDS = ("thread_message", "message_class", "duplicate_of")
+
+class EmbeddingStreamWorker:
+    def __init__(self, batch_size: int = EmbeddingWorkerConfig.STREAM_BATCH_SIZE,
+                 max_wait_seconds: float = EmbeddingWorkerConfig.STREAM_MAX_WAIT_SECONDS):
+        # The generator owns the database connection, model and embedding logic
+        self.generator = IncrementalEmailEmbeddingGenerator()
+        self.original_emails_col = self.generator.original_emails_col
+        self.email_embeddings_col = self.generator.email_embeddings_col
+        self.sync_state_col = self.generator.email_chatbot_db.sync_state
+
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.stats = {"events": 0, "embedded": 0, "removed": 0, "batches": 0}
+
+    def get_resume_token(self) -> Optional[Dict]:
+        state = self.sync_state_col.find_one({"_id": RESUME_STATE_ID})
+        return state.get("resume_token") if state else None
+
+    def save_resume_token(self, resume_token: Optional[Dict]):
+        self.sync_state_col.update_one(
+            {"_id": RESUME_STATE_ID},
+            {"$set": {
+                "resume_token": resume_token,
+                "events_processed": self.stats["events"],
+                "updated_at": datetime.datetime.now()
+            }},
+            upsert=True
+        )
+
+    def open_stream(self, resume_token: Optional[Dict]):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        return self.original_emails_col.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=resume_token,
+            max_await_time_ms=int(self.max_wait_seconds * 1000)
+        )
+
+    def needs_embedding(self, change: Dict) -> bool:
+        """Inserts and replaces always; updates only when an embedded field changed"""
+        if change["operationType"] != "update":
+            return True
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        return any(field in updated for field in EMBEDDED_FIELDS)
+
+    def collect_batch(self, stream) -> List[Dict]:
+        """Block until at least one change arrives, then gather a micro-batch"""
+        batch = []
+        deadline = None
+
+        while len(batch) < self.batch_size and stream.alive:
+            change = stream.try_next()
+            if change is None:
+                if batch and time.monotonic() >= deadline:
+                    break
+                continue
+
+            batch.append(change)
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait_seconds
+            elif time.monotonic() >= deadline:
+                break
+
+        return batch
+
+    def process_batch(self, changes: List[Dict]):
+        """Embed the changed messages and upsert them into email_embeddings"""
+        # Latest version of each message in the batch
+        documents = {}
+        for change in changes:
+            document = change.get("fullDocument")
+            if document and self.needs_embedding(change):
+                documents[document.get("message_id")] = document
+
+        removed_ids = [message_id for message_id, document in documents.items()
+                       if document.get("message_class")]
+        if removed_ids:
+            # Reclassified as automated mail: drop it from vector search
+            result = self.email_embeddings_col.delete_many({"message_id": {"$in": removed_ids}})
+            self.stats["removed"] += result.deleted_count
+
+        to_embed = [document for message_id, document in documents.items()
+                    if message_id and not document.get("message_class")]
+        # One batched encode for the whole micro-batch
+        embedded_docs = [doc for doc in self.generator.create_embedded_documents(to_embed) if doc]
+        with BulkUpsertWriter(self.email_embeddings_col) as writer:
+            for embedded_doc in embedded_docs:
+                writer.upsert(embedded_doc)
+        # embedding_status is not in EMBEDDED_FIELDS, so this does not trigger another pass
+        self.generator.mark_embedded([doc["message_id"] for doc in embedded_docs])
+
+        self.stats["events"] += len(changes)
+        self.stats["embedded"] += len(embedded_docs)
+        self.stats["batches"] += 1
+
+        if embedded_docs:
+            logger.info(f"🧠 Embedded {len(embedded_docs)} messages from {len(changes)} changes "
+                        f"(total: {self.stats['embedded']})")
+
+    def run(self):
+        """Process changes until interrupted"""
+        resume_token = self.get_resume_token()
+
+        while True:
+            try:
+                with self.open_stream(resume_token) as stream:
+                    if resume_token is None:
+                        # Catch up on everything stored before the stream was opened;
+                        # changes made meanwhile are queued in the stream
+                        logger.info("No resume token, running catch-up pass...")
+                        self.generator.process_new_embeddings()
+                        self.save_resume_token(stream.resume_token)
+
+                    logger.info("👀 Watching original_emails for new messages...")
+                    while stream.alive:
+                        changes = self.collect_batch(stream)
+                        if not changes:
+                            continue
+                        self.process_batch(changes)
+                        # Only after the batch is written, so a crash replays it
+                        resume_token = stream.resume_token
+                        self.save_resume_token(resume_token)
+                    
+                    # The stream was invalidated (e.g. collection dropped or renamed)
+                    logger.warning("Change stream closed, starting over with a catch-up pass")
+                    resume_token = None
+
+            except OperationFailure as e:
+                if e.code in (CHANGE_STREAM_HISTORY_LOST, CHANGE_STREAM_FATAL_ERROR):
+                    logger.warning(f"Resume token no longer valid ({e}), starting over with a catch-up pass")
+                    resume_token = None
+                    self.save_resume_token(None)
+                else:
+                    logger.error(f"Change stream error: {e}")
+                    time.sleep(5)
+
+            except PyMongoError as e:
+                # Network errors: reopen from the last saved token
+                logger.error(f"Change stream interrupted: {e}")
+                time.sleep(5)
+                resume_token = self.get_resume_token()
+
+def main():
+    """Run the embedding worker until interrupted"""
+    try:
+        worker = EmbeddingStreamWorker()
+        worker.run()
+
+    except KeyboardInterrupt:
+        logger.info("Embedding worker stopped")
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
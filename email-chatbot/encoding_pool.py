@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Multi-process encoding pool for full-corpus embedding backfills
+
+One Python process encodes with one model instance no matter how many cores
+the machine has. EncodingPool starts N worker processes (spawned, so none of
+them inherits the parent's MongoDB client or SQLite connection); each loads
+the model once and pins its torch / ONNX Runtime threads to cpu_count // N so
+the workers do not oversubscribe the cores. Texts are split into shards, each
+shard is length-sorted and encoded in a worker, and the vectors come back in
+input order to the caller, which stays the single MongoDB writer.
+
+Used by:
+    python aug_generate_embeddings.py --workers 4
+    python ../retail-rag-demo/add_embeddings.py 4
+
+benchmark_encoding_pool.py measures scaling from 1 to N workers.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from config import AIConfig
+
+logger = logging.getLogger(__name__)
+
+# Shards per worker for each encode() call: several, so a worker that gets
+# short texts is not left idle while another finishes long ones
+SHARDS_PER_WORKER = 4
+
+# Model of this worker process (set by _init_worker)
+_model = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int, cached: bool, loaded):
+    """Load the model once per worker, with its CPU threads pinned, then release loaded"""
+    global _model
+    # Read by OpenMP / MKL when torch is first imported, which happens below
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    # The SQLite cache connection is opened here, in the worker, never shared
+    if cached:
+        from embedding_cache import load_cached_model
+        _model = load_cached_model(model_name, backend, threads)
+    else:
+        from embedding_backends import load_embedding_model
+        _model = load_embedding_model(model_name, backend, threads)
+    loaded.release()
+
+
+def _encode_shard(texts: List[str], batch_size: int) -> np.ndarray:
+    from aug_generate_embeddings import encode_length_sorted
+    return np.asarray(encode_length_sorted(_model, texts, batch_size), dtype=np.float32)
+
+
+def _start_worker() -> int:
+    return os.getpid()
+
+
+class EncodingPool:
+    def __init__(self, workers: int,
+                 model_name: str = AIConfig.EMBEDDING_MODEL,
+                 backend: str = AIConfig.EMBEDDING_BACKEND,
+                 threads_per_worker: Optional[int] = None,
+                 batch_size: int = AIConfig.EMBEDDING_BATCH_SIZE,
+                 cached: bool = True):
+        self.workers = max(workers, 1)
+        self.threads_per_worker = threads_per_worker or max((os.cpu_count() or 1) // self.workers, 1)
+        self.batch_size = batch_size
+        context = multiprocessing.get_context("spawn")
+        # Released by each worker once its model is loaded (inherited through initargs)
+        self.loaded = context.Semaphore(0)
+        self.loaded_workers = 0
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model_name, backend, self.threads_per_worker, cached, self.loaded)
+        )
+        logger.info(f"Encoding pool: {self.workers} workers x {self.threads_per_worker} threads ({model_name}, {backend})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def warm_up(self) -> float:
+        """Start every worker and wait until each one has loaded its model, return seconds taken"""
+        start = time.perf_counter()
+        # One submit per worker makes the executor start all of them; the
+        # tasks themselves may all run on the first worker that is ready
+        futures = [self.executor.submit(_start_worker) for _ in range(self.workers)]
+        while self.loaded_workers < self.workers:
+            if self.loaded.acquire(timeout=1):
+                self.loaded_workers += 1
+                continue
+            # A worker that failed to load breaks the pool; surface its error
+            for future in futures:
+                if future.done():
+                    future.result()
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+        logger.info(f"Encoding pool ready: {self.loaded_workers} workers loaded in {elapsed:.1f}s")
+        return elapsed
+
+    def shard_size(self, count: int) -> int:
+        return max(math.ceil(count / (self.workers * SHARDS_PER_WORKER)), self.batch_size)
+
+    def encode(self, texts: Sequence[str]) -> List[np.ndarray]:
+        """Vectors for texts, in input order"""
+        texts = list(texts)
+        size = self.shard_size(len(texts))
+        futures = [self.executor.submit(_encode_shard, texts[start:start + size], self.batch_size)
+                   for start in range(0, len(texts), size)]
+        vectors = []
+        for future in futures:
+            vectors.extend(future.result())
+        return vectors
+
+    def imap(self, chunks: Iterable[Sequence[str]]) -> Iterator[np.ndarray]:
+        """
+        Encode a stream of text chunks, yielding each chunk's vectors in order.
+
+        At most two chunks per worker are in flight, so a writer consuming the
+        results keeps every worker busy without the whole corpus in memory.
+        """
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(self.executor.submit(_encode_shard, list(chunk), self.batch_size))
+            if len(in_flight) >= self.workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for the Gmail API service used by benchmarks
+
+Serves the sample Gmail messages captured in output.json, simulates network
+round-trip time for single and batch requests, and can inject 429 responses
+to exercise retry logic. Only the calls the ingestion scripts make are
+implemented.
+"""
+
+import ast
+import os
+import random
+import threading
+import time
+from typing import Dict, List
+
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+
+SAMPLE_OUTPUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output.json")
+
+
+def load_sample_messages(path: str = SAMPLE_OUTPUT_FILE) -> List[Dict]:
+    """Load the raw Gmail message dicts printed into output.json"""
+    messages = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("{'id'"):
+                messages.append(ast.literal_eval(line))
+    return messages
+
+
+def build_sample_threads(thread_count: int, messages_per_thread: int = 3) -> Dict[str, Dict]:
+    """Build thread_count synthetic threads by cycling through the sample messages"""
+    samples = load_sample_messages()
+    threads = {}
+
+    for t in range(thread_count):
+        thread_id = f"{t:016x}"
+        messages = []
+        for m in range(messages_per_thread):
+            sample = samples[(t * messages_per_thread + m) % len(samples)]
+            message_id = f"{t:012x}{m:04x}"
+            # Give every copy its own Message-ID header so copies are distinct messages
+            headers = [
+                {"name": h["name"], "value": f"<{message_id}@fake.mail>"}
+                if h["name"].lower() == "message-id" else h
+                for h in sample["payload"].get("headers", [])
+            ]
+            payload = dict(sample["payload"], headers=headers)
+            messages.append(dict(sample, id=message_id, threadId=thread_id, payload=payload))
+        threads[thread_id] = {"id": thread_id, "historyId": "1", "messages": messages}
+
+    return threads
+
+
+def rate_limit_error() -> HttpError:
+    return HttpError(Response({"status": 429}), b'{"error": {"code": 429, "message": "Rate limit exceeded"}}')
+
+
+class FakeRequest:
+    def __init__(self, service, handler):
+        self.service = service
+        self.handler = handler
+
+    def execute(self, http=None):
+        self.service.simulate_round_trip()
+        return self.handler()
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        # One round trip for the whole batch, plus a small per-item server cost
+        self.service.simulate_round_trip(items=len(self.requests))
+        for request_id, request in self.requests:
+            if random.random() < self.service.rate_limit_probability:
+                self.callback(request_id, None, rate_limit_error())
+            else:
+                self.callback(request_id, request.handler(), None)
+
+
+class FakeResource:
+    def __init__(self, service, kind):
+        self.service = service
+        self.kind = kind
+
+    def get(self, userId, id, format="full", **kwargs):
+        if self.kind == "threads":
+            return FakeRequest(self.service, lambda: self.service.thread_store[id])
+        return FakeRequest(self.service, lambda: self.service.message_store[id])
+
+    def list(self, userId, pageToken=None, maxResults=100, **kwargs):
+        def handler():
+            ids = list(self.service.thread_store)
+            start = int(pageToken or 0)
+            page = {"threads": [{"id": thread_id} for thread_id in ids[start:start + maxResults]]}
+            if start + maxResults < len(ids):
+                page["nextPageToken"] = str(start + maxResults)
+            return page
+        return FakeRequest(self.service, handler)
+
+
+class FakeGmailService:
+    """Minimal fake of the googleapiclient Gmail service"""
+
+    def __init__(self, threads: Dict[str, Dict], latency: float = 0.05,
+                 per_item_latency: float = 0.002, rate_limit_probability: float = 0.0):
+        self.thread_store = threads
+        self.message_store = {m["id"]: m for thread in threads.values() for m in thread["messages"]}
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.rate_limit_probability = rate_limit_probability
+        self.round_trips = 0
+        self.lock = threading.Lock()
+
+    def simulate_round_trip(self, items: int = 1):
+        with self.lock:
+            self.round_trips += 1
+        time.sleep(self.latency + self.per_item_latency * items)
+
+    def users(self):
+        return self
+
+    def threads(self):
+        return FakeResource(self, "threads")
+
+    def messages(self):
+        return FakeResource(self, "messages")
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
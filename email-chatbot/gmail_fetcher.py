@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Batched, concurrent Gmail fetching
+
+Groups threads().get / messages().get calls into Gmail HTTP batch requests and
+keeps a bounded number of batches in flight. A token bucket keeps us under the
+per-user Gmail quota, and rate-limit / server errors are retried with
+exponential backoff and jitter.
+
+Used by EmailCollector (aug_collect_all_emails.py) and EmailUpdater
+(aug_update_emails.py).
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from config import GmailConfig
+
+logger = logging.getLogger(__name__)
+
+# Gmail API quota cost per call, in quota units
+THREAD_GET_COST = 10
+MESSAGE_GET_COST = 5
+
+# HTTP statuses worth retrying
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Return True for rate-limit and transient server errors"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in RETRYABLE_STATUSES:
+            return True
+        # Gmail reports some per-user rate limits as 403
+        if status == 403:
+            try:
+                reasons = {detail.get("reason") for detail in error.error_details or []}
+            except Exception:
+                reasons = set()
+            return bool(reasons & RATE_LIMIT_REASONS)
+        return False
+    # Socket timeouts, connection resets, etc.
+    return isinstance(error, (OSError, TimeoutError))
+
+
+class QuotaTokenBucket:
+    """Thread-safe token bucket measured in Gmail quota units"""
+
+    def __init__(self, units_per_second: float, capacity: Optional[float] = None):
+        self.rate = units_per_second
+        self.capacity = capacity or units_per_second
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, units: float):
+        """Block until the requested number of units is available"""
+        while units > 0:
+            # Requests larger than the bucket are taken in capacity-sized chunks
+            chunk = min(units, self.capacity)
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= chunk:
+                    self.tokens -= chunk
+                    units -= chunk
+                    continue
+
+                wait = (chunk - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GmailBatchFetcher:
+    """Fetch Gmail threads or messages through concurrent HTTP batch requests"""
+
+    def __init__(self, gmail_service, credentials=None,
+                 batch_size: int = GmailConfig.BATCH_SIZE,
+                 max_concurrent_batches: int = GmailConfig.MAX_CONCURRENT_BATCHES,
+                 quota_units_per_second: float = GmailConfig.QUOTA_UNITS_PER_SECOND,
+                 max_retries: int = GmailConfig.MAX_RETRIES,
+                 base_delay: float = 1.0, max_delay: float = 32.0):
+        self.gmail_service = gmail_service
+        self.credentials = credentials
+        self.batch_size = batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self.quota = QuotaTokenBucket(quota_units_per_second)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.local = threading.local()
+
+    def get_http(self):
+        """
+        Get an authorized HTTP object for the current worker thread.
+
+        httplib2 connections are not thread-safe, so each worker needs its own.
+        Without credentials the service's own HTTP object is used, which is
+        only safe with max_concurrent_batches=1 (or a fake service in tests).
+        """
+        if self.credentials is None:
+            return None
+
+        if not hasattr(self.local, "http"):
+            import google_auth_httplib2
+            import httplib2
+            self.local.http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+        return self.local.http
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def execute_batch(self, ids: List[str], build_request: Callable, cost: int) -> Dict[str, Optional[Dict]]:
+        """Execute one batch, retrying failed sub-requests; failed IDs map to None"""
+        results = {}
+        pending = list(ids)
+
+        for attempt in range(self.max_retries + 1):
+            errors = {}
+
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    errors[request_id] = exception
+                else:
+                    results[request_id] = response
+
+            self.quota.acquire(cost * len(pending))
+
+            batch = self.gmail_service.new_batch_http_request(callback=callback)
+            for item_id in pending:
+                batch.add(build_request(item_id), request_id=item_id)
+
+            try:
+                batch.execute(http=self.get_http())
+            except Exception as e:
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    logger.error(f"Gmail batch request failed: {e}")
+                    break
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Gmail batch request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            retry_ids = [item_id for item_id, error in errors.items() if is_retryable_error(error)]
+            for item_id, error in errors.items():
+                if item_id not in retry_ids:
+                    logger.error(f"Error fetching {item_id}: {error}")
+
+            if not retry_ids:
+                break
+
+            if attempt == self.max_retries:
+                logger.error(f"Giving up on {len(retry_ids)} requests after {self.max_retries} retries")
+                break
+
+            delay = self.backoff_delay(attempt)
+            logger.warning(f"{len(retry_ids)} requests rate limited or failed, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            pending = retry_ids
+
+        return {item_id: results.get(item_id) for item_id in ids}
+
+    def fetch(self, ids: Iterable[str], build_request: Callable, cost: int) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """
+        Yield (id, response) in input order; response is None if the request failed.
+
+        At most max_concurrent_batches batches are in flight at once, so memory
+        stays bounded however many IDs are passed in.
+        """
+        ids = list(ids)
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+
+        if not batches:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_batches) as executor:
+            in_flight = deque()
+            next_batch = 0
+
+            while next_batch < len(batches) or in_flight:
+                while next_batch < len(batches) and len(in_flight) < self.max_concurrent_batches:
+                    batch_ids = batches[next_batch]
+                    in_flight.append((batch_ids, executor.submit(self.execute_batch, batch_ids, build_request, cost)))
+                    next_batch += 1
+
+                batch_ids, future = in_flight.popleft()
+                batch_results = future.result()
+                for item_id in batch_ids:
+                    yield item_id, batch_results[item_id]
+
+    def fetch_threads(self, thread_ids: Iterable[str], format: str = "full",
+                      **kwargs) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Fetch threads with users().threads().get; extra kwargs are passed through"""
+        threads_api = self.gmail_service.users().threads()
+
+        def build_request(thread_id):
+            return threads_api.get(userId="me", id=thread_id, format=format, **kwargs)
+
+        return self.fetch(thread_ids, build_request, THREAD_GET_COST)
+
+    def fetch_messages(self, message_ids: Iterable[str], format: str = "full",
+                       **kwargs) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Fetch messages with users().messages().get; extra kwargs are passed through"""
+        messages_api = self.gmail_service.users().messages()
+
+        def build_request(message_id):
+            return messages_api.get(userId="me", id=message_id, format=format, **kwargs)
+
+        return self.fetch(message_ids, build_request, MESSAGE_GET_COST)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+HTML-to-text extraction for email bodies
+
+The default extractor parses with lxml (libxml2) and falls back to
+BeautifulSoup for documents lxml cannot handle. Both extractors drop <style>,
+<script> and hidden elements and otherwise keep BeautifulSoup's get_text()
+semantics: the document's text nodes concatenated without separators
+(whitespace is normalized later by clean_email_content).
+
+Select the extractor with IngestionConfig.HTML_EXTRACTOR ("lxml" or "bs4").
+"""
+
+import logging
+import re
+from typing import Callable, Dict
+
+from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+
+from config import IngestionConfig
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text is never shown to the reader
+NON_TEXT_TAGS = ("script", "style", "noscript", "template")
+
+# Inline styles that hide an element (preheaders, tracking blocks, etc.)
+HIDDEN_STYLE_PATTERN = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+
+HIDDEN_XPATH = etree.XPath(
+    "//*[@hidden or @aria-hidden='true' or contains(@style, 'none') or contains(@style, 'hidden')]"
+)
+
+
+def extract_text_lxml(html: str) -> str:
+    """Extract text with lxml; raises on documents lxml cannot parse"""
+    document = lxml_html.document_fromstring(html)
+
+    etree.strip_elements(document, *NON_TEXT_TAGS, with_tail=False)
+
+    for element in HIDDEN_XPATH(document):
+        if element.getparent() is None:
+            continue
+        if (element.get("hidden") is not None or element.get("aria-hidden") == "true"
+                or HIDDEN_STYLE_PATTERN.search(element.get("style") or "")):
+            # drop_tree keeps the element's tail text, which is visible
+            element.drop_tree()
+
+    return document.text_content()
+
+
+def extract_text_bs4(html: str) -> str:
+    """Extract text with BeautifulSoup's html.parser (slower, very lenient)"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    for element in soup(NON_TEXT_TAGS):
+        element.decompose()
+
+    for element in soup.find_all(lambda tag: tag.has_attr("hidden")
+                                 or tag.get("aria-hidden") == "true"
+                                 or HIDDEN_STYLE_PATTERN.search(tag.get("style") or "")):
+        if not element.decomposed:
+            element.decompose()
+
+    return soup.get_text()
+
+
+def extract_text_lxml_with_fallback(html: str) -> str:
+    """lxml fast path; BeautifulSoup for malformed or unparseable documents"""
+    try:
+        return extract_text_lxml(html)
+    except (etree.ParserError, etree.XMLSyntaxError, ValueError) as e:
+        logger.debug(f"lxml could not parse HTML ({e}), falling back to BeautifulSoup")
+        return extract_text_bs4(html)
+
+
+EXTRACTORS: Dict[str, Callable[[str], str]] = {
+    "lxml": extract_text_lxml_with_fallback,
+    "bs4": extract_text_bs4,
+}
+
+
+def get_text_extractor(name: str = IngestionConfig.HTML_EXTRACTOR) -> Callable[[str], str]:
+    """Look up an extractor by name"""
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML extractor '{name}' (choose from {', '.join(EXTRACTORS)})")
+    return EXTRACTORS[name]
+
+
+html_to_text = get_text_extractor()
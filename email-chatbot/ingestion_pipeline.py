@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Pipelined email ingestion: fetch (I/O) -> parse (CPU) -> write (I/O)
+
+Fetching runs in a background thread, MIME decoding and HTML-to-text parsing
+run in a ProcessPoolExecutor sized to the core count, and the caller consumes
+parsed results as the write stage. Stages are connected by bounded queues so
+memory stays flat, and each stage keeps a throughput counter so the
+bottleneck is visible in the logs.
+
+Parse workers are spawned, not forked: the pool starts its processes on the
+first submit, after the fetch thread (and, in the webapp, request threads)
+are running, and a forked child could inherit a lock held by one of them or
+the parent's MongoDB client. parse_fn and its module must therefore be
+importable by a fresh interpreter.
+
+Usage:
+    with IngestionPipeline() as pipeline:
+        for thread_id, messages in pipeline.process(fetcher.fetch_threads(ids), parse_thread):
+            ...  # write stage
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import IngestionConfig
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class StageCounter:
+    """Items handled and time spent working (not waiting on queues) by one stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, items: int, busy_seconds: float):
+        with self.lock:
+            self.items += items
+            self.busy_seconds += busy_seconds
+
+    def summary(self) -> Dict:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "items_per_sec": round(self.items / elapsed, 1),
+            "busy_percent": round(min(self.busy_seconds / elapsed, 1.0) * 100, 1)
+        }
+
+
+def _run_parse(parse_fn: Callable, key: str, payload: Optional[Dict]) -> Tuple[Optional[List[Dict]], float]:
+    """Worker entry point: parse one item and report CPU time spent"""
+    start = time.process_time()
+    try:
+        result = parse_fn(key, payload) if payload is not None else None
+    except Exception as e:
+        logger.error(f"Error parsing {key}: {e}")
+        result = None
+    return result, time.process_time() - start
+
+
+class IngestionPipeline:
+    """Fetch / parse / write pipeline with a process pool for parsing"""
+
+    def __init__(self, parse_workers: int = IngestionConfig.PARSE_WORKERS,
+                 queue_size: int = IngestionConfig.QUEUE_SIZE, inline: bool = False):
+        # 0 means one worker per core; inline parses in the calling thread
+        # (no pool), which is cheaper for a handful of messages
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.inline = inline
+        self.executor = None
+        self.counters = {}
+
+    def __enter__(self):
+        if not self.inline:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.log_stage_stats()
+
+    def _counter(self, name: str) -> StageCounter:
+        if name not in self.counters:
+            self.counters[name] = StageCounter(name)
+        return self.counters[name]
+
+    def _fetch_stage(self, items: Iterable[Tuple[str, Optional[Dict]]], fetched: queue.Queue,
+                     stop: threading.Event):
+        counter = self._counter("fetch")
+        iterator = iter(items)
+        try:
+            while not stop.is_set():
+                start = time.monotonic()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                counter.record(1, time.monotonic() - start)
+                fetched.put(item)
+        except Exception as e:
+            logger.error(f"Fetch stage failed: {e}")
+            fetched.put(e)
+        finally:
+            fetched.put(_DONE)
+
+    def process(self, items: Iterable[Tuple[str, Optional[Dict]]],
+                parse_fn: Callable[[str, Dict], List[Dict]]) -> Iterator[Tuple[str, Optional[List[Dict]]]]:
+        """
+        Yield (key, parsed documents) in input order.
+
+        items yields (key, raw payload) pairs, e.g. from GmailBatchFetcher; a
+        None payload (failed fetch) or a parse error yields (key, None).
+        parse_fn must be a module-level function so it can be pickled.
+        Time the caller spends between iterations is counted as the write stage.
+        """
+        fetched = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        fetch_thread = threading.Thread(target=self._fetch_stage, args=(items, fetched, stop), daemon=True)
+        fetch_thread.start()
+
+        parse_counter = self._counter("parse")
+        write_counter = self._counter("write")
+        # Bounded window of parse jobs in flight; results are yielded in order
+        max_in_flight = max(self.queue_size, 2 * self.parse_workers)
+        in_flight = deque()
+        fetch_done = False
+
+        try:
+            while True:
+                while not fetch_done and len(in_flight) < max_in_flight:
+                    item = fetched.get()
+                    if item is _DONE:
+                        fetch_done = True
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+
+                    key, payload = item
+                    if self.executor:
+                        in_flight.append((key, self.executor.submit(_run_parse, parse_fn, key, payload)))
+                    else:
+                        in_flight.append((key, _run_parse(parse_fn, key, payload)))
+
+                if not in_flight:
+                    break
+
+                key, job = in_flight.popleft()
+                result, cpu_seconds = job.result() if self.executor else job
+                parse_counter.record(1, cpu_seconds if self.inline else cpu_seconds / self.parse_workers)
+
+                start = time.monotonic()
+                yield key, result
+                write_counter.record(1, time.monotonic() - start)
+        finally:
+            stop.set()
+            # Unblock the fetch thread if it is waiting on a full queue
+            while fetch_thread.is_alive():
+                try:
+                    fetched.get_nowait()
+                except queue.Empty:
+                    fetch_thread.join(timeout=0.1)
+
+    def stage_stats(self) -> List[Dict]:
+        """Per-stage throughput; the stage with the highest busy_percent is the bottleneck"""
+        return [self.counters[name].summary() for name in ("fetch", "parse", "write") if name in self.counters]
+
+    def log_stage_stats(self):
+        stats = self.stage_stats()
+        if not stats:
+            return
+        for stage in stats:
+            logger.info(f"Pipeline {stage['stage']:<5}: {stage['items']} items, "
+                        f"{stage['items_per_sec']} items/sec, busy {stage['busy_percent']}%")
+        bottleneck = max(stats, key=lambda stage: stage["busy_percent"])
+        logger.info(f"Pipeline bottleneck: {bottleneck['stage']} stage")
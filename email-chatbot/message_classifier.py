@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Classification of automated mail: auto-replies, newsletters and bounces
+
+Runs during parsing, before a message is stored. Header heuristics decide
+most messages (Auto-Submitted, List-Unsubscribe, Precedence, delivery
+status reports). A weaker header signal (a noreply-style sender, a null
+Return-Path, X-Auto-Response-Suppress) is only acted on when a small
+weighted-phrase scorer over subject and body confirms it. Text alone never
+classifies a message: guests write "unsubscribe", "out of office" or
+"limited time" in real inquiries, and a classified message silently
+disappears from embedding, retrieval and find_unanswered_guest_emails.
+Messages get message_class set to "auto_reply", "newsletter" or "bounce"
+(None for real conversation).
+
+Usage (classify messages stored before this module existed; only the From
+header is stored, so re-parse the raw archive for full header-based
+classification):
+    python message_classifier.py
+"""
+
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+AUTO_REPLY = "auto_reply"
+NEWSLETTER = "newsletter"
+BOUNCE = "bounce"
+
+BOUNCE_SENDER_PATTERN = re.compile(r"mailer-daemon|postmaster|mail delivery (?:subsystem|system)", re.IGNORECASE)
+AUTO_REPLY_HEADERS = ("x-autoreply", "x-autorespond")
+NEWSLETTER_HEADERS = ("list-unsubscribe", "list-id", "x-campaign", "x-mailchimp-campaign", "x-mc-user",
+                      "feedback-id", "x-sg-eid")
+
+# Senders that are never a person; on their own not enough to classify
+AUTOMATED_SENDER_PATTERN = re.compile(
+    r"\b(?:no-?reply|do-?not-?reply|notifications?|newsletters?|marketing|mailer|bounces?)[\w.+-]*@", re.IGNORECASE
+)
+
+# Weighted phrases for the text scorer: (pattern, weight). A category is
+# chosen when its summed weight reaches TEXT_SCORE_THRESHOLD and a weak
+# header signal is present.
+TEXT_FEATURES: Dict[str, List[Tuple[re.Pattern, float]]] = {
+    BOUNCE: [
+        (re.compile(r"\b(?:undeliverable|undelivered mail|delivery (?:status notification|has failed|failure))", re.I), 2.0),
+        (re.compile(r"\b(?:address not found|recipient address rejected|user unknown|mailbox unavailable)", re.I), 2.0),
+        (re.compile(r"\b(?:couldn't be delivered|could not be delivered|wasn't delivered)", re.I), 1.5),
+        (re.compile(r"\b5\.\d\.\d\b"), 1.0),
+    ],
+    AUTO_REPLY: [
+        (re.compile(r"\b(?:automatic reply|auto-?reply|autoresponder)", re.I), 2.0),
+        (re.compile(r"\bout of (?:the )?office\b", re.I), 1.5),
+        (re.compile(r"\bI(?:'m| am) (?:currently )?(?:away|out|on (?:vacation|leave|holiday))", re.I), 1.5),
+        (re.compile(r"\b(?:limited|no) access to (?:my )?e-?mail", re.I), 1.0),
+        (re.compile(r"\bwill (?:respond|reply|get back to you) (?:to your (?:e-?mail|message) )?(?:when|upon) (?:I|my) return", re.I), 1.5),
+        (re.compile(r"\bthis is an automated (?:response|message|reply)", re.I), 2.0),
+    ],
+    NEWSLETTER: [
+        (re.compile(r"\bunsubscribe\b", re.I), 1.5),
+        (re.compile(r"\b(?:view (?:this email )?in (?:your|a) browser|manage (?:your )?(?:email )?preferences)", re.I), 1.5),
+        (re.compile(r"\byou(?:'re| are) receiving this (?:e-?mail|message) because", re.I), 1.5),
+        (re.compile(r"\b(?:newsletter|% off|limited time offer|shop now)", re.I), 1.0),
+    ],
+}
+TEXT_SCORE_THRESHOLD = 2.0
+
+# Only the start of the body is scored; automated text is up front or in a short footer
+TEXT_SCORE_CHARS = 4000
+
+
+def classify_by_headers(headers: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """(class, reason) from headers alone; headers are keyed by lowercase name"""
+    from_header = headers.get("from", "")
+    content_type = headers.get("content-type", "").lower()
+
+    if (BOUNCE_SENDER_PATTERN.search(from_header) or "report-type=delivery-status" in content_type
+            or "x-failed-recipients" in headers):
+        return BOUNCE, "delivery status headers"
+
+    auto_submitted = headers.get("auto-submitted", "").strip().lower()
+    if auto_submitted and auto_submitted != "no":
+        return AUTO_REPLY, f"Auto-Submitted: {auto_submitted}"
+    for name in AUTO_REPLY_HEADERS:
+        if name in headers:
+            return AUTO_REPLY, f"{name} header"
+
+    precedence = headers.get("precedence", "").strip().lower()
+    if precedence == "auto_reply":
+        return AUTO_REPLY, "Precedence: auto_reply"
+    if precedence in ("bulk", "list", "junk"):
+        return NEWSLETTER, f"Precedence: {precedence}"
+    for name in NEWSLETTER_HEADERS:
+        if name in headers:
+            return NEWSLETTER, f"{name} header"
+
+    return None
+
+
+def header_signals(headers: Dict[str, str]) -> List[str]:
+    """Weak signs of automated mail, each needing the text scorer to agree"""
+    signals = []
+    if AUTOMATED_SENDER_PATTERN.search(headers.get("from", "")):
+        signals.append("automated sender address")
+    if headers.get("return-path", "").strip() == "<>":
+        signals.append("null Return-Path")
+    if "x-auto-response-suppress" in headers:
+        signals.append("X-Auto-Response-Suppress header")
+    return signals
+
+
+def text_scores(subject: str, text: str) -> Dict[str, float]:
+    sample = f"{subject}\n{text[:TEXT_SCORE_CHARS]}"
+    return {
+        category: sum(weight for pattern, weight in features if pattern.search(sample))
+        for category, features in TEXT_FEATURES.items()
+    }
+
+
+def classify_by_text(subject: str, text: str) -> Optional[Tuple[str, str]]:
+    scores = text_scores(subject, text)
+    category, score = max(scores.items(), key=lambda item: item[1])
+    if score >= TEXT_SCORE_THRESHOLD:
+        return category, f"text score {score:.1f}"
+    return None
+
+
+def classify_message(headers: Dict[str, str], subject: str, text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(message_class, reason); (None, None) for ordinary conversation"""
+    result = classify_by_headers(headers)
+    if result:
+        return result
+
+    # Text only confirms a header signal; it never suppresses a message by itself
+    signals = header_signals(headers)
+    if signals:
+        result = classify_by_text(subject, text)
+        if result:
+            return result[0], f"{signals[0]} + {result[1]}"
+    return None, None
+
+
+def classify_stored_messages(collection, batch_size: int = 500) -> Dict[str, int]:
+    """Classification of original_emails documents without message_class (From header + text)"""
+    counts = {"messages": 0, AUTO_REPLY: 0, NEWSLETTER: 0, BOUNCE: 0}
+    operations = []
+
+    cursor = collection.find({"message_class": {"$exists": False}},
+                             {"subject": 1, "thread_message": 1, "from_header": 1}).batch_size(batch_size)
+    for document in cursor:
+        message_class, reason = classify_message({"from": document.get("from_header", "")},
+                                                 document.get("subject", ""),
+                                                 document.get("thread_message", ""))
+        operations.append(pymongo.UpdateOne({"_id": document["_id"]}, {"$set": {
+            "message_class": message_class, "message_class_reason": reason
+        }}))
+        counts["messages"] += 1
+        if message_class:
+            counts[message_class] += 1
+
+        if len(operations) >= batch_size:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return counts
+
+
+def main():
+    """Classify stored messages that predate message_class"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        with open('../../../atlas-creds/atlas-creds.json', 'r') as f:
+            creds_data = json.load(f)
+
+        mdb_client = pymongo.MongoClient(creds_data["mdb-connection-string"])
+        counts = classify_stored_messages(mdb_client.email_chatbot.original_emails)
+        logger.info(f"✅ Classified stored messages: {counts}")
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
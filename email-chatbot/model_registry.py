@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Process-wide registry of embedding models
+
+Every generator used to load its own copy of the embedding model, so the
+webapp (embedding generator + response generator) held two copies and paid
+the load time twice. get_model returns one shared instance per
+(model name, backend) in the process, loaded on first use.
+
+Loading is guarded by a lock per model, so concurrent first requests wait
+for a single load instead of racing. Shared models are wrapped so encode()
+and the tokenizer are called by one request thread at a time (Hugging Face
+fast tokenizers are not safe to call concurrently); CPU inference already
+uses every core, so this costs little throughput.
+
+registry_metrics() reports load time, process RSS growth during the load,
+parameter memory and use count per model (shown by the webapp's /api/stats).
+
+Usage:
+    from model_registry import get_model
+    model = get_model('sentence-transformers/all-MiniLM-L6-v2')
+"""
+
+import datetime
+import logging
+import os
+import resource
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import AIConfig
+from embedding_cache import load_cached_model
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parameter_mb(model) -> Optional[float]:
+    """Memory held by the model's weights, if the backend exposes them"""
+    model = getattr(model, "model", model)  # unwrap CachedEncoder
+    try:
+        return round(sum(p.numel() * p.element_size() for p in model.parameters()) / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+class LockedCall:
+    """Callable (tokenizer) that runs under a lock; other attributes pass through"""
+
+    def __init__(self, target, lock: threading.Lock):
+        self.target = target
+        self.lock = lock
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.target(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+class SharedModel:
+    """Model shared across request threads: encode() and the tokenizer run one call at a time"""
+
+    def __init__(self, model, model_name: str, backend: str):
+        self.model = model
+        self.model_name = model_name
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.uses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    @property
+    def tokenizer(self):
+        return LockedCall(self.model.tokenizer, self.lock)
+
+    def encode(self, sentences, *args, **kwargs):
+        with self.lock:
+            self.uses += 1
+            return self.model.encode(sentences, *args, **kwargs)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.models: Dict[tuple, SharedModel] = {}
+        self.metrics: Dict[tuple, Dict] = {}
+        self.load_locks: Dict[tuple, threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def get(self, model_name: str = AIConfig.EMBEDDING_MODEL,
+            backend: str = AIConfig.EMBEDDING_BACKEND) -> SharedModel:
+        """The shared model for (model_name, backend), loaded on first use"""
+        key = (model_name, backend)
+        model = self.models.get(key)
+        if model is not None:
+            return model
+
+        with self.lock:
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another thread may have loaded it while this one waited
+            if key in self.models:
+                return self.models[key]
+
+            logger.info(f"Loading {model_name} ({backend}) into the model registry...")
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+            model = SharedModel(load_cached_model(model_name, backend), model_name, backend)
+            load_seconds = time.perf_counter() - start
+
+            self.metrics[key] = {
+                "model": model_name,
+                "backend": backend,
+                "load_seconds": round(load_seconds, 2),
+                "rss_increase_mb": round(current_rss_mb() - rss_before, 1),
+                "parameter_mb": parameter_mb(model.model),
+                "loaded_at": datetime.datetime.now().isoformat()
+            }
+            self.models[key] = model
+            logger.info(f"✅ {model_name} ({backend}) loaded in {load_seconds:.1f}s, "
+                        f"+{self.metrics[key]['rss_increase_mb']} MB RSS")
+            return model
+
+    def stats(self) -> List[Dict]:
+        """Load time, memory and use count of every loaded model"""
+        return [dict(self.metrics[key], uses=model.uses) for key, model in list(self.models.items())]
+
+
+# One registry per process
+registry = ModelRegistry()
+
+
+def get_model(model_name: str = AIConfig.EMBEDDING_MODEL, backend: str = AIConfig.EMBEDDING_BACKEND) -> SharedModel:
+    return registry.get(model_name, backend)
+
+
+def registry_metrics() -> Dict:
+    return {"models": registry.stats(), "rss_mb": round(current_rss_mb(), 1)}
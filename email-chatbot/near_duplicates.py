@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for original_emails
+
+Each message gets a 64-bit SimHash of its word 3-gram shingles. Messages
+whose fingerprints differ in at most IngestionConfig.SIMHASH_MAX_DISTANCE
+bits (resent inquiries, template replies) are near-duplicates: the first
+one stored is canonical and later copies get duplicate_of = <canonical
+message_id>. Embedding reuses the canonical vector for duplicates and
+find_similar_conversations returns one result per canonical message.
+
+Candidates are found through simhash_bands: the fingerprint split into four
+16-bit bands. Two fingerprints within 3 bits of each other agree on at
+least one band, so a single indexed $in query finds every candidate. The
+guarantee only holds for a max distance below the band count (4 differing
+bits can touch every band), so NearDuplicateIndex rejects larger values.
+
+Usage (fingerprint messages stored before this module existed):
+    python near_duplicates.py
+"""
+
+import hashlib
+import json
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pymongo
+
+from config import IngestionConfig
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+SHINGLE_SIZE = 3
+BAND_BITS = 16
+BAND_COUNT = 64 // BAND_BITS
+BIT_POSITIONS = np.arange(64, dtype=np.uint64)
+
+# Fingerprints of messages seen in this process, checked before MongoDB so
+# duplicates within one unflushed write batch are caught too
+SESSION_CACHE_LIMIT = 50000
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash of the word shingles of text (None for very short texts)"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < IngestionConfig.SIMHASH_MIN_WORDS:
+        return None
+
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+
+    # Each shingle votes +1/-1 on every bit; the fingerprint keeps the majority
+    bit_counts = ((hashes[:, None] >> BIT_POSITIONS) & np.uint64(1)).sum(axis=0)
+    majority = bit_counts * 2 > len(hashes)
+    return int(np.sum(np.uint64(1) << BIT_POSITIONS[majority], dtype=np.uint64))
+
+
+def to_int64(value: int) -> int:
+    """Store unsigned fingerprints in BSON's signed int64"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_int64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def simhash_bands(value: int) -> List[int]:
+    """Band keys (band number in the high bits) for a single multikey index"""
+    mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | ((value >> (band * BAND_BITS)) & mask) for band in range(BAND_COUNT)]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def fingerprint_fields(text: str) -> Dict:
+    """Fields stored on an original_emails document"""
+    value = simhash(text or "")
+    if value is None:
+        return {"simhash": None, "simhash_bands": []}
+    return {"simhash": to_int64(value), "simhash_bands": simhash_bands(value)}
+
+
+class NearDuplicateIndex:
+    """Assigns duplicate_of for new messages against original_emails"""
+
+    def __init__(self, collection, max_distance: int = IngestionConfig.SIMHASH_MAX_DISTANCE):
+        if not 0 <= max_distance < BAND_COUNT:
+            # Beyond this, near-duplicates can differ in every band and never become candidates
+            raise ValueError(f"SIMHASH_MAX_DISTANCE must be between 0 and {BAND_COUNT - 1} "
+                             f"with {BAND_COUNT} bands of {BAND_BITS} bits, got {max_distance}")
+        self.collection = collection
+        self.max_distance = max_distance
+        # band key -> [(message_id, fingerprint)] of canonical messages seen this session
+        self.session_bands: Dict[int, List[Tuple[str, int]]] = {}
+        self.session_size = 0
+
+    def create_indexes(self):
+        try:
+            self.collection.create_index("simhash_bands")
+        except Exception as e:
+            logger.warning(f"Index creation warning (may already exist): {e}")
+
+    def remember(self, message_id: str, value: int):
+        if self.session_size >= SESSION_CACHE_LIMIT:
+            self.session_bands.clear()
+            self.session_size = 0
+        for band in simhash_bands(value):
+            self.session_bands.setdefault(band, []).append((message_id, value))
+        self.session_size += 1
+
+    def closest(self, message_id: str, value: int,
+                candidates: Iterable[Tuple[str, int]]) -> Optional[str]:
+        best_id, best_distance = None, self.max_distance + 1
+        for candidate_id, candidate_value in candidates:
+            if candidate_id == message_id:
+                continue
+            distance = hamming_distance(value, candidate_value)
+            if distance < best_distance:
+                best_id, best_distance = candidate_id, distance
+        return best_id
+
+    def assign(self, documents: List[Dict]) -> int:
+        """
+        Set duplicate_of on documents (in place); returns how many are duplicates.
+
+        Documents must carry the simhash fields from fingerprint_fields; ones
+        without a fingerprint are never duplicates. One MongoDB query covers
+        the whole list.
+        """
+        fingerprinted = [d for d in documents if d.get("simhash") is not None]
+        for document in documents:
+            document["duplicate_of"] = None
+        if not fingerprinted:
+            return 0
+
+        all_bands = sorted({band for d in fingerprinted for band in d["simhash_bands"]})
+        stored = {}
+        for candidate in self.collection.find(
+            {"simhash_bands": {"$in": all_bands}, "duplicate_of": None},
+            {"message_id": 1, "simhash": 1, "simhash_bands": 1, "_id": 0}
+        ):
+            for band in candidate.get("simhash_bands", []):
+                stored.setdefault(band, []).append((candidate["message_id"], from_int64(candidate["simhash"])))
+
+        duplicates = 0
+        for document in fingerprinted:
+            value = from_int64(document["simhash"])
+            candidates = []
+            for band in document["simhash_bands"]:
+                candidates.extend(stored.get(band, []))
+                candidates.extend(self.session_bands.get(band, []))
+
+            canonical = self.closest(document["message_id"], value, candidates)
+            if canonical:
+                document["duplicate_of"] = canonical
+                duplicates += 1
+                logger.debug(f"Message {document['message_id']} is a near-duplicate of {canonical}")
+            else:
+                self.remember(document["message_id"], value)
+
+        return duplicates
+
+
+def backfill_fingerprints(collection, batch_size: int = 500) -> Dict:
+    """Fingerprint stored messages that have no simhash yet, oldest first"""
+    index = NearDuplicateIndex(collection)
+    index.create_indexes()
+    stats = {"messages": 0, "duplicates": 0}
+
+    def write(batch: List[Dict]):
+        stats["duplicates"] += index.assign(batch)
+        collection.bulk_write([
+            pymongo.UpdateOne({"_id": d["_id"]}, {"$set": {
+                "simhash": d["simhash"], "simhash_bands": d["simhash_bands"], "duplicate_of": d["duplicate_of"]
+            }}) for d in batch
+        ], ordered=False)
+        stats["messages"] += len(batch)
+        logger.info(f"Fingerprinted {stats['messages']} messages, {stats['duplicates']} near-duplicates")
+
+    batch = []
+    cursor = collection.find({"simhash": {"$exists": False}},
+                             {"message_id": 1, "thread_message": 1}).sort("date", 1).batch_size(batch_size)
+    for document in cursor:
+        document.update(fingerprint_fields(document.get("thread_message", "")))
+        batch.append(document)
+        if len(batch) >= batch_size:
+            write(batch)
+            batch = []
+    if batch:
+        write(batch)
+
+    return stats
+
+
+def main():
+    """Fingerprint existing original_emails documents"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        with open('../../../atlas-creds/atlas-creds.json', 'r') as f:
+            creds_data = json.load(f)
+
+        mdb_client = pymongo.MongoClient(creds_data["mdb-connection-string"])
+        stats = backfill_fingerprints(mdb_client.email_chatbot.original_emails)
+        logger.info(f"✅ Near-duplicate backfill complete: {stats}")
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
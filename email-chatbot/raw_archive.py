@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Content-addressed archive of raw Gmail messages
+
+Every message fetched during ingestion is stored as zstd-compressed JSON
+under the SHA-256 of its content, and an append-only index maps Gmail
+message ids to content hashes. reparse_archive.py rebuilds original_emails
+from the archive without calling the Gmail API, so parsing improvements can
+be applied to the whole history at disk speed.
+
+Layout (IngestionConfig.RAW_ARCHIVE_DIR):
+    objects/ab/abcdef....json.zst   one blob per distinct message content
+    index.jsonl                      {"id", "thread_id", "sha256", "archived_at"} per line
+
+A message whose content changed (e.g. new labels) gets a new blob and a new
+index line; the last index line for an id wins.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import zstandard
+
+import email_parsing
+from config import IngestionConfig
+
+logger = logging.getLogger(__name__)
+
+
+def read_blob(path: str) -> Dict:
+    """Decompress and decode one archived message"""
+    with open(path, "rb") as f:
+        return json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+
+
+class RawMessageArchive:
+    """Append-only, content-addressed store of raw Gmail message JSON"""
+
+    def __init__(self, root: str = IngestionConfig.RAW_ARCHIVE_DIR,
+                 compression_level: int = IngestionConfig.ARCHIVE_COMPRESSION_LEVEL):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_path = os.path.join(root, "index.jsonl")
+        self.compressor = zstandard.ZstdCompressor(level=compression_level)
+        self.lock = threading.Lock()
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        # gmail_id -> (thread_id, sha256) from the latest index entry
+        self.index: Dict[str, Tuple[str, str]] = {}
+        self.load_index()
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partial last line; the blob is rewritten on the next fetch
+                    logger.warning(f"Skipping malformed archive index line {line_number}")
+                    continue
+                self.index[entry["id"]] = (entry["thread_id"], entry["sha256"])
+        logger.info(f"Raw archive index loaded: {len(self.index)} messages")
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, gmail_id: str):
+        return gmail_id in self.index
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}.json.zst")
+
+    def put(self, message: Dict) -> str:
+        """Archive a raw Gmail message (as returned by messages.get / threads.get), return its hash"""
+        raw = json.dumps(message, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        sha256 = hashlib.sha256(raw).hexdigest()
+        gmail_id = message["id"]
+        thread_id = message.get("threadId", "")
+
+        if self.index.get(gmail_id) == (thread_id, sha256):
+            return sha256
+
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so a blob is never visible half-written
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(self.compressor.compress(raw))
+            os.replace(temp_path, path)
+
+        entry = {
+            "id": gmail_id,
+            "thread_id": thread_id,
+            "sha256": sha256,
+            "archived_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        }
+        with self.lock:
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.index[gmail_id] = (thread_id, sha256)
+
+        return sha256
+
+    def get(self, gmail_id: str) -> Optional[Dict]:
+        """Load the latest archived version of a message"""
+        if gmail_id not in self.index:
+            return None
+        return read_blob(self.blob_path(self.index[gmail_id][1]))
+
+    def entries(self) -> Iterator[Tuple[str, str, str]]:
+        """Yield (gmail_id, thread_id, blob path) for every archived message"""
+        for gmail_id, (thread_id, sha256) in list(self.index.items()):
+            yield gmail_id, thread_id, self.blob_path(sha256)
+
+    def archive_threads(self, items: Iterable[Tuple[str, Optional[Dict]]]) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Pass (thread_id, thread) pairs through, archiving every message on the way"""
+        for thread_id, thread in items:
+            if thread:
+                for message in thread.get("messages", []):
+                    self.put_safely(message)
+            yield thread_id, thread
+
+    def archive_messages(self, items: Iterable[Tuple[str, Optional[Dict]]]) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Pass (gmail_id, message) pairs through, archiving every message on the way"""
+        for gmail_id, message in items:
+            if message:
+                self.put_safely(message)
+            yield gmail_id, message
+
+    def put_safely(self, message: Dict):
+        # The archive is a convenience copy; never let it break ingestion
+        try:
+            self.put(message)
+        except Exception as e:
+            logger.warning(f"Could not archive message {message.get('id')}: {e}")
+
+
+def open_archive() -> Optional[RawMessageArchive]:
+    """The configured archive, or None when archiving is disabled or unavailable"""
+    if not IngestionConfig.ARCHIVE_RAW_MESSAGES:
+        return None
+    try:
+        return RawMessageArchive()
+    except Exception as e:
+        logger.warning(f"Raw message archive disabled: {e}")
+        return None
+
+
+def parse_archived_message(gmail_id: str, entry: Dict):
+    """Pipeline worker entry point: load an archived blob and parse it"""
+    message = read_blob(entry["path"])
+    return email_parsing.parse_message(gmail_id, message)
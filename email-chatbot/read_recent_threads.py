@@ -4,7 +4,8 @@ import datetime
 import dateutil
 import pymongo
 import json
-from sentence_transformers import SentenceTransformer, util
+from embedding_cache import load_cached_model
+from vector_storage import search_score, vector_search_stage
 from openai import AzureOpenAI
 
 from google.auth.transport.requests import Request
@@ -55,7 +56,7 @@ def main():
       api_key=azure_api_key
   )
 
-  model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+  model = load_cached_model('sentence-transformers/all-MiniLM-L6-v2')
 
   w = og_emails_col.find({"sender":"Guest"}).sort({"date":-1}).limit(10)
 
@@ -68,15 +69,7 @@ def main():
     message_vector = model.encode(thread_message).tolist()
 
     pipeline = [
-        {
-            "$search": {
-                "knnBeta": {
-                    "vector": message_vector,
-                    "path": "message_embeddings",
-                    "k": 3
-                }
-            }
-        },
+        vector_search_stage(message_vector, "message_embeddings", 3),
         {
           "$limit": 3
         },
@@ -84,9 +77,7 @@ def main():
             "$project": {
                 "vector_embedding": 0,
                 "_id": 0,
-                'score': {
-                    '$meta': 'searchScore'
-                }
+                'score': search_score()
             }
         }
     ]
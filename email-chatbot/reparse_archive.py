@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Rebuild original_emails from the local raw message archive
+
+Re-runs email_parsing over every message in the archive (see raw_archive.py)
+using all CPU cores and upserts the results, so improvements to
+clean_email_content / extract_message_content can be applied to the whole
+history without re-downloading it from Gmail.
+
+Messages whose embedded fields (embedding_worker.EMBEDDED_FIELDS) come out
+different have embedding_status cleared and their stale embedding removed,
+so the next aug_generate_embeddings.py run embeds them again; unchanged
+messages keep their embedding.
+
+Usage:
+    python reparse_archive.py                  # all archived messages, one worker per core
+    python reparse_archive.py --workers 4
+    python reparse_archive.py --limit 1000     # try a parser change on a sample first
+"""
+import argparse
+import json
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pymongo
+
+from boilerplate import BoilerplateModel
+from bulk_writer import BulkUpsertWriter
+from embedding_worker import EMBEDDED_FIELDS
+from ingestion_pipeline import IngestionPipeline
+from near_duplicates import NearDuplicateIndex
+from raw_archive import RawMessageArchive, parse_archived_message
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Parsed documents compared against the stored versions per query
+COMPARE_BATCH_SIZE = 1000
+
+class ArchiveReparser:
+    def __init__(self, archive_dir: Optional[str] = None):
+        self.setup_database()
+        self.archive = RawMessageArchive(archive_dir) if archive_dir else RawMessageArchive()
+
+    def setup_database(self):
+        """Initialize MongoDB connection"""
+        try:
+            with open('../../../atlas-creds/atlas-creds.json', 'r') as f:
+                creds_data = json.load(f)
+
+            mdb_string = creds_data["mdb-connection-string"]
+            self.mdb_client = pymongo.MongoClient(mdb_string)
+
+            self.email_chatbot_db = self.mdb_client.email_chatbot
+            self.original_emails_col = self.email_chatbot_db.original_emails
+            self.email_embeddings_col = self.email_chatbot_db.email_embeddings
+            self.near_duplicates = NearDuplicateIndex(self.original_emails_col)
+            self.boilerplate = BoilerplateModel.load(self.email_chatbot_db)
+
+            logger.info("Database connection established successfully")
+
+        except Exception as e:
+            logger.error(f"Failed to setup database: {e}")
+            raise
+
+    def archived_items(self, limit: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+        """(gmail_id, blob location) pairs; workers read and decompress the blobs themselves"""
+        for count, (gmail_id, thread_id, path) in enumerate(self.archive.entries()):
+            if limit and count >= limit:
+                return
+            yield gmail_id, {"path": path, "thread_id": thread_id}
+
+    def reset_changed_embeddings(self, documents: List[Dict]) -> int:
+        """
+        Clear embedding_status on documents whose embedded fields differ from
+        the stored version and delete their stale embeddings, return how many
+        """
+        stored = {
+            document["message_id"]: document
+            for document in self.original_emails_col.find(
+                {"message_id": {"$in": [document["message_id"] for document in documents]}},
+                {"message_id": 1, **{field: 1 for field in EMBEDDED_FIELDS}}
+            )
+        }
+
+        changed_ids = []
+        for document in documents:
+            previous = stored.get(document["message_id"])
+            # New messages have no embedding_status yet
+            if previous is None:
+                continue
+            if any(previous.get(field) != document.get(field) for field in EMBEDDED_FIELDS):
+                document["embedding_status"] = None
+                changed_ids.append(document["message_id"])
+
+        if changed_ids:
+            # Before the upsert is written, so nothing re-embeds the old text in between
+            self.email_embeddings_col.delete_many({"message_id": {"$in": changed_ids}})
+        return len(changed_ids)
+
+    def write_documents(self, documents: List[Dict], writer: BulkUpsertWriter, stats: Dict):
+        stats["reembed"] += self.reset_changed_embeddings(documents)
+        for document in documents:
+            writer.upsert(document)
+        stats["documents"] += len(documents)
+
+    def reparse(self, workers: int = 0, limit: Optional[int] = None):
+        """Parse every archived message again and upsert it into original_emails"""
+        try:
+            total = min(len(self.archive), limit) if limit else len(self.archive)
+            logger.info(f"🔁 Re-parsing {total} archived messages...")
+
+            stats = {"messages": 0, "documents": 0, "reembed": 0, "failed": 0}
+            started = time.monotonic()
+
+            # Full upserts: parsed fields are replaced, created_at is kept
+            with BulkUpsertWriter(self.original_emails_col) as writer, \
+                    IngestionPipeline(parse_workers=workers) as pipeline:
+                parsed = []
+                for gmail_id, messages in pipeline.process(self.archived_items(limit), parse_archived_message):
+                    stats["messages"] += 1
+
+                    if messages is None:
+                        stats["failed"] += 1
+                        logger.error(f"Could not re-parse archived message {gmail_id}")
+                        continue
+
+                    self.near_duplicates.assign(messages)
+                    for message_data in messages:
+                        self.boilerplate.measure_document(message_data)
+                    parsed.extend(messages)
+                    if len(parsed) >= COMPARE_BATCH_SIZE:
+                        self.write_documents(parsed, writer, stats)
+                        parsed = []
+
+                    if stats["messages"] % 5000 == 0:
+                        elapsed = max(time.monotonic() - started, 1e-6)
+                        logger.info(f"Progress: {stats['messages']}/{total} messages, "
+                                    f"{stats['messages'] / elapsed:.0f} messages/sec")
+
+                if parsed:
+                    self.write_documents(parsed, writer, stats)
+
+            elapsed = max(time.monotonic() - started, 1e-6)
+            logger.info(f"✅ Re-parse complete: {stats['messages']} messages, {stats['documents']} documents "
+                        f"in {elapsed:.1f}s ({stats['messages'] / elapsed:.0f} messages/sec)")
+            logger.info(f"Writes: {writer.totals}")
+            logger.info(f"{stats['reembed']} changed messages will be re-embedded on the next embedding run")
+            if stats["failed"]:
+                logger.warning(f"{stats['failed']} archived messages could not be parsed")
+
+            return stats
+
+        except Exception as e:
+            logger.error(f"Error in reparse: {e}")
+            raise
+
+def main():
+    """Main function to rebuild original_emails from the archive"""
+    parser = argparse.ArgumentParser(description="Rebuild original_emails from the raw Gmail archive")
+    parser.add_argument("--workers", type=int, default=0, help="parse processes (default: one per core)")
+    parser.add_argument("--limit", type=int, default=None, help="only re-parse this many messages")
+    parser.add_argument("--archive-dir", default=None, help="archive location (default: RAW_ARCHIVE_DIR)")
+    args = parser.parse_args()
+
+    try:
+        reparser = ArchiveReparser(archive_dir=args.archive_dir)
+        reparser.reparse(workers=args.workers, limit=args.limit)
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
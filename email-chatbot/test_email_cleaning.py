@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Golden-file tests for clean_email_content (email_parsing.py)
+
+Each case in testdata/email_cleaning is a pair of files:
+    NN_name.input.txt     raw message text as extracted from Gmail
+    NN_name.expected.txt  the cleaned text that should be stored
+
+Usage:
+    python test_email_cleaning.py
+"""
+import glob
+import logging
+import os
+import sys
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+GOLDEN_DIR = os.path.join("testdata", "email_cleaning")
+
+def load_golden_cases():
+    """Return (name, input, expected) for every golden file pair"""
+    cases = []
+    for input_path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.input.txt"))):
+        name = os.path.basename(input_path)[:-len(".input.txt")]
+        with open(input_path, "r", encoding="utf-8", newline="") as f:
+            raw = f.read()
+        with open(input_path.replace(".input.txt", ".expected.txt"), "r", encoding="utf-8", newline="") as f:
+            expected = f.read()
+        cases.append((name, raw, expected))
+    return cases
+
+def test_golden_files():
+    """Cleaned output must match every expected file exactly"""
+    from email_parsing import clean_email_content
+
+    cases = load_golden_cases()
+    if not cases:
+        print(f"✗ No golden files found in {GOLDEN_DIR}")
+        return False
+
+    failures = 0
+    for name, raw, expected in cases:
+        actual = clean_email_content(raw)
+        if actual != expected:
+            failures += 1
+            print(f"✗ {name}")
+            print(f"    expected: {expected!r}")
+            print(f"    actual:   {actual!r}")
+
+    print(f"✓ {len(cases) - failures}/{len(cases)} golden files match")
+    return failures == 0
+
+def test_idempotent():
+    """Cleaning already-cleaned text must not change it"""
+    from email_parsing import clean_email_content
+
+    for name, raw, expected in load_golden_cases():
+        if clean_email_content(expected) != expected:
+            print(f"✗ {name} changes when cleaned twice")
+            return False
+
+    print("✓ Cleaning is idempotent")
+    return True
+
+def test_sample_messages():
+    """No cleaned sample message may still contain a quoted-reply attribution"""
+    from email_parsing import clean_email_content, extract_message_content
+    from fake_gmail import load_sample_messages
+
+    for message in load_sample_messages():
+        cleaned = clean_email_content(extract_message_content(message["payload"]))
+        if "wrote:" in cleaned or "Sent from my iPhone" in cleaned:
+            print(f"✗ Message {message['id']} still contains quoted history: {cleaned[-80:]!r}")
+            return False
+
+    print("✓ Sample messages are free of quoted history")
+    return True
+
+def run_all_tests():
+    """Run all tests"""
+    logger.info("=" * 60)
+    logger.info("TESTING EMAIL CONTENT CLEANING")
+    logger.info("=" * 60)
+
+    tests = [
+        ("Golden Files", test_golden_files),
+        ("Idempotence", test_idempotent),
+        ("Sample Messages", test_sample_messages)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        logger.info(f"\n--- Testing {test_name} ---")
+        try:
+            if test_func():
+                passed += 1
+                logger.info(f"✓ {test_name} passed")
+            else:
+                logger.error(f"✗ {test_name} failed")
+        except Exception as e:
+            logger.error(f"✗ {test_name} failed with exception: {e}")
+
+    logger.info("\n" + "=" * 60)
+    logger.info(f"TESTS COMPLETED: {passed}/{total} passed")
+    logger.info("=" * 60)
+
+    return passed == total
+
+def main():
+    """Main function"""
+    # Golden files are resolved relative to the script directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if not run_all_tests():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
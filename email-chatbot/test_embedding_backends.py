@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Parity tests for the ONNX embedding backends (embedding_backends.py)
+
+Encodes the email cleaning golden texts plus a few guest-style queries with
+the PyTorch SentenceTransformer and with the ONNX fp32 and int8 encoders,
+and checks the per-text cosine similarity against the PyTorch vectors.
+Exports the ONNX models first if they are missing.
+
+Usage:
+    python test_embedding_backends.py
+"""
+import glob
+import logging
+import os
+import sys
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+GOLDEN_DIR = os.path.join("testdata", "email_cleaning")
+
+# Minimum cosine similarity to the PyTorch vector, per text
+FP32_MIN_COSINE = 0.999
+INT8_MIN_COSINE = 0.98
+
+QUERIES = [
+    "Is the inn available for a wedding in June?",
+    "Do you allow dogs in the cottages?",
+    "What time is check-in and can we arrive late?",
+    "Can we cancel our reservation and get a refund?"
+]
+
+_vectors = {}
+
+
+def load_texts():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.expected.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        if text:
+            texts.append(text)
+    return texts + QUERIES
+
+
+def encode_with(backend):
+    """Vectors for the test texts on one backend (cached across tests)"""
+    from config import AIConfig
+    from embedding_backends import PYTORCH, export_onnx, load_embedding_model, model_backend, onnx_model_path
+
+    if backend not in _vectors:
+        if backend != PYTORCH and not os.path.exists(onnx_model_path(AIConfig.EMBEDDING_MODEL)):
+            export_onnx(AIConfig.EMBEDDING_MODEL)
+        model = load_embedding_model(AIConfig.EMBEDDING_MODEL, backend)
+        assert model_backend(model) == backend, f"{backend} model did not load"
+        _vectors[backend] = np.asarray(model.encode(load_texts(), batch_size=8), dtype=np.float32)
+    return _vectors[backend]
+
+
+def cosine_similarities(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def check_parity(backend, threshold):
+    from embedding_backends import PYTORCH
+
+    reference = encode_with(PYTORCH)
+    vectors = encode_with(backend)
+    if vectors.shape != reference.shape:
+        print(f"✗ {backend} vectors have shape {vectors.shape}, PyTorch {reference.shape}")
+        return False
+
+    similarities = cosine_similarities(reference, vectors)
+    worst = int(np.argmin(similarities))
+    print(f"  {backend}: min cosine {similarities[worst]:.5f}, mean {similarities.mean():.5f} "
+          f"over {len(similarities)} texts")
+    if similarities[worst] < threshold:
+        print(f"✗ {backend} below {threshold} for: {load_texts()[worst][:80]!r}")
+        return False
+
+    print(f"✓ {backend} matches PyTorch (>= {threshold})")
+    return True
+
+
+def test_onnx_fp32_parity():
+    """fp32 ONNX vectors must be near-identical to PyTorch"""
+    from embedding_backends import ONNX
+    return check_parity(ONNX, FP32_MIN_COSINE)
+
+
+def test_onnx_int8_parity():
+    """int8 quantized vectors must stay close to PyTorch"""
+    from embedding_backends import ONNX_INT8
+    return check_parity(ONNX_INT8, INT8_MIN_COSINE)
+
+
+def test_single_text():
+    """encode(str) returns one normalized vector, like SentenceTransformer"""
+    from config import AIConfig
+    from embedding_backends import ONNX, load_embedding_model
+
+    model = load_embedding_model(AIConfig.EMBEDDING_MODEL, ONNX)
+    vector = model.encode(QUERIES[0])
+    if vector.shape != (AIConfig.EMBEDDING_DIMENSION,):
+        print(f"✗ Single text gave shape {vector.shape}")
+        return False
+    if abs(float(np.linalg.norm(vector)) - 1.0) > 1e-4:
+        print(f"✗ Vector is not normalized (norm {np.linalg.norm(vector):.4f})")
+        return False
+
+    print("✓ Single text returns one normalized vector")
+    return True
+
+
+def run_all_tests():
+    """Run all tests"""
+    logger.info("=" * 60)
+    logger.info("TESTING EMBEDDING BACKEND PARITY")
+    logger.info("=" * 60)
+
+    tests = [
+        ("ONNX fp32 Parity", test_onnx_fp32_parity),
+        ("ONNX int8 Parity", test_onnx_int8_parity),
+        ("Single Text", test_single_text)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        logger.info(f"\n--- Testing {test_name} ---")
+        try:
+            if test_func():
+                passed += 1
+                logger.info(f"✓ {test_name} passed")
+            else:
+                logger.error(f"✗ {test_name} failed")
+        except Exception as e:
+            logger.error(f"✗ {test_name} failed with exception: {e}")
+
+    logger.info("\n" + "=" * 60)
+    logger.info(f"TESTS COMPLETED: {passed}/{total} passed")
+    logger.info("=" * 60)
+
+    return passed == total
+
+
+def main():
+    """Main function"""
+    # Golden files are resolved relative to the script directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if not run_all_tests():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
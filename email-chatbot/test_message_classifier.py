@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for automated-mail classification (message_classifier.py)
+
+Positive cases are automated mail with the headers it really carries;
+negative cases are guest inquiries whose text mentions vacations,
+newsletters, offers or undelivered mail, which must never be classified
+(a classified message is left out of embedding and retrieval).
+
+Usage:
+    python test_message_classifier.py
+"""
+import logging
+import os
+import sys
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+GUEST = {"from": "Jamie Rivera <jamie.rivera@gmail.com>"}
+
+POSITIVE_CASES = [
+    ("newsletter header", {"from": "Big Sur Events <events@bigsurevents.com>",
+                           "list-unsubscribe": "<mailto:unsubscribe@bigsurevents.com>"},
+     "Spring events", "Join us this spring!", "newsletter"),
+    ("auto-submitted", {"from": "Pat Lee <pat@example.com>", "auto-submitted": "auto-replied"},
+     "Re: Wedding", "Thanks for your message.", "auto_reply"),
+    ("mailer-daemon", {"from": "Mail Delivery Subsystem <mailer-daemon@googlemail.com>"},
+     "Delivery Status Notification (Failure)", "Address not found", "bounce"),
+    ("noreply + automated text", {"from": "Venue Booking <no-reply@bookingsite.com>"},
+     "Automatic reply", "This is an automated message. We will respond when our office reopens.", "auto_reply"),
+    ("noreply + newsletter text", {"from": "Deals <newsletter@travelsite.com>"},
+     "This week's deals", "View this email in your browser. Unsubscribe from these emails.", "newsletter"),
+]
+
+NEGATIVE_CASES = [
+    ("guest mentions vacation", GUEST, "Wedding inquiry for September",
+     "Hi! I'm currently away on vacation but wanted to ask about your availability for a wedding of "
+     "about 80 guests on September 14. I'll have limited access to email, so I will reply when I return. "
+     "Out of office until the 20th - thanks so much!"),
+    ("guest mentions newsletter", GUEST, "Booking question",
+     "We saw the 20% off limited time offer in your newsletter and would love to book two cabins for "
+     "June 3-6. Also, could you unsubscribe my old work address? You're receiving this message because "
+     "my sister recommended you."),
+    ("guest mentions undelivered mail", GUEST, "Re: Rehearsal dinner",
+     "My last email couldn't be delivered to your events address (it said undeliverable, error 5.1.1), "
+     "so I'm resending: we'd like the rehearsal dinner on the patio for 40 people."),
+    ("guest auto-reply wording", GUEST, "Automatic reply question",
+     "Is there an autoreply on your events inbox? I got no answer yet about our retreat in October."),
+    ("noreply sender, ordinary text", {"from": "Form Notifications <notifications@forms.example.com>"},
+     "New contact form submission", "Name: Alex\nMessage: Do you host elopements on weekdays?"),
+]
+
+
+def test_positive_cases():
+    """Automated mail with header signals is classified"""
+    from message_classifier import classify_message
+
+    failures = 0
+    for name, headers, subject, text, expected in POSITIVE_CASES:
+        actual, reason = classify_message(headers, subject, text)
+        if actual != expected:
+            failures += 1
+            print(f"✗ {name}: expected {expected}, got {actual} ({reason})")
+
+    print(f"✓ {len(POSITIVE_CASES) - failures}/{len(POSITIVE_CASES)} automated messages classified")
+    return failures == 0
+
+
+def test_guest_inquiries():
+    """Guest inquiries are never classified, whatever their text says"""
+    from message_classifier import classify_message
+
+    failures = 0
+    for name, headers, subject, text in NEGATIVE_CASES:
+        actual, reason = classify_message(headers, subject, text)
+        if actual is not None:
+            failures += 1
+            print(f"✗ {name}: classified as {actual} ({reason})")
+
+    print(f"✓ {len(NEGATIVE_CASES) - failures}/{len(NEGATIVE_CASES)} guest inquiries left unclassified")
+    return failures == 0
+
+
+def test_text_needs_header_signal():
+    """Text that scores as automated is ignored without a header signal"""
+    from message_classifier import classify_by_text, classify_message
+
+    subject, text = "Automatic reply", "This is an automated message. I am out of the office."
+    if classify_by_text(subject, text) is None:
+        print("✗ Text scorer should score this text as automated")
+        return False
+    if classify_message(GUEST, subject, text) != (None, None):
+        print("✗ Text alone classified a message")
+        return False
+
+    print("✓ Text alone does not classify")
+    return True
+
+
+def run_all_tests():
+    """Run all tests"""
+    logger.info("=" * 60)
+    logger.info("TESTING MESSAGE CLASSIFICATION")
+    logger.info("=" * 60)
+
+    tests = [
+        ("Automated Messages", test_positive_cases),
+        ("Guest Inquiries", test_guest_inquiries),
+        ("Header Signal Required", test_text_needs_header_signal)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        logger.info(f"\n--- Testing {test_name} ---")
+        try:
+            if test_func():
+                passed += 1
+                logger.info(f"✓ {test_name} passed")
+            else:
+                logger.error(f"✗ {test_name} failed")
+        except Exception as e:
+            logger.error(f"✗ {test_name} failed with exception: {e}")
+
+    logger.info("\n" + "=" * 60)
+    logger.info(f"TESTS COMPLETED: {passed}/{total} passed")
+    logger.info("=" * 60)
+
+    return passed == total
+
+
+def main():
+    """Main function"""
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if not run_all_tests():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for SimHash near-duplicate detection (near_duplicates.py)
+
+Fingerprints are built by flipping chosen bits of a base value, so the
+distances sit exactly at the limits of the banded candidate lookup.
+
+Usage:
+    python test_near_duplicates.py
+"""
+import logging
+import os
+import sys
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE = 0x0123456789ABCDEF
+
+
+class EmptyCollection:
+    """Stands in for original_emails; candidates come from the session cache"""
+
+    def find(self, *args, **kwargs):
+        return []
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def document(message_id, value):
+    from near_duplicates import simhash_bands, to_int64
+    return {"message_id": message_id, "simhash": to_int64(value), "simhash_bands": simhash_bands(value)}
+
+
+def duplicate_of(value, max_distance=3):
+    """duplicate_of assigned to a message with fingerprint value, after BASE was stored"""
+    from near_duplicates import NearDuplicateIndex
+
+    index = NearDuplicateIndex(EmptyCollection(), max_distance=max_distance)
+    index.assign([document("original", BASE)])
+    copy = document("copy", value)
+    index.assign([copy])
+    return copy["duplicate_of"]
+
+
+def test_boundary_distance():
+    """3 differing bits in 3 different bands are still found through the fourth band"""
+    value = flip(BASE, [0, 16, 32])
+    if duplicate_of(value) != "original":
+        print("✗ Distance 3 across three bands was not detected")
+        return False
+
+    print("✓ Distance 3 across three bands detected")
+    return True
+
+
+def test_beyond_distance():
+    """4 differing bits (one per band) are not a duplicate"""
+    value = flip(BASE, [0, 16, 32, 48])
+    if duplicate_of(value) is not None:
+        print("✗ Distance 4 was treated as a duplicate")
+        return False
+
+    print("✓ Distance 4 not a duplicate")
+    return True
+
+
+def test_max_distance_validated():
+    """max_distance must stay below the band count"""
+    from near_duplicates import BAND_COUNT, NearDuplicateIndex
+
+    for max_distance in (BAND_COUNT, -1):
+        try:
+            NearDuplicateIndex(EmptyCollection(), max_distance=max_distance)
+        except ValueError:
+            continue
+        print(f"✗ max_distance={max_distance} was accepted")
+        return False
+
+    NearDuplicateIndex(EmptyCollection(), max_distance=BAND_COUNT - 1)
+    print(f"✓ max_distance limited to 0..{BAND_COUNT - 1}")
+    return True
+
+
+def run_all_tests():
+    """Run all tests"""
+    logger.info("=" * 60)
+    logger.info("TESTING NEAR-DUPLICATE DETECTION")
+    logger.info("=" * 60)
+
+    tests = [
+        ("Boundary Distance", test_boundary_distance),
+        ("Beyond Distance", test_beyond_distance),
+        ("Max Distance Validation", test_max_distance_validated)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        logger.info(f"\n--- Testing {test_name} ---")
+        try:
+            if test_func():
+                passed += 1
+                logger.info(f"✓ {test_name} passed")
+            else:
+                logger.error(f"✗ {test_name} failed")
+        except Exception as e:
+            logger.error(f"✗ {test_name} failed with exception: {e}")
+
+    logger.info("\n" + "=" * 60)
+    logger.info(f"TESTS COMPLETED: {passed}/{total} passed")
+    logger.info("=" * 60)
+
+    return passed == total
+
+
+def main():
+    """Main function"""
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if not run_all_tests():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Compact binary storage for embedding vectors
+
+Vectors have been stored as BSON arrays of doubles: 384 x (8 bytes + type
+byte + index key) is ~3.4KB per vector plus a Python float per element on
+every read. VECTOR_STORAGE selects how the write paths store them:
+
+    array    BSON array of doubles (default, the original format)
+    float32  BSON binary subtype 9 (vector), packed little-endian float32, 1.5KB
+    int8     BSON binary subtype 9, int8 scaled per vector to [-127, 127], 390 bytes
+
+int8 keeps direction (cosine similarity) but not magnitude, so decoded int8
+vectors are re-normalized to unit length like the model's own output.
+
+Readers call decode_vector / decode_vectors, which read binary vectors with
+np.frombuffer (no per-element Python objects) and accept arrays as well.
+Binary vectors need an Atlas Vector Search index ($vectorSearch);
+vector_search_stage builds the right stage for the configured format.
+
+Search does not work on a collection that mixes formats, so switching
+VECTOR_STORAGE is an offline change:
+    1. stop the writers (embedding worker, collectors, retail scripts)
+    2. migrate; it fails while vectors in another format remain, e.g. ones
+       written by a process that was still running - re-run it until it succeeds
+    3. create or rebuild the Atlas Vector Search index it prints
+    4. set VECTOR_STORAGE to the new format and restart the apps
+
+Usage (existing collections are converted in place):
+    python vector_storage.py status email_embeddings
+    python vector_storage.py migrate email_embeddings --to float32
+    python vector_storage.py migrate retail_orders --to int8
+"""
+
+import argparse
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pymongo
+from bson.binary import Binary
+
+from config import DatabaseConfig
+
+logger = logging.getLogger(__name__)
+
+ARRAY = "array"
+FLOAT32 = "float32"
+INT8 = "int8"
+STORAGE_FORMATS = (ARRAY, FLOAT32, INT8)
+
+# BSON binary subtype 9 and its dtype header bytes (header: dtype, padding)
+VECTOR_SUBTYPE = 9
+DTYPE_INT8 = 0x03
+DTYPE_FLOAT32 = 0x27
+
+# Collections holding vectors: name -> (database, collection, vector field)
+TARGETS = {
+    "email_embeddings": (DatabaseConfig.DATABASE_NAME, DatabaseConfig.EMAIL_EMBEDDINGS_COLLECTION, "message_embeddings"),
+    "retail_orders": ("retail", "orders", "vector_embedding"),
+    "retail_orders_updated_baskets": ("retail", "orders_updated_baskets", "vector_embedding"),
+}
+
+Vector = Union[Sequence[float], np.ndarray]
+
+
+def encode_vector(vector: Vector, storage: str = DatabaseConfig.VECTOR_STORAGE):
+    """Vector in the given storage format, ready to be written to MongoDB"""
+    if storage not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown VECTOR_STORAGE {storage!r}, expected one of {STORAGE_FORMATS}")
+
+    values = np.asarray(vector, dtype=np.float32)
+    if storage == ARRAY:
+        return values.tolist()
+    if storage == FLOAT32:
+        return Binary(bytes([DTYPE_FLOAT32, 0]) + values.astype("<f4").tobytes(), VECTOR_SUBTYPE)
+
+    scale = float(np.max(np.abs(values))) if values.size else 0.0
+    quantized = np.round(values * (127.0 / scale)) if scale else np.zeros_like(values)
+    return Binary(bytes([DTYPE_INT8, 0]) + quantized.astype(np.int8).tobytes(), VECTOR_SUBTYPE)
+
+
+def storage_format(value) -> Optional[str]:
+    """Storage format of a stored vector (None if it is missing or not a vector)"""
+    if isinstance(value, list):
+        return ARRAY
+    if isinstance(value, bytes) and len(value) >= 2:
+        return {DTYPE_FLOAT32: FLOAT32, DTYPE_INT8: INT8}.get(value[0])
+    return None
+
+
+def decode_vector(value) -> np.ndarray:
+    """Stored vector (binary or array) as a float32 array; empty if missing"""
+    stored_format = storage_format(value)
+    if stored_format == FLOAT32:
+        return np.frombuffer(value, dtype="<f4", offset=2).astype(np.float32, copy=False)
+    if stored_format == INT8:
+        vector = np.frombuffer(value, dtype=np.int8, offset=2).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    if stored_format == ARRAY:
+        return np.asarray(value, dtype=np.float32)
+    return np.zeros(0, dtype=np.float32)
+
+
+def decode_vectors(values: Iterable) -> np.ndarray:
+    """Stored vectors as one (n, dimension) float32 matrix"""
+    vectors = [decode_vector(value) for value in values]
+    return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def vector_length(value) -> int:
+    """Dimension of a stored vector, without decoding it"""
+    stored_format = storage_format(value)
+    if stored_format == FLOAT32:
+        return (len(value) - 2) // 4
+    if stored_format == INT8:
+        return len(value) - 2
+    return len(value) if stored_format == ARRAY else 0
+
+
+def vector_search_stage(query_vector: Vector, path: str, k: int,
+                        storage: str = DatabaseConfig.VECTOR_STORAGE,
+                        index: str = DatabaseConfig.VECTOR_INDEX_NAME) -> Dict:
+    """
+    Search stage for vectors stored in the given format.
+
+    Arrays keep using the Atlas Search knnBeta operator; binary vectors are
+    only indexed by Atlas Vector Search, which also expects the query in the
+    indexed format.
+    """
+    if storage == ARRAY:
+        return {"$search": {"knnBeta": {"vector": encode_vector(query_vector, ARRAY), "path": path, "k": k}}}
+    return {"$vectorSearch": {
+        "index": index,
+        "path": path,
+        "queryVector": encode_vector(query_vector, storage),
+        "numCandidates": k * 10,
+        "limit": k
+    }}
+
+
+def search_score(storage: str = DatabaseConfig.VECTOR_STORAGE) -> Dict:
+    return {"$meta": "searchScore" if storage == ARRAY else "vectorSearchScore"}
+
+
+def vector_index_definition(path: str, dimension: int = 384) -> Dict:
+    """Atlas Vector Search index definition for binary vectors"""
+    return {"fields": [{"type": "vector", "path": path, "numDimensions": dimension, "similarity": "cosine"}]}
+
+
+class VectorStorageMigrator:
+    def __init__(self, target: str):
+        self.database_name, self.collection_name, self.field = TARGETS[target]
+        self.setup_database()
+
+    def setup_database(self):
+        """Initialize MongoDB connection"""
+        try:
+            with open('../../../atlas-creds/atlas-creds.json', 'r') as f:
+                creds_data = json.load(f)
+
+            self.mdb_client = pymongo.MongoClient(creds_data["mdb-connection-string"])
+            self.collection = self.mdb_client[self.database_name][self.collection_name]
+            logger.info(f"Connected to {self.database_name}.{self.collection_name}")
+
+        except Exception as e:
+            logger.error(f"Failed to setup database: {e}")
+            raise
+
+    def status(self) -> Dict[str, int]:
+        """Number of documents per storage format"""
+        counts = {stored_format: 0 for stored_format in STORAGE_FORMATS}
+        counts["missing"] = 0
+        for doc in self.collection.find({}, {self.field: 1}):
+            counts[storage_format(doc.get(self.field)) or "missing"] += 1
+        return counts
+
+    def migrate(self, storage: str, batch_size: int = 500) -> int:
+        """
+        Re-encode every stored vector in the given format, return the number
+        converted. Raises RuntimeError if vectors in another format remain
+        afterwards (a writer was still running with the old VECTOR_STORAGE).
+        """
+        encode_vector([], storage)  # validates the format before anything is written
+        converted = 0
+        # Empty vectors in another format are left alone and not counted as remaining
+        empty = 0
+        batch: List[pymongo.UpdateOne] = []
+
+        cursor = self.collection.find({self.field: {"$exists": True}}, {self.field: 1}).sort("_id", 1)
+        for doc in cursor:
+            value = doc.get(self.field)
+            if storage_format(value) in (None, storage):
+                continue
+            if not vector_length(value):
+                empty += 1
+                continue
+            batch.append(pymongo.UpdateOne(
+                {"_id": doc["_id"]}, {"$set": {self.field: encode_vector(decode_vector(value), storage)}}
+            ))
+            if len(batch) >= batch_size:
+                converted += self.collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+                logger.info(f"Converted {converted} vectors to {storage}...")
+
+        if batch:
+            converted += self.collection.bulk_write(batch, ordered=False).modified_count
+
+        remaining = {stored_format: count for stored_format, count in self.status().items()
+                     if stored_format not in (storage, "missing") and count}
+        if sum(remaining.values()) > empty:
+            raise RuntimeError(f"Converted {converted} vectors, but {remaining} are still in another format; "
+                               f"stop every writer and run migrate again before switching VECTOR_STORAGE")
+        return converted
+
+
+def main():
+    """Show or migrate the vector storage format of a collection"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Binary vector storage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    status_parser = subparsers.add_parser("status", help="documents per storage format")
+    status_parser.add_argument("target", choices=sorted(TARGETS))
+
+    migrate_parser = subparsers.add_parser("migrate", help="convert stored vectors in place")
+    migrate_parser.add_argument("target", choices=sorted(TARGETS))
+    migrate_parser.add_argument("--to", choices=STORAGE_FORMATS, default=DatabaseConfig.VECTOR_STORAGE)
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    try:
+        migrator = VectorStorageMigrator(args.target)
+
+        if args.command == "status":
+            logger.info(f"{args.target}.{migrator.field}: {migrator.status()}")
+
+        elif args.command == "migrate":
+            converted = migrator.migrate(args.to, args.batch_size)
+            logger.info(f"✅ Converted {converted} vectors to {args.to}: {migrator.status()}")
+            if args.to != ARRAY:
+                logger.info("Binary vectors are searched with an Atlas Vector Search index "
+                            f"named {DatabaseConfig.VECTOR_INDEX_NAME}: "
+                            f"{json.dumps(vector_index_definition(migrator.field))}")
+            logger.info(f"Rebuild the search index, then set VECTOR_STORAGE={args.to} and restart the apps")
+
+    except Exception as e:
+        logger.error(f"Application error: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
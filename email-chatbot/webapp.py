@@ -28,6 +28,8 @@ import time
 from aug_update_emails import EmailUpdater
 from aug_generate_embeddings import IncrementalEmailEmbeddingGenerator
 from aug_generate_responses import EmailResponseGenerator
+from embedding_scheduler import load_metrics
+from model_registry import registry_metrics
 from config import WebConfig, DatabaseConfig, AIConfig
 
 # Configure logging
@@ -83,6 +85,8 @@ class EmailChatbotService:
             guest_count = self.embedding_generator.original_emails_col.count_documents({"sender": "Guest"})
             bsri_count = self.embedding_generator.original_emails_col.count_documents({"sender": "BSRI Team"})
             events_legacy = self.embedding_generator.original_emails_col.count_documents({"sender": "Events Team"})
+            # Auto-replies, newsletters and bounces are not embedded
+            automated_count = self.embedding_generator.original_emails_col.count_documents({"message_class": {"$ne": None}})
             
             # Embedded emails stats
             total_embedded = self.embedding_generator.email_embeddings_col.count_documents({})
@@ -102,15 +106,21 @@ class EmailChatbotService:
             })
             
             # Calculate coverage
-            coverage = (total_embedded / total_original * 100) if total_original > 0 else 0
-            emails_needing_embeddings = total_original - total_embedded
+            total_embeddable = total_original - automated_count
+            emails_needing_embeddings = self.embedding_generator.count_emails_needing_embeddings()
+            coverage = ((total_embeddable - emails_needing_embeddings) / total_embeddable * 100
+                        if total_embeddable > 0 else 0)
+            
+            # Pending embeddings per priority tier, as of the last embedding run
+            embedding_queue = load_metrics(self.embedding_generator.sync_state_col)
             
             stats = {
                 "original_emails": {
                     "total": total_original,
                     "guest": guest_count,
                     "bsri_team": bsri_count,
-                    "events_legacy": events_legacy
+                    "events_legacy": events_legacy,
+                    "automated": automated_count
                 },
                 "embedded_emails": {
                     "total": total_embedded,
@@ -120,12 +130,15 @@ class EmailChatbotService:
                 },
                 "coverage": {
                     "percentage": round(coverage, 1),
-                    "emails_needing_embeddings": emails_needing_embeddings
+                    "emails_needing_embeddings": emails_needing_embeddings,
+                    "queue_depths": embedding_queue["depths"]
                 },
                 "recent_activity": {
                     "guest_messages": recent_guest,
                     "bsri_messages": recent_bsri
                 },
+                # Shared embedding models (one copy per process): load time and memory
+                "models": registry_metrics(),
                 "last_update": self.last_update_time.isoformat() if self.last_update_time else None,
                 "is_processing": self.is_processing
             }
@@ -6,7 +6,12 @@ from square.http.auth.o_auth_2 import BearerAuthCredentials
 from square.client import Client
 import os
 
-from sentence_transformers import SentenceTransformer, util
+import sys
+
+# Shared on-disk embedding cache (email-chatbot/embedding_cache.py)
+sys.path.append('../email-chatbot')
+from embedding_cache import load_cached_model
+from vector_storage import encode_vector
 
 # ---------- functions start here ---------- #
 def getOrders(startDate, endDate, locationID, cursor):
@@ -96,7 +101,7 @@ pData = json.load(f)
 
 access_token = pData["access_token"]
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+model = load_cached_model('sentence-transformers/all-MiniLM-L6-v2')
 
 client = Client(bearer_auth_credentials=BearerAuthCredentials(access_token=access_token),environment='production')
 
@@ -109,7 +114,7 @@ if result.is_success():
 		o["closed_at"] = datetime.strptime(o["closed_at"][:19], "%Y-%m-%dT%H:%M:%S")
 		new_doc = readAndProcessDocument(o)
 		# x = mycol.insert_one(o)
-		basket_vector = model.encode(new_doc["basket"]).tolist()
+		basket_vector = encode_vector(model.encode(new_doc["basket"]))
 		new_doc['vector_embedding'] = basket_vector
 		x = mycol.insert_one(new_doc)
 		print(new_doc["created_at"])
@@ -122,7 +127,7 @@ if result.is_success():
 				o["closed_at"] = datetime.strptime(o["closed_at"][:19], "%Y-%m-%dT%H:%M:%S")
 				new_doc = readAndProcessDocument(o)
 				# x = mycol.insert_one(o)
-				basket_vector = model.encode(new_doc["basket"]).tolist()
+				basket_vector = encode_vector(model.encode(new_doc["basket"]))
 				new_doc['vector_embedding'] = basket_vector
 				x = mycol.insert_one(new_doc)
 				print(new_doc["created_at"])
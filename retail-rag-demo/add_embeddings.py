@@ -1,6 +1,14 @@
 import pymongo
 import json
-from sentence_transformers import SentenceTransformer, util
+import sys
+from collections import deque
+from itertools import islice
+
+# Shared on-disk embedding cache (email-chatbot/embedding_cache.py)
+sys.path.append('../email-chatbot')
+from embedding_cache import load_cached_model
+from encoding_pool import EncodingPool
+from vector_storage import encode_vector
 
 
 # ---------- functions start here ---------- #
@@ -39,35 +47,58 @@ def readAndProcessDocument(document):
 
 
 # ---------- script starts here ---------- #
-f = open('../../../atlas-creds/atlas-creds.json')
-pData = json.load(f)
-
-bsri_string = pData["bsri-connection-string"]
-mdb_string = pData["mdb-connection-string"]
-
-
-bsri_client = pymongo.MongoClient(bsri_string)
-square_db = bsri_client.square
-orders_col = square_db.orders
-
-mdb_client = pymongo.MongoClient(mdb_string)
-retail_demo_db = mdb_client.retail
-orders_demo_col = retail_demo_db.orders
-
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-
-for doc in orders_col.find({}):
-	# w = orders_demo_col.insert_one(readAndProcessDocument(doc))
-	# print(w.inserted_id)
-	new_doc = readAndProcessDocument(doc)
-	# print(new_doc)
-	basket_vector = model.encode(new_doc["basket"]).tolist()
-
-	# result_doc['sentence'] = doc
-	new_doc['vector_embedding'] = basket_vector
-	print(new_doc)
-
-	# w = orders_demo_col.insert_one(new_doc)
-	# print(w.inserted_id)
-	# print(orders_demo_col.find_one({"_id":w.inserted_id}))
-
+# Spawned encoding workers re-import this file, so the script only runs as __main__
+if __name__ == "__main__":
+	# Optional worker process count for full backfills: python add_embeddings.py 4
+	workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+	f = open('../../../atlas-creds/atlas-creds.json')
+	pData = json.load(f)
+
+	bsri_string = pData["bsri-connection-string"]
+	mdb_string = pData["mdb-connection-string"]
+
+
+	bsri_client = pymongo.MongoClient(bsri_string)
+	square_db = bsri_client.square
+	orders_col = square_db.orders
+
+	mdb_client = pymongo.MongoClient(mdb_string)
+	retail_demo_db = mdb_client.retail
+	orders_demo_col = retail_demo_db.orders
+
+	if workers > 1:
+		# Baskets are encoded in chunks across the pool; results come back in order
+		pool = EncodingPool(workers)
+		new_docs = (readAndProcessDocument(doc) for doc in orders_col.find({}))
+		chunks = iter(lambda: list(islice(new_docs, 256)), [])
+		pending = deque()
+
+		def basket_chunks():
+			for chunk in chunks:
+				pending.append(chunk)
+				yield [new_doc["basket"] for new_doc in chunk]
+
+		for vectors in pool.imap(basket_chunks()):
+			for new_doc, basket_vector in zip(pending.popleft(), vectors):
+				new_doc['vector_embedding'] = encode_vector(basket_vector)
+				print(new_doc)
+		pool.close()
+
+	else:
+		model = load_cached_model('sentence-transformers/all-MiniLM-L6-v2')
+
+		for doc in orders_col.find({}):
+			# w = orders_demo_col.insert_one(readAndProcessDocument(doc))
+			# print(w.inserted_id)
+			new_doc = readAndProcessDocument(doc)
+			# print(new_doc)
+			basket_vector = encode_vector(model.encode(new_doc["basket"]))
+
+			# result_doc['sentence'] = doc
+			new_doc['vector_embedding'] = basket_vector
+			print(new_doc)
+
+			# w = orders_demo_col.insert_one(new_doc)
+			# print(w.inserted_id)
+			# print(orders_demo_col.find_one({"_id":w.inserted_id}))
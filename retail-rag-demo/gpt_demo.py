@@ -1,6 +1,11 @@
 import pymongo
 import json
-from sentence_transformers import SentenceTransformer, util
+import sys
+
+# Shared on-disk embedding cache (email-chatbot/embedding_cache.py)
+sys.path.append('../email-chatbot')
+from embedding_cache import load_cached_model
+from vector_storage import search_score, vector_search_stage
 
 import os
 from openai import AzureOpenAI
@@ -54,22 +59,14 @@ deployment_client = AzureOpenAI(
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+model = load_cached_model('sentence-transformers/all-MiniLM-L6-v2')
 
 vector_query = model.encode(query).tolist()
 
 # print(vector_query)
 
 pipeline = [
-    {
-        "$search": {
-            "knnBeta": {
-                "vector": vector_query,
-                "path": "vector_embedding",
-                "k": 100
-            }
-        }
-    },
+    vector_search_stage(vector_query, "vector_embedding", 100),
     {
         "$limit": 3
     },
@@ -77,9 +74,7 @@ pipeline = [
         "$project": {
             "vector_embedding": 0,
             "_id": 0,
-            'score': {
-                '$meta': 'searchScore'
-            }
+            'score': search_score()
         }
     }
 ]
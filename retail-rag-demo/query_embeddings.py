@@ -1,6 +1,11 @@
 import pymongo
 import json
-from sentence_transformers import SentenceTransformer, util
+import sys
+
+# Shared on-disk embedding cache (email-chatbot/embedding_cache.py)
+sys.path.append('../email-chatbot')
+from embedding_cache import load_cached_model
+from vector_storage import search_score, vector_search_stage
 
 
 query = "stickers, water, burrito"
@@ -36,22 +41,14 @@ retail_demo_db = mdb_client.retail
 # orders_demo_col = retail_demo_db.orders
 orders_demo_col = retail_demo_db.orders_updated_baskets
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+model = load_cached_model('sentence-transformers/all-MiniLM-L6-v2')
 
 vector_query = model.encode(query).tolist()
 
 # print(vector_query)
 
 pipeline = [
-    {
-        "$search": {
-            "knnBeta": {
-                "vector": vector_query,
-                "path": "vector_embedding",
-                "k": 3
-            }
-        }
-    },
+    vector_search_stage(vector_query, "vector_embedding", 3),
     {
     	"$limit": 3
     },
@@ -59,9 +56,7 @@ pipeline = [
         "$project": {
             "vector_embedding": 0,
             "_id": 0,
-            'score': {
-                '$meta': 'searchScore'
-            }
+            'score': search_score()
         }
     }
 ]
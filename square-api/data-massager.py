@@ -1,6 +1,11 @@
 import pymongo
 import json
-from sentence_transformers import SentenceTransformer, util
+import sys
+
+# Shared on-disk embedding cache (email-chatbot/embedding_cache.py)
+sys.path.append('../email-chatbot')
+from embedding_cache import load_cached_model
+from vector_storage import encode_vector
 
 
 # ---------- functions start here ---------- #
@@ -54,14 +59,14 @@ mdb_client = pymongo.MongoClient(mdb_string)
 retail_demo_db = mdb_client.retail
 orders_demo_col = retail_demo_db.orders
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+model = load_cached_model('sentence-transformers/all-MiniLM-L6-v2')
 
 for doc in orders_col.find({}):
 	# w = orders_demo_col.insert_one(readAndProcessDocument(doc))
 	# print(w.inserted_id)
 	new_doc = readAndProcessDocument(doc)
 	# print(new_doc)
-	basket_vector = model.encode(new_doc["basket"]).tolist()
+	basket_vector = encode_vector(model.encode(new_doc["basket"]))
 
 	# result_doc['sentence'] = doc
 	new_doc['vector_embedding'] = basket_vector